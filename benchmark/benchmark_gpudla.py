@@ -1,14 +1,25 @@
+import os
+import sys
 import argparse
 import tensorrt as trt
 import torch
-import torchvision
 import time
 from datetime import datetime
-import torchvision.transforms as transforms
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "policy"))
+from BatchCache import BatchCache
+from MockData import mock_corpus, corpus_length, inline_preprocess, legacy_time, save_legacy_time, SOURCE_SHAPE
+from Warmup import Warmup
 
 '''
 This script benchmarks a TensorRT engine on a GPU or DLA core.
 It runs mock inferences for a specified duration and calculates throughput.
+By default the input batches are preprocessed once into a pinned batch cache (see policy/BatchCache.py), so that
+the measured throughput does not include the CPU preprocessing; "--preprocess inline" preprocesses at every inference
+and reports the preprocessing time separately.
+The outputs are copied in place into pinned host buffers allocated once ("--no_readback" skips the copy), instead
+of allocating new host tensors at every inference.
+The warmup runs until the batch latency is stable (see policy/Warmup.py), at most --warmup_max_s seconds.
 '''
 
 
@@ -18,6 +29,13 @@ parser.add_argument('--duration', type=int, required=True, help='Duration to run
 parser.add_argument('--input_shape', type=str, default="1,3,224,224", help='Input shape for the model (e.g., "1,3,224,224")')
 parser.add_argument('--output_shapes', type=str, default="1,1000", help='Comma-separated list of output shapes for the model (e.g., "1,1000;1,10")')
 parser.add_argument('--throughput', type=int, default=-1, help='Target throughput (in inferences per second), < 0 for no limit')
+parser.add_argument('--preprocess', type=str, default="cache", choices=["cache", "inline"], help='Preprocess the batches once ("cache") or at every inference ("inline")')
+parser.add_argument('--cache_batches', type=int, default=16, help='Number of preprocessed batches held by the batch cache')
+parser.add_argument('--seed', type=int, default=0, help='Seed of the mock input data')
+parser.add_argument('--warmup_cv', type=float, default=0.05, help='Coefficient of variation of the batch latency under which the warmup stops')
+parser.add_argument('--warmup_max_s', type=float, default=30, help='Maximum duration of the warmup (in seconds)')
+parser.add_argument('--no_readback', action='store_true', help='Do not copy the outputs back to the host')
+parser.add_argument('--legacy_data_time', action='store_true', help='Also time the legacy FakeData generation of the mock data (imports torchvision) and store it for the engines of the policy')
 args = parser.parse_args()
 
 print(f'Engine: {args.engine}')
@@ -55,49 +73,77 @@ bindings[0] = input_buffer.data_ptr()
 for i, output_buffer in enumerate(output_buffers):
     bindings[i + 1] = output_buffer.data_ptr()
 
-# Define the preprocessing steps
-preprocess = transforms.Compose([
-    transforms.Resize(input_shape[2:]), 
-    transforms.ToTensor(),               
-])
-
-images = []
-imglen = 2000
-for _ in range(imglen):
-    image, _ = next(iter(torchvision.datasets.FakeData(size=1, image_size=(3,224,224))))
-    images.append(image)
+# Host output buffers, allocated once in pinned memory: the readback copies into them in place
+host_buffers = [] if args.no_readback else [torch.empty(output_buffer.shape, dtype=output_buffer.dtype, pin_memory=True) for output_buffer in output_buffers]
+host_arrays = [host_buffer.numpy() for host_buffer in host_buffers]
+output_bytes = sum(host_buffer.numel() * host_buffer.element_size() for host_buffer in host_buffers)
+
+# Define the inline preprocessing steps (layout change, resize and conversion to float in [0, 1])
+preprocess = inline_preprocess(input_shape, torch.float32)
+
+# Mock images created in a single seeded call: at the model input shape for the batch cache, at the source
+# shape of the legacy generation (224x224 HWC) for the inline preprocessing
+image_shape = tuple(input_shape[1:]) if args.preprocess == "cache" else SOURCE_SHAPE
+imglen = args.cache_batches * batch_size if args.preprocess == "cache" else corpus_length(image_shape, batch_size)
+start_data_time = time.perf_counter()
+images = mock_corpus(imglen, image_shape, seed=args.seed)
+data_time = time.perf_counter() - start_data_time
+print(f'Mock data: {imglen} images in {data_time:.3f} s')
+if args.legacy_data_time:
+    legacy_data_time = legacy_time()
+    save_legacy_time(legacy_data_time)
+    print(f'Legacy FakeData loop: ~{legacy_data_time:.2f} s ({legacy_data_time - data_time:.2f} s saved)')
+
+cache = None
+if args.preprocess == "cache":
+    cache = BatchCache(input_shape, args.cache_batches).build(images)
+
+preprocess_time = 0
+def load_batch(i):
+    global preprocess_time
+    if cache is not None:
+        input_buffer.copy_(cache[i // batch_size], non_blocking=True)
+        return
+    start_preprocess = time.time()
+    batch_images = preprocess(images[[(i + b) % imglen for b in range(batch_size)]])
+    preprocess_time += time.time() - start_preprocess
+    input_buffer[0:batch_size].copy_(batch_images)
 
 # Warmup runs
 print("Running warmup runs...")
 i = 0
-start_warmup_time = time.time()
-while time.time() - start_warmup_time < 30:
-    batch_images = images[i % imglen : (i % imglen) + batch_size]
-    batch_images = torch.stack([preprocess(image) for image in batch_images])
-    input_buffer[0:batch_size].copy_(batch_images)
+warmup = Warmup(cv=args.warmup_cv, max_s=args.warmup_max_s)
+done = False
+while not done:
+    start_warmup_time = time.perf_counter()
+    load_batch(i)
     context.execute_async_v2(
         bindings,
         torch.cuda.current_stream().cuda_stream
     )
     torch.cuda.current_stream().synchronize()
+    done = warmup.record(time.perf_counter() - start_warmup_time)
     i += batch_size
+warmup_report = warmup.report()
+print(f"Warmup: {warmup_report['batches']} batches in {warmup_report['seconds']:.2f} s (latency CV {warmup_report['cv']:.3f}, {'stable' if warmup_report['stable'] else 'not stable'})")
 
 
 print("Starting benchmark...")
 i = 0
 num_batches = 0
+preprocess_time = 0
 start_time = time.time()
 while time.time() - start_time < args.duration:
-    batch_images = images[i % imglen : (i % imglen) + batch_size]
-    batch_images = torch.stack([preprocess(image) for image in batch_images])
-    input_buffer[0:batch_size].copy_(batch_images)
+    load_batch(i)
     context.execute_async_v2(
         bindings,   
         torch.cuda.current_stream().cuda_stream
     )
+    for host_buffer, output_buffer in zip(host_buffers, output_buffers):
+        host_buffer.copy_(output_buffer, non_blocking=True)
     torch.cuda.current_stream().synchronize()
 
-    output = [output_buffer[0:batch_size].cpu().numpy() for output_buffer in output_buffers]
+    output = host_arrays
 
     # here you should check the output against a label
 
@@ -121,3 +167,7 @@ end_time_str = datetime.fromtimestamp(end_time).strftime('%Y-%m-%d %H:%M:%S.%f')
 print(f'Start timestamp: {start_time_str}')
 print(f'End timestamp: {end_time_str}')
 print(f'Throughput: {throughput:.2f} inferences per second')
+if host_buffers:
+    print(f'Readback: {output_bytes * num_batches / 2**20:.2f} MB copied ({output_bytes / 2**10:.1f} kB per batch), {len(host_buffers)} pinned host buffers allocated once')
+if cache is None:
+    print(f'Preprocessing time: {preprocess_time:.2f} s ({preprocess_time / num_batches * 1000:.2f} ms per batch)')
@@ -1,4 +1,5 @@
 import os
+import sys
 import subprocess
 import time
 from multiprocessing import Process
@@ -8,6 +9,10 @@ from util.exporter import export
 from util.SysConfigClass import SysConfig
 import argparse
 
+# CPU policies and GPU devfreq paths are resolved through the policy Discovery module
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "policy"))
+from Discovery import Discovery
+
 '''
 This script executes the benchmark_gpudla.py and stats.py scripts in concurrence.
 In this way we record the power consumption given by a specific TensorRT Engine
@@ -28,15 +33,17 @@ CpuFreqMin = "268800"
 CpuFreqMax = "1984000"
 CpuNum = 0
 
-CpuGovernorPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_governor"
-CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_setspeed"
-CpuMinFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_min_freq"
-CpuMaxFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_max_freq"
+discovery = Discovery()
+
+CpuGovernorPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_governor")
+CpuFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_setspeed")
+CpuMinFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_min_freq")
+CpuMaxFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_max_freq")
 
-GpuGovernorPath = f"/sys/devices/gpu.0/devfreq/17000000.ga10b/governor"
-GpuFrequencyPath = f"/sys/devices/gpu.0/devfreq/17000000.ga10b/target_freq"
-GpuMinFrequencyPath = f"/sys/devices/gpu.0/devfreq/17000000.ga10b/min_freq"
-GpuMaxFrequencyPath = f"/sys/devices/gpu.0/devfreq/17000000.ga10b/max_freq"
+GpuGovernorPath = os.path.join(discovery.gpu(), "governor")
+GpuFrequencyPath = os.path.join(discovery.gpu(), "target_freq")
+GpuMinFrequencyPath = os.path.join(discovery.gpu(), "min_freq")
+GpuMaxFrequencyPath = os.path.join(discovery.gpu(), "max_freq")
 
 sysconfig = SysConfig()
 
@@ -53,8 +60,8 @@ def init_sysconfig(MAXN=False):
         return
     
     CpuNum = 0
-    CpuMinFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_min_freq"
-    CpuMaxFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_max_freq"
+    CpuMinFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_min_freq")
+    CpuMaxFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_max_freq")
 
     print(f"Setting min max CPU frequencies: {CpuFreqMin} -> {CpuFreqMax}")
     sysconfig.SetCPUFreqMin(CpuNum, CpuFreqMin, CpuMinFrequencyPath)
@@ -62,8 +69,8 @@ def init_sysconfig(MAXN=False):
     if MAXN:
 
         CpuNum = 4
-        CpuMinFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_min_freq"
-        CpuMaxFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_max_freq"
+        CpuMinFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_min_freq")
+        CpuMaxFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_max_freq")
 
         sysconfig.SetCPUFreqMin(CpuNum, CpuFreqMin, CpuMinFrequencyPath)
         sysconfig.SetCPUFreqMax(CpuNum, CpuFreqMax, CpuMaxFrequencyPath)
@@ -80,16 +87,16 @@ def restore_sysconfig(MAXN=False):
         return
     
     CpuNum = 0
-    CpuGovernorPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_governor"
-    CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_setspeed"
+    CpuGovernorPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_governor")
+    CpuFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_setspeed")
 
     print(f"Restoring CPU/GPU frequencies")
     sysconfig.SetCPUFreq(CpuNum, "729600", CpuGovernorPath, CpuFrequencyPath)
     if MAXN:
 
         CpuNum = 4
-        CpuGovernorPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_governor"
-        CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_setspeed"
+        CpuGovernorPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_governor")
+        CpuFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_setspeed")
 
         sysconfig.SetCPUFreq(CpuNum, "729600", CpuGovernorPath, CpuFrequencyPath)
     
@@ -119,8 +126,8 @@ def set_frequencies(CpuFreq, GpuFreq, MAXN=False):
         return
     
     CpuNum = 0
-    CpuGovernorPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_governor"
-    CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_setspeed"
+    CpuGovernorPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_governor")
+    CpuFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_setspeed")
     
     # CPU freq
     if GpuFreq is None:
@@ -131,8 +138,8 @@ def set_frequencies(CpuFreq, GpuFreq, MAXN=False):
         if MAXN:
 
             CpuNum = 4
-            CpuGovernorPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_governor"
-            CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_setspeed"
+            CpuGovernorPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_governor")
+            CpuFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_setspeed")
 
             sysconfig.SetCPUFreq(CpuNum, CpuFreq, CpuGovernorPath, CpuFrequencyPath)
         return
@@ -144,14 +151,14 @@ def set_frequencies(CpuFreq, GpuFreq, MAXN=False):
             return
         
         CpuNum = 0
-        CpuGovernorPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_governor"
-        CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_setspeed"
+        CpuGovernorPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_governor")
+        CpuFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_setspeed")
 
         sysconfig.SetCPUFreq(CpuNum, "1881600", CpuGovernorPath, CpuFrequencyPath)  
         if MAXN:
             CpuNum = 4
-            CpuGovernorPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_governor"
-            CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{CpuNum}/cpufreq/scaling_setspeed"
+            CpuGovernorPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_governor")
+            CpuFrequencyPath = os.path.join(discovery.cpufreq(CpuNum), "scaling_setspeed")
 
             sysconfig.SetCPUFreq(CpuNum, "1881600", CpuGovernorPath, CpuFrequencyPath)
 
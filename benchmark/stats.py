@@ -1,45 +1,47 @@
+import os
+import sys
 import time
 import argparse
-import subprocess
 from datetime import datetime
 import random
 
+# The sysfs sampler and the sensor discovery are shared with the policy scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "policy"))
+from Sampler import Sampler
+from Discovery import Discovery
+
 '''
 This script periodaclly reads the power lines and logs the power consumption of various components.
 '''
 
-# Paths to the files
-VDD_IN_CURR_PATH = "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/curr1_input"
-VDD_IN_VOLT_PATH = "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/in1_input"
-VDD_CPU_GPU_CV_CURR_PATH = "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/curr2_input"
-VDD_CPU_GPU_CV_VOLT_PATH = "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/in2_input"
-VDD_SOC_CURR_PATH = "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/curr3_input"
-VDD_SOC_VOLT_PATH = "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/in3_input"
-
 MOCK = False
 
-# List of current and voltage path pairs
-path_pairs = [
-    (VDD_IN_CURR_PATH, VDD_IN_VOLT_PATH, "VDD_IN"),
-    (VDD_CPU_GPU_CV_CURR_PATH, VDD_CPU_GPU_CV_VOLT_PATH, "VDD_CPU_GPU_CV"),
-    (VDD_SOC_CURR_PATH, VDD_SOC_VOLT_PATH, "VDD_SOC")
-]
+sampler = Sampler()
+
+def discover_path_pairs(root="/sys"):
+    '''
+    Returns the list of (current path, voltage path, label) of the power lines, as resolved by Discovery.py.
+    '''
+    return [(paths["curr_path"], paths["volt_path"], label) for label, paths in Discovery(root).rails().items()]
 
 def read_sensor_data(path):
     if MOCK:
         return random.randint(0, 1000)
-    try:
-        result = subprocess.run(['sudo', 'cat', path], capture_output=True, text=True)
-        return int(result.stdout.strip())
-    except Exception as e:
-        return f"Error: {e}"
+    value = sampler.read(path)
+    if value is None:
+        return f"Error: could not read {path}"
+    return value
 
-def main(interval, log_file=None, duration=None):
+def main(interval, log_file=None, duration=None, path_pairs=None):
     '''
     interval: Interval between readings in milliseconds.
-    log_file: The output will be logged to this file.
+    log_file: The output will be logged to this file (kept open for the whole run, written in batches).
     duration: The script will run for this many seconds.
+    path_pairs: List of (current path, voltage path, label) of the power lines to read (discovered if None).
     '''
+    if path_pairs is None:
+        path_pairs = discover_path_pairs(sampler.root)
+    log = open(log_file, 'a', buffering=1 << 16) if log_file else None
     start_time = time.time()
     while True:
         if duration and (time.time() - start_time) >= duration:
@@ -55,16 +57,20 @@ def main(interval, log_file=None, duration=None):
             else:
                 log_entry += f"Error reading sensor data for paths ({curr_path}, {volt_path})\n"
         print(log_entry.strip())
-        if log_file:
-            with open(log_file, 'a') as f:
-                f.write(log_entry.strip() + '\n')
+        if log:
+            log.write(log_entry.strip() + '\n')
         time.sleep(interval / 1000.0)
+    if log:
+        log.close()
+    sampler.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Read sensor data and log power consumption.')
     parser.add_argument('--interval', type=int, help='Interval between readings in milliseconds')
     parser.add_argument('--log-file', type=str, help='File to log the data')
     parser.add_argument('--duration', type=int, help='Duration to run the script in seconds')
+    parser.add_argument('--sysfs-root', type=str, default='/sys', help='Root of the sysfs tree to read the sensors from')
     args = parser.parse_args()
     
+    sampler.root = args.sysfs_root
     main(args.interval, args.log_file, args.duration)
\ No newline at end of file
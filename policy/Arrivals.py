@@ -0,0 +1,197 @@
+import time
+import datetime
+from collections import deque
+import numpy as np
+
+from LatencyHistogram import LatencyHistogram
+
+'''
+This module implements the open-loop serving mode of Engine.py: requests arrive at times drawn from an arrival
+process, wait in a bounded input queue and are served in batches by the engine.
+
+Arrival processes (the "arrivals" dictionary of a model in the configuration, see create_arrivals):
+- "poisson": exponential inter-arrival times of mean 1 / "rate"
+- "bursty": on/off Poisson process. Requests arrive at "burst_rate" during bursts of mean duration "burst_s" and
+  not at all between them; the idle periods are sized so that the mean rate is "rate"
+- "trace": replay of the arrival times (s, one per line, first column if comma-separated) of the file "path",
+  scaled by "scale" and looped if "loop" is true (default)
+
+The request queue records, for every request, the queueing delay (arrival to dispatch in a batch), the service time
+(dispatch to completion of its batch) and the response time (arrival to completion), in LatencyHistogram objects,
+and counts the requests dropped because the queue was full ("queue" requests, default 64).
+Arrival times are known in advance, so the queueing delay is exact even when the requests are admitted late.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+ARRIVAL_PROCESSES = ("poisson", "bursty", "trace")
+
+def poisson_arrivals(rate, seed=0):
+    '''
+    Yields the arrival times (s from the start) of a Poisson process of the given rate (requests/s).
+    '''
+    generator = np.random.default_rng(seed)
+    t = 0.0
+    while True:
+        for gap in generator.exponential(1 / rate, size=1024):
+            t += gap
+            yield t
+
+def bursty_arrivals(rate, burst_rate, burst_s, seed=0):
+    '''
+    Yields the arrival times (s from the start) of an on/off Poisson process of mean rate "rate": bursts of
+    exponential duration (mean burst_s) at burst_rate, separated by exponential idle periods.
+    '''
+    if burst_rate <= rate:
+        raise ValueError(f"Burst rate {burst_rate} must be higher than the mean rate {rate}")
+    generator = np.random.default_rng(seed)
+    idle_s = burst_s * (burst_rate / rate - 1)
+    t = 0.0
+    while True:
+        end = t + generator.exponential(burst_s)
+        t += generator.exponential(1 / burst_rate)
+        while t < end:
+            yield t
+            t += generator.exponential(1 / burst_rate)
+        t = end + generator.exponential(idle_s)
+
+def trace_arrivals(path, scale=1.0, loop=True):
+    '''
+    Yields the arrival times (s from the start) read from a trace file, scaled and optionally looped.
+    '''
+    times = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                times.append(float(line.split(",")[0]) * scale)
+            except ValueError:
+                continue    # Header
+    if not times:
+        raise ValueError(f"No arrival times in {path}")
+    times.sort()
+    first, span = times[0], times[-1] - times[0]
+    # Consecutive replays are separated by the mean inter-arrival time of the trace
+    gap = span / (len(times) - 1) if len(times) > 1 else 1.0
+    offset = 0.0
+    while True:
+        for t in times:
+            yield offset + t - first
+        if not loop:
+            return
+        offset += span + gap
+
+def create_arrivals(config):
+    '''
+    Returns the arrival times generator described by an "arrivals" configuration dictionary.
+    '''
+    process = config.get("process", "poisson")
+    if process == "poisson":
+        return poisson_arrivals(config["rate"], config.get("seed", 0))
+    if process == "bursty":
+        return bursty_arrivals(config["rate"], config["burst_rate"], config.get("burst_s", 0.2), config.get("seed", 0))
+    if process == "trace":
+        return trace_arrivals(config["path"], config.get("scale", 1.0), config.get("loop", True))
+    raise ValueError(f"Unknown arrival process {process}")
+
+
+class RequestQueue:
+    def __init__(self, arrivals, capacity=64):
+        '''
+        arrivals: Iterator of the arrival times (s from the start).
+        capacity: Maximum number of queued requests (arrivals beyond it are dropped).
+        '''
+        self.arrivals = arrivals
+        self.capacity = capacity
+        self.queue = deque()                    # Arrival times (monotonic clock) of the queued requests
+        self.window_stats = self.counters()
+        self.run_stats = self.counters()
+        self.start()
+
+    def counters(self):
+        return {"arrived": 0, "served": 0, "dropped": 0, "queue_max": 0,
+                "queue_delay": LatencyHistogram(), "service": LatencyHistogram(), "response": LatencyHistogram()}
+
+    def start(self):
+        '''
+        Starts the arrivals now.
+        '''
+        self.origin = time.monotonic()
+        self.next = self.origin + next(self.arrivals, float('inf'))
+
+    def admit(self):
+        '''
+        Queues the requests arrived until now. Returns the number of queued requests.
+        '''
+        now = time.monotonic()
+        while self.next <= now:
+            self.window_stats["arrived"] += 1
+            if len(self.queue) < self.capacity:
+                self.queue.append(self.next)
+                self.window_stats["queue_max"] = max(self.window_stats["queue_max"], len(self.queue))
+            else:
+                self.window_stats["dropped"] += 1
+            self.next = self.origin + next(self.arrivals, float('inf'))
+        return len(self.queue)
+
+    def wait(self, timeout):
+        '''
+        Sleeps until the next arrival (at most timeout seconds) and queues it. Returns the time (s) slept.
+        '''
+        start = time.monotonic()
+        time.sleep(max(0, min(self.next - start, timeout)))
+        self.admit()
+        return time.monotonic() - start
+
+    def dispatch(self, size):
+        '''
+        Removes up to size requests from the queue for a batch. Returns (dispatch time, arrival times).
+        '''
+        now = time.monotonic()
+        requests = [self.queue.popleft() for _ in range(min(size, len(self.queue)))]
+        for arrival in requests:
+            self.window_stats["queue_delay"].record(now - arrival)
+        return now, requests
+
+    def complete(self, batch):
+        '''
+        Records the completion of a batch returned by dispatch(). Returns the number of requests served.
+        '''
+        now = time.monotonic()
+        dispatched, requests = batch
+        for arrival in requests:
+            self.window_stats["service"].record(now - dispatched)
+            self.window_stats["response"].record(now - arrival)
+        self.window_stats["served"] += len(requests)
+        return len(requests)
+
+    def report(self, stats):
+        return {
+            "arrived": stats["arrived"], "served": stats["served"], "dropped": stats["dropped"], "queue_max": stats["queue_max"],
+            "queue_delay": stats["queue_delay"].summary(), "service": stats["service"].summary(), "response": stats["response"].summary(),
+        }
+
+    def window(self):
+        '''
+        Returns the requests "arrived", "served" and "dropped", the maximum queue length ("queue_max") and the
+        "queue_delay", "service" and "response" time percentiles (see LatencyHistogram.summary) since the previous
+        call, and starts a new window.
+        '''
+        report = self.report(self.window_stats)
+        for key in ("arrived", "served", "dropped"):
+            self.run_stats[key] += self.window_stats[key]
+        self.run_stats["queue_max"] = max(self.run_stats["queue_max"], self.window_stats["queue_max"])
+        for key in ("queue_delay", "service", "response"):
+            self.run_stats[key].merge(self.window_stats[key])
+        self.window_stats = self.counters()
+        return report
+
+    def total(self):
+        '''
+        Returns the statistics of the whole run (see window()), including the current window.
+        '''
+        self.window()
+        return self.report(self.run_stats)
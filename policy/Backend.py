@@ -0,0 +1,209 @@
+import time
+import datetime
+
+from Stats import memory_footprint
+
+'''
+This module defines the execution backends of Engine.py.
+A backend owns everything that depends on the inference runtime: the engine, the input/output buffers and the input
+data. Engine.execute only drives the backend through the following interface, so that the heartbeat, pacing and
+telemetry logic is shared by every backend:
+- setup(): loads the engine and prepares the input data (called before the start barrier)
+- load(i, slot): copies the batch starting at image i to the input buffer of a slot, returns the time (s) spent preprocessing
+- launch(slot): starts the inference of the batch of a slot, without waiting for it
+- wait(slot): waits for the inference of the batch of a slot to complete
+- readback(slot): copies the outputs of a completed slot to the host and returns them as host arrays
+- infer(slot): launch + wait
+- close(): releases the resources
+
+The outputs are read back in place into host buffers allocated once per slot (pinned memory for TensorRT), or not
+at all if engine.readback is False. readback_bytes counts the bytes copied to the host and host_buffers the host
+output buffers preallocated by setup() (no host buffer is allocated during the run).
+
+A backend holds engine.pipeline slots (in-flight batches), each with its own input/output buffers (and stream), so
+that Engine.execute can load and read back batches while the others are running (see Engine.execute).
+
+Backends:
+- "tensorrt": TensorRT engine run on the GPU/DLA through torch (TensorRTBackend)
+- "mock": emulated inference latency for hosts without GPU (see MockBackend.py)
+
+torch and tensorrt are imported by TensorRTBackend.setup, so that this module can be imported without them.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+BACKENDS = ("tensorrt", "mock")
+
+def create_backend(engine):
+    '''
+    Returns the backend selected by engine.backend for the given engine.
+
+    engine: Engine object.
+    '''
+    if engine.backend == "tensorrt":
+        return TensorRTBackend(engine)
+    if engine.backend == "mock":
+        from MockBackend import MockBackend
+        return MockBackend(engine)
+    raise ValueError(f"Unknown backend {engine.backend}")
+
+class Backend:
+    def __init__(self, engine):
+        '''
+        engine: Engine object, providing the engine path, the device, the I/O shapes and the preprocessing options.
+        '''
+        self.engine = engine
+        self.slots = engine.pipeline    # Number of in-flight batches
+        self.preprocessing = False      # True if load() preprocesses the images at every inference
+        self.readback_bytes = 0         # Bytes of outputs copied to the host
+        self.host_buffers = 0           # Host output buffers preallocated by setup()
+        self.info = {}                  # Information reported in the engine run info (see Engine.get_heartbeats)
+
+    def setup(self):
+        raise NotImplementedError
+
+    def load(self, i, slot=0):
+        raise NotImplementedError
+
+    def launch(self, slot=0):
+        raise NotImplementedError
+
+    def wait(self, slot=0):
+        raise NotImplementedError
+
+    def infer(self, slot=0):
+        self.launch(slot)
+        self.wait(slot)
+
+    def readback(self, slot=0):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class TensorRTSlot:
+    '''
+    Execution context, I/O buffers and CUDA stream of an in-flight batch of TensorRTBackend.
+    '''
+    def __init__(self, torch, trt_engine, engine, input_dtype, stream):
+        '''
+        The host output buffers (pinned if CUDA is available) are only allocated if engine.readback is True.
+        '''
+        self.context = trt_engine.create_execution_context()
+        self.context.set_input_shape(trt_engine.get_tensor_name(0), engine.input_shape)
+        self.input_buffer = torch.zeros(engine.input_shape, dtype=input_dtype, device=torch.device('cuda')).contiguous()
+        self.output_buffers = [torch.zeros((engine.batch_size, *shape[1:]), dtype=torch.float32, device=torch.device('cuda')).contiguous() for shape in engine.output_shapes]
+        self.bindings = [self.input_buffer.data_ptr()] + [output_buffer.data_ptr() for output_buffer in self.output_buffers]
+        self.host_buffers = [torch.empty(output_buffer.shape, dtype=output_buffer.dtype, pin_memory=torch.cuda.is_available()) for output_buffer in self.output_buffers] if engine.readback else []
+        self.host_arrays = [host_buffer.numpy() for host_buffer in self.host_buffers]
+        self.stream = stream
+        self.event = torch.cuda.Event()
+
+
+class TensorRTBackend(Backend):
+    '''
+    Runs a serialized TensorRT engine with torch CUDA buffers.
+    Every slot has its own execution context and stream (the current stream if there is a single slot).
+    '''
+    def setup(self):
+        '''
+        Initializes the CUDA context and the TensorRT runtime, deserializes the engine, allocates the I/O buffers
+        of every slot and prepares the input data (batch cache or images preprocessed at every inference).
+        '''
+        import torch
+        import tensorrt as trt
+        from BatchCache import BatchCache
+        from MockData import corpus_length, inline_preprocess
+
+        self.torch = torch
+        engine = self.engine
+
+        # ------- Initialize CUDA context and TensorRT engine within the process -------
+
+        logger = trt.Logger()
+        runtime = trt.Runtime(logger)
+
+        # Necessary to specificy to the runtime which DLA core to use
+        if engine.device == "DLA0":
+            runtime.DLA_core = 0
+        elif engine.device == "DLA1":
+            runtime.DLA_core = 1
+
+        with open(engine.enginepath, 'rb') as f:
+            self.trt_engine = runtime.deserialize_cuda_engine(f.read())
+
+        input_dtype = getattr(torch, engine.input_dtype)
+        self.contexts = [
+            TensorRTSlot(torch, self.trt_engine, engine, input_dtype, torch.cuda.current_stream() if self.slots == 1 else torch.cuda.Stream())
+            for _ in range(self.slots)
+        ]
+        self.host_buffers = sum(len(current.host_buffers) for current in self.contexts)
+        self.outputbytes = sum(host_buffer.numel() * host_buffer.element_size() for host_buffer in self.contexts[0].host_buffers)
+
+        print(f"[{get_ts()}] [Backend.py] [D] Correctly generated context for {engine.name} ({self.slots} slots)")
+
+        # ------- Data preprocessing and image generation ---------
+
+        # In "cache" mode the batches are built here, once, from images at the model input shape.
+        # Otherwise the images are created at the source shape of the legacy generation (224x224 HWC) and the
+        # inference loop changes their layout, resizes them to the model input shape and converts them to the
+        # input dtype (scaling to [0, 1]), as the legacy Resize/ToTensor path
+        self.preprocess = inline_preprocess(engine.input_shape, input_dtype)
+        self.cache = None
+        before = memory_footprint()
+        if engine.preprocess == "cache":
+            engine.create_data(numimgs=engine.cachebatches * engine.batch_size)
+            self.cache = BatchCache(engine.input_shape, engine.cachebatches, dtype=input_dtype).build(engine.images)
+        else:
+            engine.create_data(numimgs=corpus_length(engine.data_shape(), engine.batch_size))
+            self.preprocessing = True
+        self.images = engine.images
+        after = memory_footprint()
+        print(f"[{get_ts()}] [Backend.py] [D] {engine.name} input data: RSS {before['rss_kb'] / 1024:.1f} -> {after['rss_kb'] / 1024:.1f} MB, USS {before['uss_kb'] / 1024:.1f} -> {after['uss_kb'] / 1024:.1f} MB")
+        self.info = {
+            "backend": "tensorrt",
+            "pipeline": self.slots,
+            "readback": engine.readback,
+            "preprocess": engine.preprocess,
+            "cache_build_s": self.cache.build_time if self.cache is not None else 0.0,
+            **engine.datatime,
+            "footprint": {"rss_before_kb": before["rss_kb"], "uss_before_kb": before["uss_kb"], "rss_after_kb": after["rss_kb"], "uss_after_kb": after["uss_kb"]},
+        }
+
+    def load(self, i, slot=0):
+        current = self.contexts[slot]
+        with self.torch.cuda.stream(current.stream):
+            if self.cache is not None:
+                current.input_buffer.copy_(self.cache[i // self.engine.batch_size], non_blocking=True)
+                return 0.0
+            start_preprocess = time.time()
+            batch_images = self.preprocess(self.images[[(i + b) % len(self.images) for b in range(self.engine.batch_size)]])
+            preprocess_time = time.time() - start_preprocess
+            current.input_buffer[0:self.engine.batch_size].copy_(batch_images)
+        return preprocess_time
+
+    def launch(self, slot=0):
+        current = self.contexts[slot]
+        current.context.execute_async_v2(
+            current.bindings,
+            current.stream.cuda_stream
+        )
+        current.event.record(current.stream)
+
+    def wait(self, slot=0):
+        self.contexts[slot].event.synchronize()
+
+    def readback(self, slot=0):
+        # Copies the outputs in place into the pinned host buffers of the slot, on its stream (the other slots keep running),
+        # and returns views of the host buffers (valid until the slot is read back again)
+        # NOTE: We don't perform any postprocessing
+        current = self.contexts[slot]
+        if current.host_buffers:
+            with self.torch.cuda.stream(current.stream):
+                for host_buffer, output_buffer in zip(current.host_buffers, current.output_buffers):
+                    host_buffer.copy_(output_buffer, non_blocking=True)
+            current.stream.synchronize()
+        self.readback_bytes += self.outputbytes
+        return current.host_arrays
@@ -0,0 +1,60 @@
+import time
+import datetime
+import torch
+
+'''
+This module implements the cache of preprocessed input batches used by Engine.py (and benchmark/benchmark_gpudla.py).
+Instead of resizing and converting the images at every inference, a fixed number of batches is preprocessed once,
+before the start barrier, at the exact input shape of the engine. The batches are held in a single contiguous
+tensor in pinned (page-locked) host memory, so that the inference loop only performs the host to device copy.
+
+The cache is bounded (numbatches batches): a 3x640x640 float32 batch of 1 image takes ~4.9 MB.
+It is filled from a uint8 mock corpus (see MockData.py), converted to the input dtype and scaled to [0, 1]
+as done by ToTensor.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+class BatchCache:
+    def __init__(self, input_shape, numbatches=16, pin=True, dtype=torch.float32):
+        '''
+        input_shape: Input shape of the engine (batch size first).
+        numbatches: Number of batches held by the cache.
+        pin: If True (and CUDA is available), the batches are allocated in pinned host memory.
+        dtype: Input dtype of the engine.
+        '''
+        self.input_shape = tuple(input_shape)
+        self.batch_size = self.input_shape[0]
+        self.numbatches = numbatches
+        self.pinned = pin and torch.cuda.is_available()
+        self.batches = torch.empty((numbatches, *self.input_shape), dtype=dtype, pin_memory=self.pinned)
+        self.build_time = 0.0
+
+    def build(self, corpus):
+        '''
+        Fills the cache with the images of a corpus at the input shape, cycling through the corpus if needed.
+        uint8 images are scaled to [0, 1] when the input dtype is floating point.
+
+        corpus: Tensor of shape (N, C, H, W), e.g. created by MockData.mock_corpus.
+        '''
+        print(f"[{get_ts()}] [BatchCache.py] [D] Preprocessing {self.numbatches} batches of shape {self.input_shape} (pinned: {self.pinned})")
+        start = time.perf_counter()
+        images = self.batches.view(-1, *self.input_shape[1:])
+        for first in range(0, len(images), len(corpus)):
+            count = min(len(corpus), len(images) - first)
+            images[first:first + count].copy_(corpus[:count])
+        if corpus.dtype == torch.uint8 and self.batches.is_floating_point():
+            self.batches.div_(255)
+        self.build_time = time.perf_counter() - start
+        print(f"[{get_ts()}] [BatchCache.py] [D] Batch cache built in {self.build_time:.2f} s ({self.batches.numel() * self.batches.element_size() / 2**20:.1f} MB)")
+        return self
+
+    def __len__(self):
+        return self.numbatches
+
+    def __getitem__(self, k):
+        '''
+        Returns the k-th batch (cycling over the cache).
+        '''
+        return self.batches[k % self.numbatches]
@@ -1,11 +1,22 @@
 import json
+import time
 import datetime
+import threading
 import multiprocessing
 import traceback
 
 from Engine import Engine
-from Stats import Stats
+from Stats import Stats, memory_footprint
 from Refine import Refine
+from Energy import energy_report
+from Residency import mean_frequency
+from Telemetry import Telemetry
+from StatsWorker import stats_worker
+from SharedCorpus import SharedCorpus
+from MockData import corpus_length
+from StageTimers import STAGES
+from EnginePool import EnginePool
+from Scheduling import apply_scheduling
 import os
 import csv
 
@@ -14,20 +25,47 @@ This module is responsible for reading the configuration file, initializing the
 executing the workload on the engines while collecting statistics.
 It reads the configuration from a JSON file, builds the engines, and runs them in parallel with a stats process.
 It runs Refine.refine() to print the next CPU and GPU frequencies to use based on the collected heartbeats.
-It export the configuration run statistics
+Heartbeats are received live from the workers through a shared memory telemetry channel (see Telemetry.py).
+It export the configuration run statistics, including the energy per inference of every heartbeat window (see Energy.py)
+With persistent workers, the engines run in a pool of long-lived processes (see EnginePool.py) kept across runs and
+configurations, instead of a new process (and a new backend setup) per engine for every run.
+With online refine, Refine is also run while the engines are running, on the live heartbeats, and the new frequencies
+are applied without stopping them (see refine_online). Every heartbeat is tagged with the clock setting active.
+The CPU affinity and priority of the engine and stats workers are applied when they start (see Scheduling.py). By
+default the engines run on the CPU clusters whose frequency is set by SysConfig (self.enginecpus).
 '''
 
 def get_ts():
     return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
 
+LATENCY_STATS = ("p50", "p95", "p99", "max")   # Latency percentiles exported by export_heartbeats
+SERVING_TIMES = ("queue_delay", "response")     # Request times exported by export_heartbeats in serving mode
+SERVING_STATS = ("p50", "p99")
+
 class Config:
     def __init__(self):
         self.engines = None
         self.stats = None
         self.heartbeats = []
         self.statsheartbeats = None
+        self.live = None                # Heartbeats received so far from the running workers (see collect)
         self.cpufreq = None
         self.gpufreq = None
+        self.refined = None             # (CPU, GPU) frequencies proposed by Refine after the last run
+        self.statsmode = "process"      # How the stats sampler is run: "process" (forked), "spawn" (process without torch) or "thread"
+        self.statsburst = None          # Adaptive sampling of the stats sampler: {"interval" (ms), "window" (s), "anomaly"} (None disables it)
+        self.sharedcorpus = True        # If True, the engines map a shared input corpus per input shape instead of generating their own
+        self.persistent = False         # If True, the engines run in a persistent worker pool (see EnginePool.py)
+        self.pool = None                # Persistent worker pool, kept across runs and configurations until close()
+        self.heartbeat = 10             # Heartbeat interval (s) of the engines and of the stats sampler
+        self.onlinerefine = None        # Online refine options {"every": heartbeats per decision} (None disables it)
+        self.set_frequencies = None     # Callback set_frequencies(cpu, gpu) applying frequencies (e.g. SysConfig.set_frequencies), used by the online refine
+        self.clocks = []                # Clock settings of the last run: (time set on the monotonic clock, CPU, GPU)
+        self.decided = []               # Number of windows of every engine already used by the online refine
+        self.enginecpus = None          # Default CPUs of the engines (e.g. SysConfig.controlled_cpus), None to leave them unpinned
+        self.statsscheduling = {}       # CPU affinity and priority of the stats sampler (see Scheduling.py)
+        self.forkedfootprint = None     # Footprint of the last forked ("process") stats sampler, baseline of the other modes
+        self.inputrail = "VDD_IN"       # Label of the power line measuring the total input power (see Discovery.input_rail)
 
     def print_config(self):
         '''
@@ -53,7 +91,16 @@ class Config:
         self.cpufreq = frequencies.get("cpu", None)
         self.gpufreq = frequencies.get("gpu", None)
 
-        self.stats = Stats()
+        sysfs_root = config.get("sysfs_root", "/sys")
+        self.stats = Stats(sysfs_root=sysfs_root)
+        self.inputrail = self.stats.inputrail
+        self.statsmode = config.get("stats_mode", "process")
+        self.statsburst = config.get("stats_burst", None)
+        self.sharedcorpus = config.get("shared_corpus", True)
+        self.persistent = config.get("persistent_workers", False)
+        self.heartbeat = config.get("heartbeat", 10)
+        self.onlinerefine = config.get("online_refine", None)
+        self.statsscheduling = config.get("stats_scheduling", {})
         self.engines = []
         for engine_config in config["models"]:
             print(f"[{get_ts()}] [Config.py] [D] Building {engine_config['name']}")
@@ -73,6 +120,20 @@ class Config:
                 enginepath = enginepath + "gpu.engine"
 
             engine.throughput = engine_config.get("throughput", -1)
+            engine.preprocess = engine_config.get("preprocess", "cache")
+            engine.cachebatches = engine_config.get("cache_batches", 16)
+            engine.seed = engine_config.get("seed", 0)
+            engine.backend = engine_config.get("backend", config.get("backend", "tensorrt"))
+            engine.pipeline = engine_config.get("pipeline", 1)
+            engine.readback = engine_config.get("readback", True)
+            engine.pacing = engine_config.get("pacing", {})
+            engine.stagetimers = engine_config.get("stage_timers", True)
+            engine.arrivals = engine_config.get("arrivals", None)
+            engine.warmup = engine_config.get("warmup", config.get("warmup", {}))
+            engine.scheduling = engine_config.get("scheduling", config.get("scheduling", {}))
+            engine.numapps = len(config["models"])
+            engine.sysfs_root = sysfs_root
+            engine.mockfreq = self.gpufreq
 
             engine.build_engine(enginepath, engine_config["engineinfo"])
 
@@ -83,74 +144,337 @@ class Config:
         print(f"[{printts}] [Config.py] [D] Correctly read config. All engines built")
         self.print_config()
 
-    def run(self, statscsvpath=None, execution_duration=35):
+    def collect(self, index, record):
+        '''
+        Updates the live heartbeats with a telemetry record published by a worker.
+
+        index: Index of the worker (engines in order, then the stats process).
+        record: Record published by Engine.execute or Stats.execute.
+        '''
+        live = self.live[index]
+        if record["kind"] == "heartbeat":
+            if index < len(self.engines):
+                previous = live["windows"][-1]["t"] if live["windows"] else self.clocks[0][0]
+                record["window"]["clocks"] = self.clock_setting(previous, record["window"]["t"])
+                if self.statsburst and live["heartbeats"]:
+                    # Heartbeat anomaly: throughput changed by more than the threshold w.r.t. the previous heartbeat
+                    previous = live["heartbeats"][-1]
+                    if previous > 0 and abs(record["throughput"] - previous) / previous > self.statsburst.get("anomaly", 0.2):
+                        self.signal_transient()
+                live["heartbeats"].append(record["throughput"])
+                live["heartbeats_actual"].append(record["actual"])
+                live["windows"].append(record["window"])
+            else:
+                previous = live["heartbeats"][-1]["t"] if live["heartbeats"] else self.clocks[0][0]
+                record["heartbeat"]["clocks"] = self.clock_setting(previous, record["heartbeat"]["t"])
+                live["heartbeats"].append(record["heartbeat"])
+                live["freqs"] = record["freqs"]
+        elif record["kind"] == "end":
+            live["info"] = record["info"]
+            if "freqs" in record:
+                live["freqs"] = record["freqs"]
+
+    def clock_setting(self, start, end):
+        '''
+        Returns the clock setting active at the end of a window of the last run: {"cpu", "gpu", "changes"}, where
+        "changes" is the number of frequency changes within the window (0 if the window ran at a single setting).
+
+        start: Start of the window (monotonic clock).
+        end: End of the window (monotonic clock).
+        '''
+        active = [clock for clock in self.clocks if clock[0] <= end]
+        _, cpu, gpu = active[-1] if active else self.clocks[0]
+        return {"cpu": cpu, "gpu": gpu, "changes": sum(start < t <= end for t, _, _ in self.clocks[1:])}
+
+    def refine_online(self):
+        '''
+        Runs Refine on the live heartbeats and applies the new frequencies (through self.set_frequencies) while the
+        engines keep running. A decision is taken once every engine has published "every" heartbeats (online refine
+        options) measured entirely at the current clock setting, i.e. after the previous change. Refine uses the last of them.
+        A decision that fails (Refine or set_frequencies) is reported and skipped: the run goes on at the current setting.
+        '''
+        every = self.onlinerefine.get("every", 1)
+        current = (self.clocks[-1][1], self.clocks[-1][2])
+        for live, decided in zip(self.live, self.decided):
+            settled = [window for window in live["windows"][decided:] if window["clocks"]["changes"] == 0 and (window["clocks"]["cpu"], window["clocks"]["gpu"]) == current]
+            if len(settled) < every or live["info"] is not None:
+                return
+        self.decided = [len(live["windows"]) for live in self.live[:len(self.engines)]]
+
+        heartbeats = [(engine.name, engine.device, engine.throughput, live["heartbeats"], live["heartbeats_actual"], None)
+                      for engine, live in zip(self.engines, self.live)]
+        try:
+            cpufreq, gpufreq = (str(freq) for freq in self.refiner.refine(heartbeats, *current))
+            if (cpufreq, gpufreq) == current:
+                print(f"[{get_ts()}] [Config.py] [I] Online refine: keeping CPU {cpufreq}, GPU {gpufreq}")
+                return
+            print(f"[{get_ts()}] [Config.py] [I] Online refine: CPU {current[0]} -> {cpufreq}, GPU {current[1]} -> {gpufreq}")
+            self.set_frequencies(cpufreq, gpufreq)
+        except Exception as e:
+            print(f"[{get_ts()}] [Config.py] [E] Online refine failed, keeping CPU {current[0]}, GPU {current[1]}: {e}")
+            traceback.print_exc()
+            return
+        self.clocks.append((time.monotonic(), cpufreq, gpufreq))
+        self.cpufreq, self.gpufreq = cpufreq, gpufreq
+
+    def create_corpora(self, engines=None):
+        '''
+        Creates one shared input corpus (see SharedCorpus.py) per distinct engine input shape, large enough for every
+        engine using it, and assigns it to the engines. Returns the list of corpora (to be closed after the run).
+        The seed of a corpus is the one of the first engine with its input shape.
+
+        engines: Engines to create the corpora for (default: all the engines of the configuration).
+        '''
+        engines = self.engines if engines is None else engines
+        lengths, seeds = {}, {}
+        for engine in engines:
+            if engine.backend == "mock":
+                continue    # The mock backend does not use input data
+            shape = engine.data_shape()
+            if engine.preprocess == "cache":
+                length = engine.cachebatches * engine.batch_size
+            else:
+                length = corpus_length(shape, engine.batch_size)
+            lengths[shape] = max(lengths.get(shape, 0), length)
+            seeds.setdefault(shape, engine.seed)
+        corpora = {shape: SharedCorpus(length, shape, seed=seeds[shape]) for shape, length in lengths.items()}
+        for engine in engines:
+            engine.corpus = corpora.get(engine.data_shape())
+        print(f"[{get_ts()}] [Config.py] [D] {len(corpora)} shared input corpora for {len(engines)} engines")
+        return list(corpora.values())
+
+    def configure_pool(self):
+        '''
+        Assigns a persistent worker to every engine (see EnginePool.configure), creating the pool if needed.
+        Only the engines whose setup changed since the previous configuration get a new worker (and input corpora).
+        '''
+        if self.pool is None:
+            self.pool = EnginePool()
+        changed = self.pool.changed(self.engines)
+        corpora = self.create_corpora(changed) if self.sharedcorpus and changed else []
+        self.pool.configure(self.engines)
+        # The workers mapped the corpora when starting, the segments can be removed
+        for corpus in corpora:
+            corpus.close()
+        for engine in changed:
+            engine.corpus = None
+
+    def close(self):
+        '''
+        Closes the persistent worker pool, if any.
+        '''
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def print_engines_footprint(self):
+        '''
+        Prints the RSS and USS of every engine process before and after creating its input data.
+        '''
+        print(f"[{get_ts()}] [Config.py] [I] Engines input data footprint (shared corpus: {self.sharedcorpus}):")
+        for name, _, _, _, _, info in self.heartbeats:
+            footprint = info["footprint"]
+            print(f"[{get_ts()}] [Config.py] [I]	{name}: RSS {footprint['rss_before_kb'] / 1024:.1f} -> {footprint['rss_after_kb'] / 1024:.1f} MB, "
+                  f"USS {footprint['uss_before_kb'] / 1024:.1f} -> {footprint['uss_after_kb'] / 1024:.1f} MB, backend setup {info.get('setup_s', 0.0):.3f} s")
+
+    def signal_transient(self):
+        '''
+        Signals a transient (frequency change, heartbeat anomaly) to the running stats sampler, which samples at
+        the burst interval for a while (see Stats.signal). Has no effect if adaptive sampling is disabled or no run is in progress.
+        Can be passed as callback to SysConfig (on_change) to signal frequency changes.
+        '''
+        if self.stats is not None:
+            self.stats.signal()
+
+    def poll_telemetry(self, telemetry, on_record=None):
+        '''
+        Reads the new telemetry records of every worker and updates the live heartbeats.
+
+        telemetry: Telemetry object of the run.
+        on_record: Optional callback on_record(index, record) invoked for every new record (e.g. a run-time controller).
+        '''
+        for index in range(telemetry.channels):
+            for record in telemetry.poll(index):
+                self.collect(index, record)
+                if on_record is not None:
+                    on_record(index, record)
+
+    def run(self, statscsvpath=None, execution_duration=35, statsformat="csv", on_record=None, statsmode=None):
         '''
         Runs the current configuration by executing all engines and the stats process in parallel.
         It collects heartbeats from each engine and the stats process, and then prints refinements results using Refine.refine().
+        Heartbeats are published by the workers on a shared memory telemetry channel, read by this process while the run is in progress.
 
         statscsvpath: If provided, the path to a CSV file where the VDD stats will be logged continuously in time.
         execution_duration: The total duration in seconds for which to run the engines and stats process.
+        statsformat: Format of the file at statscsvpath, "csv" or "bin" (see TraceWriter.py).
+        on_record: Optional callback on_record(index, record) invoked in this process for every heartbeat published during the run.
+                   index is the index of the engine in self.engines (len(self.engines) for the stats process).
+        statsmode: How the stats sampler is run (defaults to self.statsmode):
+                   "process": forked process (inherits the memory of this process)
+                   "spawn": spawned process, only importing Stats.py (no torch/TensorRT)
+                   "thread": thread of this process
+        With persistent workers (self.persistent), the engines run in the worker pool (see configure_pool), kept after the run.
+        With online refine (self.onlinerefine), the frequencies are refined and applied during the run (see refine_online).
         '''
+        statsmode = self.statsmode if statsmode is None else statsmode
+        if statsmode not in ("process", "spawn", "thread"):
+            raise ValueError(f"Unknown stats mode {statsmode}")
 
         print(f"[{get_ts()}] [Config.py] [D] Beginning execution of current configuration")
+        online = self.onlinerefine is not None
+        if online and self.set_frequencies is None:
+            print(f"[{get_ts()}] [Config.py] [W] Online refine disabled: no set_frequencies callback")
+            online = False
+        if online and (self.cpufreq is None or self.gpufreq is None):
+            print(f"[{get_ts()}] [Config.py] [W] Online refine disabled: no CPU/GPU frequency configured")
+            online = False
+        self.refiner = Refine()
+        self.statsheartbeats = None     # Set once the stats sampler completes this run (no report of a previous run)
+        self.clocks = [(time.monotonic(), None if self.cpufreq is None else str(self.cpufreq), None if self.gpufreq is None else str(self.gpufreq))]
+        self.decided = [0] * len(self.engines)
+        for engine in self.engines:
+            engine.defaultcpus = self.enginecpus
 
         num_processes = len(self.engines) + 1  # +1 for the stats process
-        start_barrier = multiprocessing.Barrier(num_processes)
+        # A spawned process can only share semaphores created by the spawn context (forked processes can share both)
+        context = multiprocessing.get_context("spawn") if statsmode == "spawn" else multiprocessing
+        if self.persistent:
+            self.configure_pool()
+            start_barrier = self.pool.barrier
+        else:
+            start_barrier = context.Barrier(num_processes)
+        self.stats.burst = context.Event() if self.statsburst else None
 
-        manager = multiprocessing.Manager()
-        shared_heartbeats = manager.list()  # Shared list for heartbeats
+        # One telemetry channel per worker: engines first, then stats
+        telemetry = Telemetry(num_processes)
+        self.live = [{"heartbeats": [], "heartbeats_actual": [], "windows": [], "info": None} for _ in self.engines]
+        self.live.append({"heartbeats": [], "freqs": (0, 0, 0), "info": None})
 
-        def engine_worker(engine, duration, barrier, shared_heartbeats):
+        def engine_worker(engine, duration, barrier, channel):
             try:
-                engine.execute(heartbeat=10, duration=duration, start_barrier=barrier)
-                shared_heartbeats.append(engine.get_heartbeats())
+                engine.schedulinginfo = apply_scheduling(engine.scheduling, engine.defaultcpus, engine.name)
+                engine.telemetry = channel
+                engine.execute(heartbeat=self.heartbeat, duration=duration, start_barrier=barrier)
             except Exception as e:
                 print(f"[{get_ts()}] [Config.py] [E] Engine execution error: {e}")
                 traceback.print_exc()
 
-        def stats_worker(stats, duration, barrier, shared_heartbeats, csvpath):
-            try:
-                print(f"[{get_ts()}] [Config.py] [D] Stats process waiting at the barrier...")
-                barrier.wait()  # Wait for all processes to be ready
-                stats.execute(heartbeat=10, interval=500, duration=duration, csvpath=csvpath)
-                shared_heartbeats.append(stats.get_heartbeats())
-            except Exception as e:
-                print(f"[{get_ts()}] [Config.py] [E] Stats execution error: {e}")
-                traceback.print_exc()
+        # Input corpora shared by the engines (created before forking, mapped by every engine process)
+        corpora = self.create_corpora() if self.sharedcorpus and not self.persistent else []
 
-        # Create a process for each engine
+        # Create a process for each engine (unless running in the persistent worker pool)
         processes = []
-        for engine in self.engines:
-            p = multiprocessing.Process(target=engine_worker, args=(engine, execution_duration, start_barrier, shared_heartbeats))
+        for i, engine in enumerate(self.engines if not self.persistent else []):
+            p = multiprocessing.Process(target=engine_worker, args=(engine, execution_duration, start_barrier, telemetry.channel(i)))
             processes.append(p)
 
-        # Create a process for stats
-        stats_process = multiprocessing.Process(target=stats_worker, args=(self.stats, execution_duration, start_barrier, shared_heartbeats, statscsvpath))
+        # Create a process (or a thread) for stats
+        stats_args = (self.stats, execution_duration, start_barrier, telemetry.channel(len(self.engines)), statscsvpath, statsformat)
+        stats_kwargs = {"heartbeat": self.heartbeat, "scheduling": self.statsscheduling}
+        if self.statsburst:
+            stats_kwargs.update(burst_interval=self.statsburst.get("interval", 50), burst_window=self.statsburst.get("window", 2.0))
+        if statsmode == "thread":
+            stats_process = threading.Thread(target=stats_worker, args=stats_args, kwargs=stats_kwargs)
+        else:
+            stats_process = context.Process(target=stats_worker, args=stats_args, kwargs=stats_kwargs)
         processes.append(stats_process)
 
         # Start all processes
+        parent_footprint = memory_footprint()
+        if self.persistent:
+            self.pool.start(execution_duration, telemetry, heartbeat=self.heartbeat)  # Sets the parties of the start barrier before the stats worker waits on it
         for process in processes:
             process.start()
 
+        # Read the heartbeats while the processes are running
+        while any(process.is_alive() for process in processes) or (self.persistent and self.pool.running()):
+            self.poll_telemetry(telemetry, on_record)
+            if online:
+                self.refine_online()
+            time.sleep(0.1)
+
         # Wait for all processes to complete
         for process in processes:
             process.join()
+        self.poll_telemetry(telemetry, on_record)
+        if any(telemetry.lost):
+            print(f"[{get_ts()}] [Config.py] [W] Telemetry records lost: {telemetry.lost}")
+        telemetry.close()
+        for corpus in corpora:
+            corpus.close()
+        for engine in self.engines:
+            engine.corpus = None
 
-        # Update the heartbeats in the main process
-        for heartbeat in shared_heartbeats:
-            if heartbeat[0] == "stats":
-                self.statsheartbeats = heartbeat
-            else:
-                self.heartbeats.append(heartbeat)
+        # Update the heartbeats in the main process (only for the workers that completed their run)
+        self.heartbeats = []
+        for engine, live in zip(self.engines, self.live):
+            if live["info"] is None:
+                print(f"[{get_ts()}] [Config.py] [E] Engine {engine.name} did not complete its run")
+                continue
+            info = dict(live["info"], windows=live["windows"])
+            self.heartbeats.append((engine.name, engine.device, engine.throughput, live["heartbeats"], live["heartbeats_actual"], info))
+        self.print_engines_footprint()
+        live = self.live[-1]
+        if live["info"] is None:
+            print(f"[{get_ts()}] [Config.py] [E] Stats process did not complete its run")
+        else:
+            self.statsheartbeats = ("stats", live["heartbeats"], *live["freqs"], live["info"])
+            self.print_stats_footprint(statsmode, live["info"]["footprint"], parent_footprint)
 
         print(f"[{get_ts()}] [Config.py] [D] Configuration execution completed")
+        if self.statsheartbeats is not None:
+            run = self.get_energy_report()["run"]
+            rail = self.inputrail
+            print(f"[{get_ts()}] [Config.py] [I] Run energy ({rail}): {run['energy_j'][rail]:.3f} J, {run['avg_power_w'][rail]:.3f} W, {run['mj_per_inference'][rail]:.3f} mJ/inference")
         
-        refiner = Refine()
-        new_cpuFreq, new_gpuFreq = refiner.refine(self.heartbeats, self.cpufreq, self.gpufreq)
+        if len(self.clocks) > 1:
+            print(f"[{get_ts()}] [Config.py] [I] Online refine: {len(self.clocks) - 1} frequency changes during the run")
+        self.refined = None
+        if self.cpufreq is None or self.gpufreq is None:
+            print(f"[{get_ts()}] [Config.py] [W] No CPU/GPU frequency configured, refine skipped")
+            return
+        new_cpuFreq, new_gpuFreq = self.refiner.refine(self.heartbeats, self.cpufreq, self.gpufreq)
         print(f"[{get_ts()}] [Config.py] [I] Refining results:")
         print(f"[{get_ts()}] [Config.py] [I]\tNew CPU frequency: {new_cpuFreq}")
         print(f"[{get_ts()}] [Config.py] [I]\tNew GPU frequency: {new_gpuFreq}")
+        self.refined = (str(new_cpuFreq), str(new_gpuFreq))
+
+
+    def print_stats_footprint(self, statsmode, footprint, parent_footprint):
+        '''
+        Prints the CPU time and memory used by the stats sampler.
+        A forked sampler ("process") is charged its USS (pages not shared with this process) and the CPU time of its process,
+        a spawned one its whole RSS, while a thread only costs its CPU time (its memory is the one of this process).
+        For the thread and spawn modes, the memory and CPU time saved are printed against a forked sampler: the USS and the
+        CPU time before sampling ("start_cpu_s") of the last "process" run of this configuration, or, if none was run,
+        its memory estimated from the page tables of this process (copied by the fork, a lower bound of its USS).
+        A spawned sampler is charged its whole RSS and the start of its interpreter (CPU time before sampling).
 
+        statsmode: How the stats sampler was run.
+        footprint: Footprint reported by Stats.execute.
+        parent_footprint: Footprint of this process before starting the workers.
+        '''
+        print(f"[{get_ts()}] [Config.py] [I] Stats sampler footprint ({statsmode}):")
+        print(f"[{get_ts()}] [Config.py] [I]	CPU time: {footprint['cpu_s']:.3f} s")
+        if statsmode == "thread":
+            print(f"[{get_ts()}] [Config.py] [I]	Memory: no additional process (parent RSS {parent_footprint['rss_kb'] / 1024:.1f} MB)")
+        elif statsmode == "spawn":
+            print(f"[{get_ts()}] [Config.py] [I]	Memory: RSS {footprint['rss_kb'] / 1024:.1f} MB (parent RSS {parent_footprint['rss_kb'] / 1024:.1f} MB not inherited)")
+        else:
+            print(f"[{get_ts()}] [Config.py] [I]	Memory: RSS {footprint['rss_kb'] / 1024:.1f} MB, USS {footprint['uss_kb'] / 1024:.1f} MB (inherited from parent RSS {parent_footprint['rss_kb'] / 1024:.1f} MB)")
+            self.forkedfootprint = footprint
+            return
+
+        memory_kb = footprint["rss_kb"] if statsmode == "spawn" else 0
+        start_cpu = footprint["start_cpu_s"] if statsmode == "spawn" else 0.0
+        forked = self.forkedfootprint
+        if forked is not None:
+            print(f"[{get_ts()}] [Config.py] [I]	Saved w.r.t. the last forked sampler (USS {forked['uss_kb'] / 1024:.1f} MB, {forked['start_cpu_s'] * 1000:.1f} ms CPU before sampling): "
+                  f"memory {(forked['uss_kb'] - memory_kb) / 1024:.1f} MB, CPU {(forked['start_cpu_s'] - start_cpu) * 1000:.1f} ms")
+        else:
+            print(f"[{get_ts()}] [Config.py] [I]	Saved w.r.t. a forked sampler, estimated from the parent page tables ({parent_footprint['pte_kb'] / 1024:.1f} MB, lower bound, no forked run measured): "
+                  f"memory {(parent_footprint['pte_kb'] - memory_kb) / 1024:.1f} MB")
 
     def export_heartbeats(self, output_path: str):
         '''
@@ -162,41 +486,64 @@ class Config:
             target: The target throughput for the engine
             throughput: The throughput measured by the engine in the last heartbeat
             actual_throughput: The actual throughput measured by the engine in the last heartbeat
-            vdd_in: The average VDD_IN value from the stats process        
-            vdd_cpu_gpu_cv: The average VDD_CPU_GPU_CV value from the stats process
-            vdd_soc: The average VDD_SOC value from the stats process
+            <line>: The average value of every power line discovered by the stats process (e.g. vdd_in, vdd_cpu_gpu_cv, vdd_soc on Orin Nano)
             run_gpu_freq: The running GPU frequency (in case frequency not set by user)
             run_cpu0_freq: The running CPU0 frequency (in case frequency not set by user)
             run_cpu4_freq: The running CPU4 frequency (in case frequency not set by user)
+            inferences: The number of inferences run by the engine
+            run_energy_j: The energy of the input power line (see Discovery.input_rail, VDD_IN on Orin Nano) of the whole run (J), integrated over time by the stats process
+            run_avg_power_w: The average power of the input power line of the whole run (W)
+            run_mj_per_inference: The energy of the input power line per inference of the whole run (mJ), over the inferences of all engines
+            run_<domain>_freq_mean_khz: The time-weighted mean frequency of the GPU/CPU0/CPU4 during the whole run (kHz, see export_residency)
+            run_latency_<p50|p95|p99|max>_ms: The latency percentiles of the batches of the engine during the whole run (ms, from load to readback)
+            run_<stage>_ms: The average time per batch of every stage of the inference loop during the whole run (ms, see StageTimers.py; empty if disabled)
+            served/dropped: The number of requests served and dropped (queue full) in serving mode (empty otherwise)
+            run_<queue_delay|response>_<p50|p99>_ms: The queueing delay and response time percentiles of the requests in serving mode (ms, empty otherwise)
+            warmup_batches/warmup_s: The number of batches and the duration (s) of the warmup of the engine
+            pacing_rate_error: The relative error of the rate of the batches released by the rate limiter w.r.t. the target (empty if not limited)
+            pacing_lateness_ms: The mean lateness of the releases of the rate limiter w.r.t. their release times (empty if not limited)
 
         output_path: The path to the output CSV file where the heartbeats will be saved.
         '''
 
+        if self.statsheartbeats is None:
+            print(f"[{get_ts()}] [Config.py] [E] No stats for the last run, heartbeats not exported")
+            return
         print(f"[{get_ts()}] [Config.py] [D] Exporting heartbeats to CSV at {output_path}")
+        labels = list(self.statsheartbeats[5]["energy_mJ"].keys())
+        rail = self.inputrail
         with open(output_path, mode='w', newline='') as csvfile:
             csv_writer = csv.writer(csvfile)
             # Write the header
-            csv_writer.writerow(["engine_name", "device", "cpu", "gpu", "target", "throughput", "actual_throughput", "vdd_in", "vdd_cpu_gpu_cv", "vdd_soc", "run_gpu_freq", "run_cpu0_freq", "run_cpu4_freq"])
+            csv_writer.writerow(["engine_name", "device", "cpu", "gpu", "target", "throughput", "actual_throughput"] + [label.lower() for label in labels] +
+                                ["run_gpu_freq", "run_cpu0_freq", "run_cpu4_freq", "inferences", "run_energy_j", "run_avg_power_w", "run_mj_per_inference"] +
+                                [f"run_{domain}_freq_mean_khz" for domain in self.statsheartbeats[5]["residency"]] +
+                                [f"run_latency_{stat}_ms" for stat in LATENCY_STATS] + [f"run_{stage}_ms" for stage in STAGES] +
+                                ["served", "dropped"] + [f"run_{kind}_{stat}_ms" for kind in SERVING_TIMES for stat in SERVING_STATS] +
+                                ["warmup_batches", "warmup_s", "pacing_rate_error", "pacing_lateness_ms"])
 
             # self.statsheartbeats is a tuple where:
             # self.statsheartbeats[1] is a list of VDD heartbeats from the stats process (as dictionary on the VDD line) - self.statsheartbeats[1][-1] is the last heartbeat
             # self.statsheartbeats[2] is the running GPU frequency
             # self.statsheartbeats[3] is the running CPU0 frequency
             # self.statsheartbeats[4] is the running CPU4 frequency
+            # self.statsheartbeats[5] is the run info (start/end time and total energy)
             
             # NOTE: these values are the same for all engines
-            vdd_in_avg = self.statsheartbeats[1][-1]["VDD_IN"]
-            vdd_cpu_gpu_cv_avg = self.statsheartbeats[1][-1]["VDD_CPU_GPU_CV"]
-            vdd_soc_avg = self.statsheartbeats[1][-1]["VDD_SOC"]
+            vdd_avgs = [f"{self.statsheartbeats[1][-1][label]:.2f}" for label in labels]
             run_gpu_freq = self.statsheartbeats[2]
             run_cpu0_freq = self.statsheartbeats[3]
             run_cpu4_freq = self.statsheartbeats[4]
+            run = self.get_energy_report()["run"]
+            run_freqs = [f"{mean_frequency(residency):.0f}" for residency in self.statsheartbeats[5]["residency"].values()]
             
             # self.heartbeats contains every engine heartbeats
             # This loop goes through heartbeats collected across all engines running
-            for name, device, targettp, hb, hb_actual in self.heartbeats:
+            for name, device, targettp, hb, hb_actual, info in self.heartbeats:
                 last_throughput = hb[-1]
                 last_throughput_actual = hb_actual[-1]
+                pacing = info.get("pacing")
+                serving = info.get("serving")
                 csv_writer.writerow([
                     name, 
                     device, 
@@ -205,12 +552,112 @@ class Config:
                     f"{targettp:.2f}", 
                     f"{last_throughput:.2f}",
                     f"{last_throughput_actual:.2f}", 
-                    f"{vdd_in_avg:.2f}", 
-                    f"{vdd_cpu_gpu_cv_avg:.2f}", 
-                    f"{vdd_soc_avg:.2f}",
+                ] + vdd_avgs + [
                     f"{run_gpu_freq:.2f}",
                     f"{run_cpu0_freq:.2f}",
-                    f"{run_cpu4_freq:.2f}"
-                ])
+                    f"{run_cpu4_freq:.2f}",
+                    info["inferences"],
+                    f"{run['energy_j'][rail]:.3f}",
+                    f"{run['avg_power_w'][rail]:.3f}",
+                    f"{run['mj_per_inference'][rail]:.3f}"
+                ] + run_freqs + [f"{info['latency'][f'{stat}_ms']:.3f}" for stat in LATENCY_STATS] +
+                [f"{info['stages'][f'{stage}_ms']:.3f}" if "stages" in info else "" for stage in STAGES] +
+                ([serving["served"], serving["dropped"]] + [f"{serving[kind][f'{stat}_ms']:.3f}" for kind in SERVING_TIMES for stat in SERVING_STATS] if serving else
+                 [""] * (2 + len(SERVING_TIMES) * len(SERVING_STATS))) +
+                [info["warmup"]["batches"], f"{info['warmup']['seconds']:.3f}"] + ([f"{pacing['rate_error']:.6f}", f"{pacing['lateness_mean_ms']:.3f}"] if pacing else ["", ""]))
 
         print(f"[{get_ts()}] [Config.py] [D] Heartbeats successfully exported to {output_path}")
+
+    def get_energy_report(self):
+        '''
+        Returns the energy report of the last run (see Energy.energy_report): for every stats heartbeat window and
+        for the whole run, the energy (J), average power (W) and energy per inference (mJ) of every power line,
+        together with the inferences of every engine (in the order of self.heartbeats).
+        Returns None if the stats sampler did not complete the last run.
+        '''
+        if self.statsheartbeats is None:
+            return None
+        return energy_report(self.statsheartbeats, self.heartbeats)
+
+    def export_energy(self, output_path: str):
+        '''
+        Exports the energy report of the last run to a CSV file, with one row per stats heartbeat window and a last "run" row:
+            window: The index of the heartbeat window (or "run")
+            start_s: The start of the window, in seconds from the start of the stats process
+            duration_s: The duration of the window in seconds
+            <line>_energy_j: The energy of the power line in the window (J)
+            <line>_avg_power_w: The average power of the power line in the window (W)
+            <line>_mj_per_inference: The energy of the power line per inference in the window (mJ), over all engines
+            total_inferences: The inferences of all engines in the window
+            inferences_<engine>: The inferences of each engine in the window
+            cpu_freq_set, gpu_freq_set: The CPU and GPU frequencies set at the end of the window (see clock_setting)
+            clock_changes: The number of frequency changes within the window (online refine)
+
+        output_path: The path to the output CSV file where the energy report will be saved.
+        '''
+        if self.statsheartbeats is None:
+            print(f"[{get_ts()}] [Config.py] [E] No stats for the last run, energy report not exported")
+            return
+        print(f"[{get_ts()}] [Config.py] [D] Exporting energy report to CSV at {output_path}")
+        report = self.get_energy_report()
+        labels = list(report["run"]["energy_j"].keys())
+        names = [heartbeat[0] for heartbeat in self.heartbeats]
+        origin = report["run"]["start"]
+        with open(output_path, mode='w', newline='') as csvfile:
+            csv_writer = csv.writer(csvfile)
+            header = ["window", "start_s", "duration_s"]
+            for label in labels:
+                header += [f"{label.lower()}_energy_j", f"{label.lower()}_avg_power_w", f"{label.lower()}_mj_per_inference"]
+            header += ["total_inferences"] + [f"inferences_{name}" for name in names]
+            header += ["cpu_freq_set", "gpu_freq_set", "clock_changes"]
+            csv_writer.writerow(header)
+
+            rows = list(enumerate(report["windows"])) + [("run", report["run"])]
+            for window, summary in rows:
+                row = [window, f"{summary['start'] - origin:.3f}", f"{summary['duration_s']:.3f}"]
+                for label in labels:
+                    row += [f"{summary['energy_j'][label]:.3f}", f"{summary['avg_power_w'][label]:.3f}", f"{summary['mj_per_inference'][label]:.3f}"]
+                row += [f"{summary['total_inferences']:.1f}"] + [f"{inferences:.1f}" for inferences in summary["inferences"]]
+                clocks = self.clock_setting(summary["start"], summary["start"] + summary["duration_s"])
+                row += [clocks["cpu"], clocks["gpu"], clocks["changes"]]
+                csv_writer.writerow(row)
+
+        print(f"[{get_ts()}] [Config.py] [D] Energy report successfully exported to {output_path}")
+
+    def export_residency(self, output_path: str):
+        '''
+        Exports the frequency residency of the last run to a CSV file, with one row per clock domain and frequency for
+        every stats heartbeat window and for the whole run (window "run"):
+            window: The index of the heartbeat window (or "run")
+            t_s: The end of the window, in seconds from the start of the stats process
+            domain: The clock domain (gpu, cpu0, cpu4)
+            source: "kernel" if read from time_in_state/trans_stat, "samples" if estimated from the sampled frequency
+            freq_khz: The frequency (kHz)
+            time_s: The time spent at the frequency in the window (s)
+            share: The fraction of the window spent at the frequency
+            avg_power_w_<line>: The average power of every line in the window (W), to correlate power and clocks
+
+        output_path: The path to the output CSV file where the residency will be saved.
+        '''
+        if self.statsheartbeats is None:
+            print(f"[{get_ts()}] [Config.py] [E] No stats for the last run, frequency residency not exported")
+            return
+        print(f"[{get_ts()}] [Config.py] [D] Exporting frequency residency to CSV at {output_path}")
+        heartbeats, info = self.statsheartbeats[1], self.statsheartbeats[5]
+        labels = list(info["energy_mJ"].keys())
+        windows = [(i, hb["t"], {domain: (hb[f"{domain}_residency"], hb[f"{domain}_residency_source"]) for domain in info["residency"]},
+                    [hb[f"{label}_mean"] / 1000.0 for label in labels]) for i, hb in enumerate(heartbeats)]
+        duration = info["end"] - info["start"]
+        windows.append(("run", info["end"], {domain: (info["residency"][domain], info["residency_source"][domain]) for domain in info["residency"]},
+                        [info["energy_mJ"][label] / 1000.0 / duration if duration > 0 else 0.0 for label in labels]))
+        with open(output_path, mode='w', newline='') as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(["window", "t_s", "domain", "source", "freq_khz", "time_s", "share"] + [f"avg_power_w_{label.lower()}" for label in labels])
+            for window, t, residencies, powers in windows:
+                for domain, (residency, source) in residencies.items():
+                    total = sum(residency.values())
+                    for freq, time_s in sorted(residency.items()):
+                        csv_writer.writerow([window, f"{t - info['start']:.3f}", domain, source, freq, f"{time_s:.3f}",
+                                             f"{time_s / total if total > 0 else 0.0:.4f}"] + [f"{power:.3f}" for power in powers])
+
+        print(f"[{get_ts()}] [Config.py] [D] Frequency residency successfully exported to {output_path}")
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import datetime
+
+from Config import Config
+from SysConfig import SysConfig
+
+'''
+This module implements the closed-loop controller of the policy, which chains the Decide, Run and Refine steps
+without manual edits of the configuration file:
+1. Decide (optional): Decide.py builds the configuration from the applications JSON file
+2. Run: SysConfig.py sets the CPU/GPU frequencies of the step and Config.py runs the configuration
+3. Refine: the frequencies proposed by Refine.py after the run are applied to the next step
+
+The engines are built once and run by a persistent worker pool (see EnginePool.py), so that every step reuses
+the warm engines (deserialized engine, buffers and input data) instead of setting them up again. The controller stops when Refine proposes the frequencies of
+the step (converged), frequencies already run by a previous step (oscillating) or after "maxsteps" steps.
+When oscillating, the final frequencies are the cheapest (energy per inference) of the cycle meeting every target,
+or the last ones if none does.
+
+Every step is exported as step<k>.csv (heartbeats, see Config.export_heartbeats), step<k>_energy.csv and
+step<k>_residency.csv in the output directory, together with summary.json: the steps (frequencies, targets met,
+energy), the outcome, the time to converge and the energy spent converging.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+class Controller:
+    def __init__(self, configpath, outputdir, maxsteps=8, duration=35, tolerance=0.01):
+        '''
+        configpath: Path to the configuration JSON file (written by Decide if apps are decided).
+        outputdir: Directory of the CSV files of the steps and of the summary.
+        maxsteps: Maximum number of steps.
+        duration: Duration (s) of the run of every step.
+        tolerance: Relative throughput shortfall w.r.t. the target still considered as meeting it.
+        '''
+        self.configpath = configpath
+        self.outputdir = outputdir
+        self.maxsteps = maxsteps
+        self.duration = duration
+        self.tolerance = tolerance
+        self.steps = []
+
+    def decide(self, appspath):
+        '''
+        Runs the Decide step on the applications JSON file and writes the configuration at configpath.
+        The optional keys of an existing configuration (e.g. sysfs_root, backend) are kept.
+        '''
+        from Decide import Decide
+
+        extra = {}
+        if os.path.exists(self.configpath):
+            with open(self.configpath, 'r') as f:
+                extra = {key: value for key, value in json.load(f).items() if key not in ("frequencies", "models")}
+        decide = Decide()
+        decide.read_apps(appspath)
+        config = decide.decide(output_path=self.configpath)
+        if extra:
+            with open(self.configpath, 'w') as f:
+                json.dump({**config, **extra}, f, indent=4)
+
+    def targets_met(self, heartbeats):
+        '''
+        Returns the minimum ratio between the last throughput and the target of the engines with a target (inf if none).
+        '''
+        ratios = [hb[-1] / target for _, _, target, hb, _, _ in heartbeats if target > 0 and hb]
+        return min(ratios, default=float('inf'))
+
+    def run(self):
+        '''
+        Runs the Decide -> Run -> Refine loop on the configuration. Returns the summary (see write_summary).
+        '''
+        os.makedirs(self.outputdir, exist_ok=True)
+        with open(self.configpath, 'r') as f:
+            sysfs_root = json.load(f).get("sysfs_root", "/sys")
+        sysconfig = SysConfig(sysfs_root=sysfs_root)
+        config = Config()
+        sysconfig.on_change = config.signal_transient
+
+        cpufreq, gpufreq, maxn = sysconfig.read_sysconfig(self.configpath)
+        cpufreq, gpufreq = str(cpufreq), str(gpufreq)
+        sysconfig.init_sysconfig(MAXN=maxn)
+        config.read_config(self.configpath)
+        config.persistent = True
+        config.enginecpus = sysconfig.controlled_cpus(MAXN=maxn)
+
+        start = time.monotonic()
+        status = "max_steps"
+        try:
+            for step in range(self.maxsteps):
+                print(f"[{get_ts()}] [Controller.py] [I] Step {step}: CPU {cpufreq}, GPU {gpufreq}")
+                step_start = time.monotonic()
+                sysconfig.set_frequencies(cpufreq, gpufreq, MAXN=maxn)
+                config.cpufreq, config.gpufreq = cpufreq, gpufreq
+                config.run(execution_duration=self.duration)
+
+                output_path = os.path.join(self.outputdir, f"step{step}.csv")
+                config.export_heartbeats(output_path=output_path)
+                config.export_energy(output_path=os.path.splitext(output_path)[0] + "_energy.csv")
+                config.export_residency(output_path=os.path.splitext(output_path)[0] + "_residency.csv")
+
+                report = config.get_energy_report()
+                if report is None:
+                    print(f"[{get_ts()}] [Controller.py] [E] Step {step}: no stats for the run, energy not reported")
+                run = report["run"] if report is not None else None
+                ratio = self.targets_met(config.heartbeats)
+                self.steps.append({
+                    "step": step,
+                    "cpu": cpufreq,
+                    "gpu": gpufreq,
+                    "next_cpu": config.refined[0],
+                    "next_gpu": config.refined[1],
+                    "target_ratio": ratio,
+                    "targets_met": ratio >= 1 - self.tolerance,
+                    "energy_j": run["energy_j"][config.inputrail] if run is not None else None,
+                    "avg_power_w": run["avg_power_w"][config.inputrail] if run is not None else None,
+                    "mj_per_inference": run["mj_per_inference"][config.inputrail] if run is not None else None,
+                    "elapsed_s": time.monotonic() - step_start,
+                })
+
+                if config.refined == (cpufreq, gpufreq):
+                    status = "converged"
+                    break
+                if any((previous["cpu"], previous["gpu"]) == config.refined for previous in self.steps):
+                    status = "oscillating"
+                    break
+                cpufreq, gpufreq = config.refined
+        finally:
+            config.close()
+            sysconfig.restore_sysconfig(MAXN=maxn)
+
+        return self.write_summary(status, time.monotonic() - start)
+
+    def final_step(self, status):
+        '''
+        Returns the step whose frequencies are kept: the last one, or the cheapest of the cycle meeting the targets if oscillating.
+        '''
+        final = self.steps[-1]
+        if status == "oscillating":
+            first = next(step for step in self.steps if (step["cpu"], step["gpu"]) == (final["next_cpu"], final["next_gpu"]))
+            cycle = self.steps[first["step"]:]
+            met = [step for step in cycle if step["targets_met"] and step["mj_per_inference"] is not None]
+            if met:
+                final = min(met, key=lambda step: step["mj_per_inference"])
+        return final
+
+    def write_summary(self, status, elapsed):
+        '''
+        Writes and returns the summary of the controller run: the "status" (converged, oscillating or max_steps),
+        the "final" CPU/GPU frequencies, the time to converge ("time_to_converge_s", wall time of all the steps),
+        the energy spent converging ("energy_to_converge_j", energy of the input power line, see Discovery.input_rail, of the runs of all the steps) and the "steps".
+        The energy of a step whose stats did not complete is None (null), and not counted in the energy spent converging.
+        '''
+        final = self.final_step(status)
+        summary = {
+            "status": status,
+            "final": {"cpu": final["cpu"], "gpu": final["gpu"], "step": final["step"], "targets_met": final["targets_met"]},
+            "num_steps": len(self.steps),
+            "time_to_converge_s": elapsed,
+            "energy_to_converge_j": sum(step["energy_j"] for step in self.steps if step["energy_j"] is not None),
+            "steps": self.steps,
+        }
+        path = os.path.join(self.outputdir, "summary.json")
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=4)
+        print(f"[{get_ts()}] [Controller.py] [I] Controller {status} after {len(self.steps)} steps ({elapsed:.1f} s, {summary['energy_to_converge_j']:.3f} J)")
+        print(f"[{get_ts()}] [Controller.py] [I]\tFinal CPU frequency: {final['cpu']}")
+        print(f"[{get_ts()}] [Controller.py] [I]\tFinal GPU frequency: {final['gpu']} (targets met: {final['targets_met']})")
+        print(f"[{get_ts()}] [Controller.py] [D] Summary written to {path}")
+        return summary
@@ -45,10 +45,11 @@ class Decide:
         print(json.dumps(printing, indent=4))
         with open(output_path, "w") as f:
             json.dump(printing, f, indent=4)
+        return printing
 
     # --------------------------------------------------------
 
-    def decide(self):
+    def decide(self, output_path="config.json"):
         '''
         Decide step algorithm.
         1. Read the apps from the JSON file
@@ -56,7 +57,7 @@ class Decide:
         3. For each app, analyze it to determine the most power efficient device capable of achieving the target throughput
         4. Allocate the app to the device, considering the DLA capacities
         5. Determine the minimum running frequency for the device based on the target throughput
-        6. Prints and saves the configuration in the required format by Config.py
+        6. Prints and saves the configuration in the required format by Config.py (at output_path), and returns it
         '''
 
         print(f"[{get_ts()}] [Decide.py] [D] Building configuration")
@@ -107,4 +108,4 @@ class Decide:
                 "device": device_label,
             })
         
-        self.print_config(output_config, BASE_FREQUENCY_CPU=729600, gpu_freq=min_running_freq)
\ No newline at end of file
+        return self.print_config(output_config, cpu_freq=BASE_FREQUENCY_CPU, gpu_freq=min_running_freq, output_path=output_path)
\ No newline at end of file
@@ -0,0 +1,256 @@
+import os
+import re
+import glob
+import json
+import hashlib
+import datetime
+
+'''
+This module discovers the sysfs nodes used by the framework, instead of relying on hardcoded paths
+(hwmon numbering may change across reboots and boards). It scans sysfs once and identifies:
+- the INA3221 power lines, by their "in<N>_label" files
+- the GPU devfreq node
+- the DLA and EMC clocks (BPMP debugfs, if mounted)
+- the cpufreq policies (CPU clusters)
+- the thermal zones
+
+The resolved map is cached to disk as JSON, keyed by board ID (device tree model and serial number) and, for a sysfs
+root other than /sys (e.g. a fake tree for tests), by the root, so that the scan is not repeated at every startup.
+The cache directory is resolved when the Discovery is created (~ follows HOME). A cached map is validated (power line labels and GPU node still in place)
+before being used, and rebuilt if stale.
+
+All paths are absolute, i.e. already prefixed by the sysfs root.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "rtrm")
+
+# Paths used when nothing is discovered (Jetson Orin Nano / NX running JetPack 5), relative to the sysfs root
+FALLBACK_RAILS = {
+    label: {
+        "curr_path": f"bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/curr{channel}_input",
+        "volt_path": f"bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/in{channel}_input"
+    } for channel, label in ((1, "VDD_IN"), (2, "VDD_CPU_GPU_CV"), (3, "VDD_SOC"))
+}
+FALLBACK_GPU = "devices/gpu.0/devfreq/17000000.ga10b"
+
+DLA_EMC_CLOCKS = ["emc", "dla0_core", "dla1_core", "dla0_falcon", "dla1_falcon", "nafll_dla0", "nafll_dla1"]
+
+class Discovery:
+    def __init__(self, root="/sys", cachedir=DEFAULT_CACHE_DIR):
+        '''
+        root: Root of the sysfs tree.
+        cachedir: Directory of the cached maps (None to disable the cache).
+        '''
+        self.root = root
+        self.cachedir = os.path.expanduser(cachedir) if cachedir else None
+        self.map = None
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def read(self, path):
+        '''
+        Returns the stripped content of a small sysfs/devicetree file, or None if it can not be read.
+        '''
+        try:
+            with open(path, 'r') as f:
+                return f.read().strip().strip("\x00")
+        except OSError:
+            return None
+
+    def board_id(self):
+        '''
+        Returns an identifier of the board, made of the device tree model and serial number, and of a hash of the sysfs
+        root if it is not /sys (so that the map of a fake tree is never used for the real one, and the reverse).
+        '''
+        model = self.read(self.path("firmware", "devicetree", "base", "model")) or "unknown"
+        serial = self.read(self.path("firmware", "devicetree", "base", "serial-number")) or "0"
+        board = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{model}-{serial}")
+        root = os.path.abspath(self.root)
+        if root != "/sys":
+            board += "-" + hashlib.sha1(root.encode()).hexdigest()[:12]
+        return board
+
+    # ----------------------------------------
+
+    def scan_rails(self):
+        '''
+        Returns {label: {"curr_path", "volt_path", "label_path"}} for every labelled INA3221 channel.
+        '''
+        rails = {}
+        for hwmon in sorted(glob.glob(self.path("class", "hwmon", "hwmon*"))):
+            if self.read(os.path.join(hwmon, "name")) != "ina3221":
+                continue
+            for label_path in sorted(glob.glob(os.path.join(hwmon, "in*_label"))):
+                channel = re.match(r"in(\d+)_label", os.path.basename(label_path)).group(1)
+                label = self.read(label_path)
+                curr_path = os.path.join(hwmon, f"curr{channel}_input")
+                volt_path = os.path.join(hwmon, f"in{channel}_input")
+                if label and os.path.exists(curr_path) and os.path.exists(volt_path):
+                    rails[label] = {"curr_path": curr_path, "volt_path": volt_path, "label_path": label_path}
+        return rails
+
+    def scan_gpu(self):
+        '''
+        Returns the GPU devfreq directory (the devfreq node whose name or device path refers to the GPU).
+        '''
+        for devfreq in sorted(glob.glob(self.path("class", "devfreq", "*"))):
+            target = os.path.realpath(devfreq)
+            if "ga10b" in os.path.basename(devfreq) or "gpu" in target:
+                return devfreq
+        return None
+
+    def scan_clocks(self):
+        '''
+        Returns {clock: rate path} for the DLA and EMC clocks exposed by the BPMP debugfs.
+        '''
+        clocks = {}
+        for clock in DLA_EMC_CLOCKS:
+            rate = self.path("kernel", "debug", "bpmp", "debug", "clk", clock, "rate")
+            if os.path.exists(rate):
+                clocks[clock] = rate
+        return clocks
+
+    def scan_cpus(self):
+        '''
+        Returns {policy: {"path", "cpus"}} for every cpufreq policy (CPU cluster).
+        '''
+        policies = {}
+        for policy in sorted(glob.glob(self.path("devices", "system", "cpu", "cpufreq", "policy*"))):
+            cpus = self.read(os.path.join(policy, "related_cpus")) or self.read(os.path.join(policy, "affected_cpus"))
+            if cpus:
+                policies[os.path.basename(policy)] = {"path": policy, "cpus": [int(cpu) for cpu in cpus.split()]}
+        return policies
+
+    def scan_thermal(self):
+        '''
+        Returns {zone type: temperature path} for every thermal zone.
+        '''
+        zones = {}
+        for zone in sorted(glob.glob(self.path("class", "thermal", "thermal_zone*"))):
+            zone_type = self.read(os.path.join(zone, "type"))
+            if zone_type:
+                zones[zone_type] = os.path.join(zone, "temp")
+        return zones
+
+    def scan(self):
+        '''
+        Scans sysfs and returns the hardware map.
+        '''
+        print(f"[{get_ts()}] [Discovery.py] [D] Scanning {self.root} for sensors and clocks")
+        hwmap = {
+            "board": self.board_id(),
+            "root": self.root,
+            "rails": self.scan_rails(),
+            "gpu": self.scan_gpu(),
+            "clocks": self.scan_clocks(),
+            "cpus": self.scan_cpus(),
+            "thermal": self.scan_thermal(),
+        }
+        print(f"[{get_ts()}] [Discovery.py] [D] \tPower lines: {list(hwmap['rails'].keys())}")
+        print(f"[{get_ts()}] [Discovery.py] [D] \tGPU devfreq: {hwmap['gpu']}")
+        print(f"[{get_ts()}] [Discovery.py] [D] \tClocks: {list(hwmap['clocks'].keys())}")
+        print(f"[{get_ts()}] [Discovery.py] [D] \tCPU policies: {list(hwmap['cpus'].keys())}")
+        print(f"[{get_ts()}] [Discovery.py] [D] \tThermal zones: {len(hwmap['thermal'])}")
+        return hwmap
+
+    def valid(self, hwmap):
+        '''
+        Checks that a cached map still describes the board (same root, power line labels and GPU node in place).
+        '''
+        if hwmap.get("root") != self.root:
+            return False
+        for label, rail in hwmap["rails"].items():
+            if self.read(rail["label_path"]) != label:
+                return False
+        return hwmap["gpu"] is None or os.path.isdir(hwmap["gpu"])
+
+    def load(self, rescan=False):
+        '''
+        Returns the hardware map, from the cache if valid, otherwise scanning sysfs (and updating the cache).
+
+        rescan: If True, ignores the cache.
+        '''
+        if self.map is not None and not rescan:
+            return self.map
+
+        cachepath = os.path.join(self.cachedir, f"hwmap-{self.board_id()}.json") if self.cachedir else None
+        if cachepath and not rescan and os.path.exists(cachepath):
+            try:
+                with open(cachepath, 'r') as f:
+                    hwmap = json.load(f)
+                if self.valid(hwmap):
+                    self.map = hwmap
+                    return self.map
+                print(f"[{get_ts()}] [Discovery.py] [W] Cached hardware map {cachepath} is stale")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[{get_ts()}] [Discovery.py] [W] Could not read cached hardware map {cachepath}: {e}")
+
+        self.map = self.scan()
+        if cachepath:
+            try:
+                os.makedirs(self.cachedir, exist_ok=True)
+                with open(cachepath, 'w') as f:
+                    json.dump(self.map, f, indent=4)
+            except OSError as e:
+                print(f"[{get_ts()}] [Discovery.py] [W] Could not cache hardware map to {cachepath}: {e}")
+        return self.map
+
+    # ----------------------------------------
+
+    def rails(self):
+        '''
+        Returns {label: {"curr_path", "volt_path"}} for every power line (hardcoded Orin Nano lines if none discovered).
+        '''
+        rails = self.load()["rails"]
+        if not rails:
+            print(f"[{get_ts()}] [Discovery.py] [W] No INA3221 power lines discovered, using default paths")
+            return {label: {key: self.path(path) for key, path in paths.items()} for label, paths in FALLBACK_RAILS.items()}
+        return {label: {"curr_path": rail["curr_path"], "volt_path": rail["volt_path"]} for label, rail in rails.items()}
+
+    def input_rail(self):
+        '''
+        Returns the label of the power line measuring the total input power of the board: VDD_IN (Orin Nano / NX),
+        otherwise the first line labelled VIN* (e.g. VIN_SYS_5V0 on AGX Orin), otherwise the first line.
+        '''
+        labels = list(self.rails().keys())
+        if "VDD_IN" in labels:
+            return "VDD_IN"
+        return next((label for label in labels if label.startswith("VIN")), labels[0])
+
+    def gpu(self):
+        '''
+        Returns the GPU devfreq directory (hardcoded Orin path if none discovered).
+        '''
+        return self.load()["gpu"] or self.path(FALLBACK_GPU)
+
+    def cpufreq(self, cpu):
+        '''
+        Returns the cpufreq directory of the policy (cluster) containing the given CPU.
+
+        cpu: CPU number.
+        '''
+        for policy in self.load()["cpus"].values():
+            if int(cpu) in policy["cpus"]:
+                return policy["path"]
+        return self.path("devices", "system", "cpu", f"cpu{cpu}", "cpufreq")
+
+    def cluster(self, cpu):
+        '''
+        Returns the CPUs of the policy (cluster) containing the given CPU ([cpu] if no policy contains it).
+
+        cpu: CPU number.
+        '''
+        for policy in self.load()["cpus"].values():
+            if int(cpu) in policy["cpus"]:
+                return list(policy["cpus"])
+        return [int(cpu)]
+
+    def clocks(self):
+        return self.load()["clocks"]
+
+    def thermal(self):
+        return self.load()["thermal"]
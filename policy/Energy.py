@@ -0,0 +1,96 @@
+'''
+This module combines the energy integrated by Stats.py with the inference counts of the engines run by Config.py.
+Both Stats and Engine timestamp their heartbeats on the (system wide) monotonic clock, so their cumulative curves
+(energy since the start, inferences since the start) are evaluated on the Stats heartbeat windows by linear interpolation.
+
+"energy_report" returns, for every window and for the whole run, the energy (J) and average power (W) of every line,
+the inferences of every engine and the energy per inference (mJ) of every line.
+'''
+
+def interpolate(points, t):
+    '''
+    Evaluates a piecewise linear curve at time t, clamping outside of the curve.
+
+    points: List of (timestamp, value) sorted by timestamp.
+    t: Time at which to evaluate the curve.
+    '''
+    if t <= points[0][0]:
+        return points[0][1]
+    for (t0, v0), (t1, v1) in zip(points, points[1:]):
+        if t <= t1:
+            return v0 if t1 == t0 else v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+    return points[-1][1]
+
+def energy_curve(statsheartbeats, label):
+    '''
+    Returns the cumulative energy (mJ) curve of a line, as [(timestamp, energy)].
+
+    statsheartbeats: Tuple as returned by Stats.get_heartbeats().
+    label: Power line.
+    '''
+    heartbeats, info = statsheartbeats[1], statsheartbeats[5]
+    points = [(info["start"], 0.0)]
+    points += [(hb["t"], hb[f"{label}_energy_total_mJ"]) for hb in heartbeats if hb["t"] is not None]
+    points.append((info["end"], info["energy_mJ"][label]))
+    return points
+
+def inference_curve(heartbeat):
+    '''
+    Returns the cumulative inferences curve of an engine, as [(timestamp, inferences)].
+
+    heartbeat: Tuple as returned by Engine.get_heartbeats().
+    '''
+    info = heartbeat[5]
+    points = [(info["start"], 0)]
+    total = 0
+    for window in info["windows"]:
+        total += window["inferences"]
+        points.append((window["t"], total))
+    points.append((info["end"], info["inferences"]))
+    return points
+
+def summarize(start, end, energies, inferences):
+    '''
+    Returns the energy summary of a window.
+
+    start, end: Window boundaries (monotonic clock).
+    energies: Dictionary {line: energy in mJ}.
+    inferences: List of inferences of every engine in the window.
+    '''
+    duration = end - start
+    total = sum(inferences)
+    return {
+        "start": start,
+        "end": end,
+        "duration_s": duration,
+        "energy_j": {label: energy / 1000.0 for label, energy in energies.items()},
+        "avg_power_w": {label: (energy / 1000.0 / duration if duration > 0 else 0.0) for label, energy in energies.items()},
+        "inferences": inferences,
+        "total_inferences": total,
+        "mj_per_inference": {label: (energy / total if total > 0 else float('nan')) for label, energy in energies.items()},
+    }
+
+def energy_report(statsheartbeats, heartbeats):
+    '''
+    Returns a dictionary {"windows": [summary, ...], "run": summary} (see summarize), where windows are the Stats
+    heartbeat windows and the run spans the whole stats collection. Inferences are listed in the order of heartbeats.
+
+    statsheartbeats: Tuple as returned by Stats.get_heartbeats().
+    heartbeats: List of tuples as returned by Engine.get_heartbeats().
+    '''
+    labels = list(statsheartbeats[5]["energy_mJ"].keys())
+    energy_curves = {label: energy_curve(statsheartbeats, label) for label in labels}
+    inference_curves = [inference_curve(heartbeat) for heartbeat in heartbeats]
+
+    # Window boundaries are the ones of the Stats heartbeats
+    bounds = [t for t, _ in energy_curves[labels[0]]]
+
+    def window(start, end):
+        energies = {label: interpolate(energy_curves[label], end) - interpolate(energy_curves[label], start) for label in labels}
+        inferences = [interpolate(curve, end) - interpolate(curve, start) for curve in inference_curves]
+        return summarize(start, end, energies, inferences)
+
+    return {
+        "windows": [window(start, end) for start, end in zip(bounds, bounds[1:]) if end > start],
+        "run": window(bounds[0], bounds[-1]),
+    }
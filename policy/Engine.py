@@ -1,18 +1,39 @@
-import torch
-import torchvision
 import time
-import tensorrt as trt
-from torchvision import transforms
 import json
 import datetime
+from collections import deque
 
 '''
 This module defines the Engine class, which is responsible for managing a TensorRT engine.
 It includes methods for reading engine information, building the engine, creating the mock data for inference
 and executing inference with the engine.
 
+Inference is run by an execution backend (see Backend.py): "tensorrt" (default) runs the engine on the GPU/DLA,
+"mock" emulates its latency from the engine_info profiles on hosts without GPU (see MockBackend.py).
+With "pipeline" > 1, that many batches are in flight (one backend slot each): the input of the next batches is
+loaded and the outputs of the completed one are read back while the accelerator runs. Batches are counted when they
+complete, so the heartbeats are exact; batches in flight at the end of the run are completed and counted.
+
+With "arrivals", the engine serves requests arriving in an input queue (open loop, see Arrivals.py) instead of
+running batches back to back: every free slot runs a batch of the queued requests (up to batch_size), and the
+queueing delay, service and response times of the requests are recorded.
+
 In order to execute an Engine, it must first be initialized using "build_engine"
 and then executed using "execute".
+
+torch, torchvision and tensorrt are imported within the methods using them, so that importing this module
+(e.g. from Config.py in a process that only samples power) does not load them.
+
+Input batches are preprocessed once before the start barrier and held in a pinned BatchCache (BatchCache.py), so that
+the inference loop only copies them to the input buffer ("cache" preprocess mode). The "inline" mode keeps resizing
+and converting the images at every inference, and reports the time spent preprocessing separately.
+Mock images are generated at the input shape of the engine, in a single seeded call (see MockData.py).
+When run by Config.py, the images are mapped from a corpus shared by all the engines with the same input shape
+(see SharedCorpus.py) instead of being generated by every process.
+
+The backend (deserialized engine, buffers and input data) is set up by "prepare" and released by "release".
+"execute" prepares and releases it itself unless it is already prepared: a persistent worker (see EnginePool.py)
+prepares it once and runs many executions on it, receiving commands (stop, change of target, report) during the run.
 '''
 
 def get_ts():
@@ -29,9 +50,34 @@ class Engine:
 
         self.heartbeats = []
         self.heartbeats_actual = []
+        self.info = {}
+        self.telemetry = None           # Optional telemetry channel (see Telemetry.py) on which heartbeats are published live
         self.images = None
+        self.preprocess = "cache"       # "cache": batches preprocessed once before the barrier, "inline": preprocessing at every inference
+        self.cachebatches = 16          # Number of batches held by the batch cache
+        self.seed = 0                   # Seed of the mock data
+        self.input_dtype = "float32"    # Input dtype of the engine (torch dtype name)
+        self.datatime = {}              # Time spent creating the mock data, and saved w.r.t. the stored legacy measurement
+        self.corpus = None              # Optional shared corpus (see SharedCorpus.py) used instead of generating the mock data
+        self.backend = "tensorrt"       # Execution backend (see Backend.py)
+        self.pipeline = 1               # Number of batches in flight (1: serial load, inference and readback)
+        self.readback = True            # If False, the outputs are not copied back to the host
+        self.pacing = {}                # Options of the rate limiter (see Pacer.py), used if throughput > 0
+        self.arrivals = None            # Arrival process of the requests in serving mode (see Arrivals.py), None for closed loop
+        self.warmup = {}                # Options of the adaptive warmup (see Warmup.py), False to disable it
+        self.warmupinfo = {}            # Warmup of the last execution (see Warmup.report)
+        self.stagetimers = True         # If True, the time of every stage of the inference loop is measured (see StageTimers.py)
+        self.numapps = 1                # Number of co-running applications (used by the mock backend slowdown)
+        self.sysfs_root = "/sys"        # Sysfs tree read by the mock backend clock
+        self.mockfreq = None            # GPU frequency used by the mock backend if not readable from sysfs
         self.enginepath = None
         self.engineinfopath = None
+        self.runner = None              # Backend prepared by prepare() and reused by every execution until release()
+        self.setuptime = 0.0            # Time (s) spent preparing the backend
+        self.commands = None            # Optional connection on which commands are received during execute (see EnginePool.py)
+        self.scheduling = {}            # CPU affinity and priority of the worker running the engine (see Scheduling.py)
+        self.defaultcpus = None         # CPUs of the worker if not set in scheduling (None: not pinned)
+        self.schedulinginfo = {}        # Scheduling applied to the worker (see Scheduling.apply_scheduling)
 
     def print_engine(self):
         '''
@@ -51,14 +97,29 @@ class Engine:
         throughput: Target throughput of the engine
         heartbeats: List of throughput values recorded at each heartbeat interval INCLUDING AUTOSLEEP
         heartbeats_actual: List of predicted throughput values recorded at each heartbeat interval EXCLUDING AUTOSLEEP
+        info: Dictionary with the run "start" and "end" times (monotonic clock), the total number of "inferences",
+              the "backend", the "preprocess" mode, the time spent building the batch cache ("cache_build_s"), creating the mock data
+              ("data_s") and saved w.r.t. the legacy FakeData generation ("data_saved_s", if measured, see MockData.load_legacy_time), the "footprint" of the process
+              before and after creating the input data ("rss_before_kb", "uss_before_kb", "rss_after_kb", "uss_after_kb")
+              and the list of heartbeat "windows" (dictionaries with the window end time "t", its "inferences"
+              the time spent preprocessing in the window "preprocess_s", only non-zero in "inline" mode, and the bytes of
+              outputs copied to the host "readback_bytes"). It also reports whether the outputs were read back
+              ("readback"), the total "readback_bytes" and the host output buffers preallocated ("host_buffers")
+              the "warmup" run before the measurement (see Warmup.report), the "latency" percentiles of the batches of the run, from load to readback (see LatencyHistogram.py, also
+              in every window), the average time per batch of every "stages" of the inference loop, if enabled (see
+              StageTimers.py, also in every window), if the throughput is limited, the "pacing" error of the run
+              (see Pacer.py, also in every window) and, in serving mode, the "serving" statistics of the requests
+              (see Arrivals.py, also in every window). In serving mode, throughputs and inferences count requests.
+              "setup_s" is the time spent preparing the backend for the run (0 if it was already prepared) and
+              "scheduling" the CPUs, nice value and policy of the worker, if applied (see Scheduling.py).
         '''
-        return (self.name, self.device, self.throughput, self.heartbeats, self.heartbeats_actual)
+        return (self.name, self.device, self.throughput, self.heartbeats, self.heartbeats_actual, self.info)
 
     def read_info(self, engineinfopath: str):
 
         '''
         Reads the engine information from a JSON file and sets the engine attributes accordingly.
-        engineinfopath: Path to the JSON file containing engine information (name, input_shape, output_shape).
+        engineinfopath: Path to the JSON file containing engine information (name, input_shape, output_shape and optional input_dtype).
         '''
 
         print(f"[{get_ts()}] [Engine.py] [D] Reading engine info from {engineinfopath}")
@@ -71,6 +132,7 @@ class Engine:
         self.batch_size = self.input_shape[0]
         output_shapes_str = engine_info.get("output_shapes", "1,1000")
         self.output_shapes = [tuple(map(int, shape.split(','))) for shape in output_shapes_str.split(';')]
+        self.input_dtype = engine_info.get("input_dtype", "float32")
 
         printts = get_ts()
         print(f"[{printts}] [Engine.py] [D] \tName: {self.name}")
@@ -78,20 +140,42 @@ class Engine:
         print(f"[{printts}] [Engine.py] [D] \tOutput shapes: {self.output_shapes}")
         print(f"[{printts}] [Engine.py] [D] Correctly read engine info")
 
+    def data_shape(self):
+        '''
+        Returns the shape of a mock image: the engine input shape (C, H, W) for the batch cache, the source shape of the
+        legacy generation (H, W, C, see MockData.py) for the inline preprocessing.
+        '''
+        from MockData import SOURCE_SHAPE
+
+        return tuple(self.input_shape[1:]) if self.preprocess == "cache" else SOURCE_SHAPE
+
     def create_data(self, numimgs=2000):
         '''
-        Creates mock data for inference. This method generates a list of random images
-        to simulate the input data for the engine and assigns it to the `self.images` attribute.
+        Creates mock data for inference. This method generates a uint8 tensor of random images of shape
+        (numimgs, *self.data_shape()), seeded with self.seed, and assigns it to the `self.images` attribute.
+        If a shared corpus is set (self.corpus), its images are mapped instead (zero-copy, numimgs is ignored).
         '''
 
+        import torch
+        from MockData import mock_corpus, load_legacy_time, LEGACY_IMAGES
+
         print(f"[{get_ts()}] [Engine.py] [D] Creating mock data...")
-        images = []
-        print(f"[{get_ts()}] [Engine.py] [D] Creating mock image array of length {numimgs}")
-        for _ in range(numimgs):
-            image, _ = next(iter(torchvision.datasets.FakeData(size=1, image_size=(3,224,224))))
-            images.append(image)
-        self.images = images
-        print(f"[{get_ts()}] [Engine.py] [D] Correctly created mock data")
+        start = time.perf_counter()
+        if self.corpus is not None:
+            print(f"[{get_ts()}] [Engine.py] [D] Mapping shared corpus {self.corpus.name} of length {self.corpus.numimgs} and shape {self.corpus.shape}")
+            self.images = torch.from_numpy(self.corpus.array)
+        else:
+            print(f"[{get_ts()}] [Engine.py] [D] Creating mock image array of length {numimgs} and shape {self.data_shape()} (seed {self.seed})")
+            self.images = mock_corpus(numimgs, self.data_shape(), seed=self.seed)
+        elapsed = time.perf_counter() - start
+        self.datatime = {"data_s": elapsed}
+        # The legacy FakeData loop is not run here: its time is the one stored by benchmark_gpudla.py --legacy_data_time
+        legacy = load_legacy_time(LEGACY_IMAGES)
+        if legacy is not None:
+            self.datatime["data_saved_s"] = legacy - elapsed
+            print(f"[{get_ts()}] [Engine.py] [D] Correctly created mock data in {elapsed:.3f} s (legacy FakeData loop: ~{legacy:.2f} s, {legacy - elapsed:.2f} s saved)")
+        else:
+            print(f"[{get_ts()}] [Engine.py] [D] Correctly created mock data in {elapsed:.3f} s (legacy FakeData loop not measured, see benchmark_gpudla.py --legacy_data_time)")
 
     def build_engine(self, enginepath: str, engineinfopath: str):
         '''
@@ -106,78 +190,91 @@ class Engine:
         self.device = "DLA0" if "dla0.engine" in enginepath else "DLA1" if "dla1.engine" in enginepath else "GPU"
         print(f"[{get_ts()}] [Engine.py] [D] \tDevice: {self.device}")
 
-    def execute(self, heartbeat: int, duration=None, start_barrier=None, warmup=-1):
+    def prepare(self):
+        '''
+        Initializes the execution backend (see Backend.py): engine, buffers and input data.
+        It is kept until release(), so that successive executions do not set it up again.
+        '''
+        from Backend import create_backend
+
+        if self.preprocess not in ("cache", "inline"):
+            raise ValueError(f"Unknown preprocess mode {self.preprocess}")
+        if self.pipeline < 1:
+            raise ValueError(f"Invalid pipeline depth {self.pipeline}")
+        start = time.perf_counter()
+        self.runner = create_backend(self)
+        self.runner.setup()
+        self.setuptime = time.perf_counter() - start
+        print(f"[{get_ts()}] [Engine.py] [D] Backend of {self.name} prepared in {self.setuptime:.3f} s")
+
+    def release(self):
+        '''
+        Releases the backend prepared by prepare().
+        '''
+        if self.runner is not None:
+            self.runner.close()
+            self.runner = None
+
+    def execute(self, heartbeat: int, duration=None, start_barrier=None, warmup=None):
         '''
-        Executes the TensorRT engine.
-        It first initializes the CUDA context and TensorRT Runtime context and then runs inference on the mock data created by create_data().
+        Executes the engine through its backend (see Backend.py).
+        It first initializes the backend (e.g. CUDA context and TensorRT Runtime context) and then runs inference on the mock data created by create_data().
         It enters the inference loop and prints heartbeat information every specified interval.
 
         heartbeat: Interval in seconds to print the throughput.
         duration: Total duration in seconds to run the inference. If None, runs indefinitely until manually stopped.
         start_barrier: Optional barrier to synchronize the start of the inference across multiple processes.
+        warmup: Number of warmup batches. If None, the adaptive warmup configured by self.warmup is run (see Warmup.py).
+                No warmup if <= 0.
+
+        If self.commands is set, the following commands (dictionaries with a "kind") are handled during the run:
+        "stop" ends the run, "target" changes the target throughput ("throughput", paced runs only) and "report"
+        sends back the heartbeats recorded so far (see get_heartbeats).
         '''
 
+        from Pacer import Pacer
+        from LatencyHistogram import LatencyHistogram
+        from StageTimers import StageTimers
+        from Arrivals import RequestQueue, create_arrivals
+        from Warmup import Warmup
+
         # Flush heartbeats
         self.heartbeats = []
         self.heartbeats_actual = []
+        self.info = {}
 
-        # ------- Initialize CUDA context and TensorRT engine within the process -------
-
-        logger = trt.Logger()
-        runtime = trt.Runtime(logger)
-
-        # Necessary to specificy to the runtime which DLA core to use
-        if self.device == "DLA0":
-            runtime.DLA_core = 0
-        elif self.device == "DLA1":
-            runtime.DLA_core = 1
-
-        with open(self.enginepath, 'rb') as f:
-            engine = runtime.deserialize_cuda_engine(f.read())
-
-        context = engine.create_execution_context()
+        # ------- Initialize the backend (engine, buffers and input data) within the process, unless already prepared -------
 
-        input_tensor_name = engine.get_tensor_name(0)
-        context.set_input_shape(input_tensor_name, self.input_shape)
-
-        input_buffer = torch.zeros(self.input_shape, dtype=torch.float32, device=torch.device('cuda')).contiguous()
-        output_buffers = [torch.zeros((self.batch_size, *shape[1:]), dtype=torch.float32, device=torch.device('cuda')).contiguous() for shape in self.output_shapes]
-
-        bindings = [None] * (1 + len(self.output_shapes))
-        bindings[0] = input_buffer.data_ptr()
-        for i, output_buffer in enumerate(output_buffers):
-            bindings[i + 1] = output_buffer.data_ptr()
-
-        print(f"[{get_ts()}] [Engine.py] [D] Correctly generated context for {self.name}")
-
-        # ------- Data preprocessing and image generation ---------
-
-        # We define a preprocess function that simply resizes the input to the model desired dimensions.
-        # We perform preprocessing of the batch within the inference loop
-        preprocess = transforms.Compose([
-            transforms.Resize(self.input_shape[2:]),  
-            transforms.ToTensor(),                   
-        ])
-        self.create_data()
-        images = self.images
-        imglen = len(images)
+        prepared = self.runner is not None
+        if not prepared:
+            self.prepare()
+        backend = self.runner
+        backend.readback_bytes = 0
 
         # ------- Warmup phase ---------
         
-        if warmup > 0:
+        # Adaptive: until the latency is stable (self.warmup options), or a fixed number of batches
+        if warmup is None and self.warmup is not False:
+            warmer = Warmup(**self.warmup)
+        elif warmup is not None and warmup > 0:
+            warmer = Warmup(window=1, cv=0, min_batches=warmup, max_batches=warmup, max_s=float('inf'))
+        else:
+            warmer = None
+        if warmer is not None:
             print(f"[{get_ts()}] [Engine.py] [I] Warmup phase for {self.name}...")
-            num_warmup_batches = 5
-            for i in range(num_warmup_batches):
-                batch_images = images[i % imglen : (i % imglen) + self.batch_size]
-                batch_images = torch.stack([preprocess(image) for image in batch_images])
-                input_buffer[0:self.batch_size].copy_(batch_images)
-
-                context.execute_async_v2(
-                    bindings,
-                    torch.cuda.current_stream().cuda_stream
-                )
-                torch.cuda.current_stream().synchronize()
-            print(f"[{get_ts()}] [Engine.py] [I] Warmup phase completed for {self.name}")
+            i = 0
+            done = False
+            while not done:
+                start_warmup = time.perf_counter()
+                backend.load(i * self.batch_size, i % self.pipeline)
+                backend.infer(i % self.pipeline)
+                done = warmer.record(time.perf_counter() - start_warmup)
+                i += 1
+            self.warmupinfo = warmer.report()
+            print(f"[{get_ts()}] [Engine.py] [I] Warmup phase completed for {self.name}: {self.warmupinfo['batches']} batches in {self.warmupinfo['seconds']:.2f} s, "
+                  f"latency {self.warmupinfo['latency_ms']:.2f} ms (CV {self.warmupinfo['cv']:.3f}, {'stable' if self.warmupinfo['stable'] else 'NOT stable'})")
+        else:
+            self.warmupinfo = {"batches": 0, "seconds": 0.0, "cv": float('inf'), "stable": False, "latency_ms": 0.0}
         
          # OPTIONAL: Wait for all processes to be ready (barrier used to synchronize multiple applications within a configuration)
         if start_barrier:
@@ -187,52 +284,177 @@ class Engine:
         # ------- Inference loop ---------
 
         print(f"[{get_ts()}] [Engine.py] [I] Begin running engine {self.name}")
+        if self.readback:
+            print(f"[{get_ts()}] [Engine.py] [I] Readback for {self.name}: into {backend.host_buffers} host buffers preallocated at setup")
         num_batches = 0
-        start_time = time.time()
-        hb_time = time.time()
+        num_images = 0                          # Images (requests in serving mode) of the batches completed in the current window
+        start_time = time.monotonic()           # Run duration, heartbeats and op times use the monotonic clock (no NTP steps)
+        hb_time = time.monotonic()
         op_time = 0
         i = 0
+        windows = []                            # Heartbeat windows, timestamped on the monotonic clock shared with Stats
+        preprocess_time = 0                     # Time spent preprocessing in the current window ("inline" mode)
+        readback_bytes = backend.readback_bytes # Readback counter at the start of the window
+        inferences = 0
+        free = deque(range(self.pipeline))      # Slots ready for a new batch
+        started = [0.0] * self.pipeline         # Time at which the batch of every slot was started (monotonic clock)
+        latency = LatencyHistogram()            # Latency of the batches (load to readback) in the current window
+        run_latency = LatencyHistogram()        # Latency of the batches of the whole run
+        inflight = deque()                      # Slots running a batch, in launch order
+        # Serving mode: requests arrive in an input queue (open loop), otherwise batches run back to back or paced
+        server = RequestQueue(create_arrivals(self.arrivals), self.arrivals.get("queue", 64)) if self.arrivals else None
+        batches = [None] * self.pipeline       # Requests of the batch of every slot (serving mode)
+        pacer = Pacer(self.throughput, self.batch_size, **self.pacing) if self.throughput > 0 and server is None else None
+        timers = StageTimers() if self.stagetimers else None   # Per-stage times (no timing at all if disabled)
+        run_start = time.monotonic()
         if duration is None:
             duration = float('inf')
-        while time.time() - start_time < duration:
-            start_op_time = time.time()
-
-            # Copy to input buffer + preprocess
-            batch_images = images[i % imglen : (i % imglen) + self.batch_size]
-            batch_images = torch.stack([preprocess(image) for image in batch_images])
-            input_buffer[0:self.batch_size].copy_(batch_images)
-
-            # Execute engine run
-            context.execute_async_v2(
-                bindings,
-                torch.cuda.current_stream().cuda_stream
-            )
-            torch.cuda.current_stream().synchronize()
-
-            # Copy output from output buffers to numpy arrays
-            # NOTE: We don't perform any postprocessing
-            output = [output_buffer[0:self.batch_size].cpu().numpy() for output_buffer in output_buffers]
-            num_batches += 1
-            op_time += time.time() - start_op_time
+        while time.monotonic() - start_time < duration:
+            start_op_time = time.monotonic()
+            if timers is not None:
+                timers.mark()
+
+            # Commands received while running (persistent worker, see EnginePool.py)
+            if self.commands is not None and self.commands.poll():
+                command = self.commands.recv()
+                if command["kind"] == "stop":
+                    print(f"[{get_ts()}] [Engine.py] [I] Stop requested for {self.name}")
+                    break
+                if command["kind"] == "target":
+                    self.throughput = command["throughput"]
+                    print(f"[{get_ts()}] [Engine.py] [I] New target throughput for {self.name}: {self.throughput}")
+                    if server is None:
+                        if self.throughput <= 0:
+                            pacer = None
+                        elif pacer is None:
+                            pacer = Pacer(self.throughput, self.batch_size, **self.pacing)
+                        else:
+                            pacer.retarget(self.throughput)
+                elif command["kind"] == "report":
+                    self.commands.send({"kind": "heartbeats", "heartbeats": self.get_heartbeats()})
+
+            # Serving mode: queue the arrived requests, or wait for the next one if idle (at most until the next
+            # heartbeat, which is also published while idle)
+            if server is not None and server.admit() == 0 and not inflight:
+                start_op_time += server.wait(min(duration - (time.monotonic() - start_time), hb_time + heartbeat - time.monotonic()))
+                if timers is not None:
+                    timers.lap("sleep")
+
+            # Launch a batch on every free slot (all of them at the start, then the one just completed)
+            while free:
+                if server is not None and not server.queue:
+                    break
+                # Autosleep: complete the running batches before waiting for the release time of the next one,
+                # so that the actual throughput only excludes the time the accelerator is idle
+                if pacer is not None:
+                    if inflight and pacer.delay() > 0:
+                        break
+                    start_op_time += pacer.wait()
+                    if timers is not None:
+                        timers.lap("sleep")
+                slot = free.popleft()
+                started[slot] = time.monotonic()
+                if server is not None:
+                    batches[slot] = server.dispatch(self.batch_size)
+                # Copy to input buffer (+ preprocess in "inline" mode)
+                load_preprocess = backend.load(i, slot)
+                preprocess_time += load_preprocess
+                if timers is not None:
+                    timers.lap("h2d")
+                    timers.split("h2d", "preprocess", load_preprocess)
+                # Execute engine run
+                backend.launch(slot)
+                if timers is not None:
+                    timers.lap("execute")
+                inflight.append(slot)
+                i += self.batch_size
+
+            # Wait for the oldest batch, while the following ones are running (none if idle in serving mode)
+            if inflight:
+                slot = inflight.popleft()
+                backend.wait(slot)
+                if timers is not None:
+                    timers.lap("sync")
+
+                # Copy output from output buffers to numpy arrays
+                # NOTE: We don't perform any postprocessing
+                output = backend.readback(slot)
+                if timers is not None:
+                    timers.lap("d2h")
+                    timers.count()
+                latency.record(time.monotonic() - started[slot])
+                free.append(slot)
+                num_batches += 1
+                num_images += server.complete(batches[slot]) if server is not None else self.batch_size
+                op_time += time.monotonic() - start_op_time
             
             # Heartbeat handling
-            if time.time() - hb_time >= heartbeat:
-                elapsed_time_hb = time.time() - hb_time
-                throughput_hb = num_batches * self.batch_size / elapsed_time_hb
-                throughput_hb_actual = num_batches * self.batch_size / op_time
+            if time.monotonic() - hb_time >= heartbeat:
+                elapsed_time_hb = time.monotonic() - hb_time
+                throughput_hb = num_images / elapsed_time_hb
+                throughput_hb_actual = num_images / op_time if op_time > 0 else 0.0
                 print(f"[{get_ts()}] [Engine.py] [I] \tHeartbeat for {self.name}: {throughput_hb:.2f} img/s", end=" ")
                 print(f"(Actual throughput: {throughput_hb_actual:.2f} img/s)")
+                if backend.preprocessing:
+                    print(f"[{get_ts()}] [Engine.py] [I] \tPreprocessing for {self.name}: {preprocess_time:.2f} s ({preprocess_time / max(num_batches, 1) * 1000:.2f} ms/batch)")
+                window_bytes = backend.readback_bytes - readback_bytes
+                if self.readback:
+                    print(f"[{get_ts()}] [Engine.py] [I] \tReadback for {self.name}: {window_bytes / 2**20:.2f} MB copied ({window_bytes / max(num_batches, 1) / 2**10:.1f} kB/batch)")
+                readback_bytes = backend.readback_bytes
                 self.heartbeats.append(throughput_hb)
                 self.heartbeats_actual.append(throughput_hb_actual)
+                inferences += num_images
+                windows.append({"t": time.monotonic(), "inferences": num_images, "preprocess_s": preprocess_time, "readback_bytes": window_bytes, "latency": latency.summary()})
+                print(f"[{get_ts()}] [Engine.py] [I] \tLatency for {self.name}: p50 {windows[-1]['latency']['p50_ms']:.2f} ms, p95 {windows[-1]['latency']['p95_ms']:.2f} ms, "
+                      f"p99 {windows[-1]['latency']['p99_ms']:.2f} ms, max {windows[-1]['latency']['max_ms']:.2f} ms")
+                run_latency.merge(latency)
+                latency.reset()
+                if timers is not None:
+                    windows[-1]["stages"] = timers.window()
+                    print(f"[{get_ts()}] [Engine.py] [I] \tStages for {self.name} (ms/batch): " + ", ".join(f"{stage[:-3]} {value:.3f}" for stage, value in windows[-1]["stages"].items()))
+                if pacer is not None:
+                    pacing = pacer.window()
+                    windows[-1]["pacing"] = pacing
+                    print(f"[{get_ts()}] [Engine.py] [I] \tPacing for {self.name}: {pacing['rate']:.3f}/{pacing['target']:.2f} img/s ({pacing['rate_error'] * 100:+.3f}%), "
+                          f"lateness {pacing['lateness_mean_ms']:.3f} ms (max {pacing['lateness_max_ms']:.3f} ms), {pacing['dropped']} dropped")
+                if server is not None:
+                    serving = server.window()
+                    windows[-1]["serving"] = serving
+                    print(f"[{get_ts()}] [Engine.py] [I] \tServing for {self.name}: {serving['arrived']} arrived, {serving['served']} served, {serving['dropped']} dropped (queue max {serving['queue_max']}), "
+                          f"queueing p50 {serving['queue_delay']['p50_ms']:.2f} ms / p99 {serving['queue_delay']['p99_ms']:.2f} ms, response p50 {serving['response']['p50_ms']:.2f} ms / p99 {serving['response']['p99_ms']:.2f} ms")
+                if self.telemetry is not None:
+                    self.telemetry.publish({"kind": "heartbeat", "throughput": throughput_hb, "actual": throughput_hb_actual, "window": windows[-1]})
                 
                 op_time = 0
-                hb_time = time.time()
+                preprocess_time = 0
+                hb_time = time.monotonic()
                 num_batches = 0
-            i += self.batch_size
-            
-            # Autosleep
-            if self.throughput > 0:
-                elapsed_time = time.time() - start_time
-                time.sleep(max(0, (i * self.batch_size / self.throughput) - elapsed_time))
-
-        print(f"[{get_ts()}] [Engine.py] [I] Finished running engine {self.name} (Duration expired)")
+                num_images = 0
+
+        # Complete (and read back) the batches still in flight, so that every launched batch is counted once
+        while inflight:
+            slot = inflight.popleft()
+            backend.wait(slot)
+            backend.readback(slot)
+            latency.record(time.monotonic() - started[slot])
+            num_images += server.complete(batches[slot]) if server is not None else self.batch_size
+        run_latency.merge(latency)
+        inferences += num_images
+        if not prepared:
+            self.release()
+        self.info = {"start": run_start, "end": time.monotonic(), "inferences": inferences, "windows": windows, **backend.info,
+                     "readback_bytes": backend.readback_bytes, "host_buffers": backend.host_buffers,
+                     "setup_s": 0.0 if prepared else self.setuptime}
+        self.info["latency"] = run_latency.summary()
+        self.info["warmup"] = self.warmupinfo
+        if self.schedulinginfo:
+            self.info["scheduling"] = self.schedulinginfo
+        if timers is not None:
+            self.info["stages"] = timers.total()
+        if pacer is not None:
+            self.info["pacing"] = pacer.total()
+        if server is not None:
+            self.info["serving"] = server.total()
+        if self.telemetry is not None:
+            self.telemetry.publish({"kind": "end", "info": {key: value for key, value in self.info.items() if key != "windows"}})
+        print(f"[{get_ts()}] [Engine.py] [I] Finished running engine {self.name} ({'Duration expired' if time.monotonic() - start_time >= duration else 'Stopped'})")
@@ -0,0 +1,282 @@
+import time
+import datetime
+import traceback
+import multiprocessing
+
+from Scheduling import apply_scheduling
+
+'''
+This module implements the persistent engine worker pool of Config.py.
+Every worker is a long-lived process holding an Engine whose backend (deserialized engine, buffers and input data,
+see Engine.prepare) is set up once, when the worker starts. Successive runs (e.g. the steps of the closed-loop
+controller, or a sweep of configurations) reuse the warm engines instead of forking a process and setting up the
+backend for every run.
+
+Workers are controlled through a pipe (control channel) with commands, dictionaries with a "kind":
+- "start": runs the engine for "duration" seconds with the run options ("options", see RUN_ATTRIBUTES, e.g. the target
+  throughput), publishing the heartbeats on the telemetry "channel" (see Telemetry.py). The worker replies "done"
+- "target": changes the target throughput ("throughput"), during the run or for the next ones
+- "stop": ends the current run
+- "report": the worker replies with the heartbeats of the current (or last) run ("heartbeats", see Engine.get_heartbeats)
+- "close": releases the backend and ends the worker
+
+When the pool is configured with a new list of engines, the workers whose setup attributes (see setup_key) are
+unchanged are kept, the others are closed and workers are started for the new engines only.
+The runs of the workers start together on a reusable barrier (StartBarrier), shared with the stats sampler.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+# Engine attributes requiring a new backend when changed (the slowdown of the mock backend depends on the number of apps)
+SETUP_ATTRIBUTES = ("enginepath", "engineinfopath", "backend", "pipeline", "readback", "preprocess", "cachebatches", "seed", "sysfs_root", "mockfreq")
+# Engine attributes sent with every "start" command
+RUN_ATTRIBUTES = ("throughput", "pacing", "arrivals", "warmup", "stagetimers", "scheduling", "defaultcpus")
+
+def setup_key(engine):
+    '''
+    Returns the setup attributes of an engine: a worker can run an engine with the same key without a new backend.
+    '''
+    key = tuple(getattr(engine, attribute) for attribute in SETUP_ATTRIBUTES)
+    if engine.backend == "mock":
+        key += (engine.numapps,)
+    return repr(key)
+
+def pool_worker(engine, commands, barrier):
+    '''
+    Entry point of a persistent engine worker: applies the scheduling of the engine (see Scheduling.py), prepares the
+    backend, then executes the commands received on the pipe. The scheduling is applied again at every run.
+
+    engine: Engine object (built, see Engine.build_engine).
+    commands: Worker end of the control pipe.
+    barrier: Start barrier of the runs (see StartBarrier).
+    '''
+    try:
+        engine.schedulinginfo = apply_scheduling(engine.scheduling, engine.defaultcpus, engine.name)
+        engine.prepare()
+    except Exception as e:
+        print(f"[{get_ts()}] [EnginePool.py] [E] Engine setup error: {e}")
+        traceback.print_exc()
+        commands.send({"kind": "error", "error": str(e)})
+        return
+    commands.send({"kind": "ready", "setup_s": engine.setuptime})
+
+    while True:
+        command = commands.recv()
+        if command["kind"] == "start":
+            for attribute, value in command["options"].items():
+                setattr(engine, attribute, value)
+            channel = command["channel"]
+            try:
+                engine.schedulinginfo = apply_scheduling(engine.scheduling, engine.defaultcpus, engine.name)
+                engine.telemetry = channel
+                engine.commands = commands
+                engine.execute(heartbeat=command.get("heartbeat", 10), duration=command["duration"], start_barrier=barrier)
+            except Exception as e:
+                print(f"[{get_ts()}] [EnginePool.py] [E] Engine execution error: {e}")
+                traceback.print_exc()
+            finally:
+                engine.telemetry = None
+                engine.commands = None
+                channel.telemetry.close()
+            commands.send({"kind": "done"})
+        elif command["kind"] == "target":
+            engine.throughput = command["throughput"]
+        elif command["kind"] == "report":
+            commands.send({"kind": "heartbeats", "heartbeats": engine.get_heartbeats()})
+        elif command["kind"] == "close":
+            break
+        # "stop" outside of a run: nothing to stop
+
+    engine.release()
+
+
+class StartBarrier:
+    '''
+    Barrier whose number of parties is set before every run (the standard multiprocessing.Barrier has a fixed number of
+    parties, while the workers of the pool outlive the runs). Its primitives are created by the spawn context, so that it
+    can be shared with forked and spawned processes, and threads.
+    '''
+    def __init__(self):
+        context = multiprocessing.get_context("spawn")
+        self.condition = context.Condition()
+        self.parties = context.Value('i', 0, lock=False)
+        self.arrived = context.Value('i', 0, lock=False)
+        self.generation = context.Value('i', 0, lock=False)
+
+    def reset(self, parties):
+        '''
+        Sets the number of parties of the next run. Must be called while no party is waiting.
+        '''
+        with self.condition:
+            self.parties.value = parties
+            self.arrived.value = 0
+
+    def wait(self):
+        with self.condition:
+            generation = self.generation.value
+            self.arrived.value += 1
+            if self.arrived.value >= self.parties.value:
+                self.arrived.value = 0
+                self.generation.value += 1
+                self.condition.notify_all()
+            else:
+                while self.generation.value == generation:
+                    self.condition.wait()
+
+
+class EnginePool:
+    def __init__(self):
+        self.workers = []       # One per engine of the configuration: {"engine", "key", "process", "commands", "running", "report"}
+        self.barrier = StartBarrier()
+
+    def changed(self, engines):
+        '''
+        Returns the engines without a worker holding the same setup (see setup_key), which configure() starts.
+        '''
+        keys = [worker["key"] for worker in self.workers if worker["process"] is not None]
+        changed = []
+        for engine in engines:
+            key = setup_key(engine)
+            if key in keys:
+                keys.remove(key)
+            else:
+                changed.append(engine)
+        return changed
+
+    def configure(self, engines):
+        '''
+        Assigns a worker to every engine (in order): workers with the same setup are reused, the other ones are closed,
+        and new workers are started (and set up) for the remaining engines.
+
+        engines: List of Engine objects (built, see Engine.build_engine).
+        '''
+        available = [worker for worker in self.workers if worker["process"] is not None]
+        workers = []
+        started = []
+        for engine in engines:
+            key = setup_key(engine)
+            worker = next((worker for worker in available if worker["key"] == key), None)
+            if worker is not None:
+                available.remove(worker)
+                worker["engine"] = engine
+            else:
+                parent, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=pool_worker, args=(engine, child, self.barrier), daemon=True)
+                worker = {"engine": engine, "key": key, "process": process, "commands": parent, "running": False, "report": None}
+                started.append(worker)
+            workers.append(worker)
+        for worker in available:
+            self.close_worker(worker)
+        self.workers = workers
+
+        start = time.perf_counter()
+        for worker in started:
+            worker["process"].start()
+        for worker in started:
+            reply = self.receive(worker, "ready", "error")
+            if reply is None or reply["kind"] == "error":
+                print(f"[{get_ts()}] [EnginePool.py] [E] Worker of {worker['engine'].name} failed to start")
+                self.close_worker(worker)
+        print(f"[{get_ts()}] [EnginePool.py] [I] Engine pool: {len(workers) - len(started)} workers reused, {len(started)} started in {time.perf_counter() - start:.3f} s")
+
+    def receive(self, worker, *kinds):
+        '''
+        Handles the messages of a worker until one of the given kinds is received (returned). Returns None if the worker exited.
+        '''
+        while True:
+            try:
+                if not worker["commands"].poll(0.1):
+                    if not worker["process"].is_alive():
+                        worker["running"] = False
+                        return None
+                    continue
+                message = worker["commands"].recv()
+            except (EOFError, OSError):
+                worker["running"] = False
+                return None
+            if message["kind"] == "done":
+                worker["running"] = False
+            elif message["kind"] == "heartbeats":
+                worker["report"] = message["heartbeats"]
+            if message["kind"] in kinds:
+                return message
+
+    def start(self, duration, telemetry, parties=1, heartbeat=10):
+        '''
+        Starts a run of every worker. The workers wait on the start barrier with "parties" other parties (e.g. the stats sampler).
+
+        duration: Duration (s) of the run.
+        telemetry: Telemetry of the run, with one channel per engine (in order).
+        parties: Number of other parties waiting on the start barrier.
+        heartbeat: Heartbeat interval (s).
+        '''
+        workers = [(i, worker) for i, worker in enumerate(self.workers) if worker["process"] is not None]
+        self.barrier.reset(len(workers) + parties)
+        for i, worker in workers:
+            options = {attribute: getattr(worker["engine"], attribute) for attribute in RUN_ATTRIBUTES}
+            worker["commands"].send({"kind": "start", "duration": duration, "options": options, "channel": telemetry.channel(i), "heartbeat": heartbeat})
+            worker["running"] = True
+
+    def running(self):
+        '''
+        Handles the pending messages of the workers. Returns the number of workers still running.
+        '''
+        for worker in self.workers:
+            while worker["running"] and worker["commands"].poll():
+                self.receive(worker, "done", "heartbeats")
+            if worker["running"] and not worker["process"].is_alive():
+                print(f"[{get_ts()}] [EnginePool.py] [E] Worker of {worker['engine'].name} exited during the run")
+                self.close_worker(worker)
+        return sum(worker["running"] for worker in self.workers)
+
+    def target(self, index, throughput):
+        '''
+        Changes the target throughput of the engine of a worker, during the run or for the next ones.
+        '''
+        worker = self.workers[index]
+        worker["engine"].throughput = throughput
+        if worker["process"] is not None:
+            worker["commands"].send({"kind": "target", "throughput": throughput})
+
+    def stop(self):
+        '''
+        Ends the current run of every worker.
+        '''
+        for worker in self.workers:
+            if worker["running"]:
+                worker["commands"].send({"kind": "stop"})
+
+    def report(self, index):
+        '''
+        Returns the heartbeats of the current (or last) run of the engine of a worker (see Engine.get_heartbeats), None if it exited.
+        '''
+        worker = self.workers[index]
+        if worker["process"] is None:
+            return None
+        worker["commands"].send({"kind": "report"})
+        reply = self.receive(worker, "heartbeats")
+        return reply["heartbeats"] if reply is not None else None
+
+    def close_worker(self, worker):
+        if worker["process"] is None:
+            return
+        try:
+            worker["commands"].send({"kind": "close"})
+        except (BrokenPipeError, OSError):
+            pass
+        worker["process"].join(timeout=10)
+        if worker["process"].is_alive():
+            worker["process"].terminate()
+            worker["process"].join()
+        worker["commands"].close()
+        worker["process"] = None
+        worker["running"] = False
+
+    def close(self):
+        '''
+        Closes every worker.
+        '''
+        for worker in self.workers:
+            self.close_worker(worker)
+        self.workers = []
@@ -0,0 +1,78 @@
+import math
+import numpy as np
+
+'''
+This module implements the fixed-size, log-bucketed latency histogram of Engine.py.
+Latencies are counted in buckets whose bounds grow geometrically (2^(1/precision) per bucket, ~1.1% relative error
+for the default precision of 32 buckets per doubling), from "lowest" to "highest" seconds (values out of the range
+are counted in the first/last bucket). The memory of a histogram does not depend on the number of samples
+(~850 int64 counters by default), so every inference can be recorded.
+
+Percentiles are reported at the geometric center of their bucket (capped by the exact maximum).
+'''
+
+class LatencyHistogram:
+    def __init__(self, lowest=1e-6, highest=100.0, precision=32):
+        '''
+        lowest: Lowest latency (s) resolved by the histogram.
+        highest: Highest latency (s) resolved by the histogram.
+        precision: Number of buckets per doubling of the latency.
+        '''
+        self.lowest = lowest
+        self.highest = highest
+        self.precision = precision
+        self.counts = np.zeros(int(math.ceil(math.log2(highest / lowest) * precision)) + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def bucket(self, value):
+        if value <= self.lowest:
+            return 0
+        return min(len(self.counts) - 1, int(math.log2(value / self.lowest) * self.precision))
+
+    def record(self, value):
+        '''
+        Records a latency (s).
+        '''
+        self.counts[self.bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        '''
+        Adds the samples of another histogram with the same buckets.
+        '''
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, p):
+        '''
+        Returns the p-th percentile (s) of the recorded latencies (0 if empty).
+        '''
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return float(min(self.max, self.lowest * 2 ** ((bucket + 0.5) / self.precision)))
+
+    def summary(self):
+        '''
+        Returns the number of samples ("count") and the "mean_ms", "p50_ms", "p95_ms", "p99_ms" and "max_ms" latencies.
+        '''
+        return {
+            "count": self.count,
+            "mean_ms": float(self.total / self.count * 1000) if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": float(self.max * 1000),
+        }
@@ -0,0 +1,163 @@
+import os
+import csv
+import json
+import time
+import datetime
+import numpy as np
+
+from Backend import Backend
+from Sampler import Sampler
+from Discovery import Discovery
+from Stats import memory_footprint
+
+'''
+This module implements the "mock" execution backend of Engine.py, which emulates the inference latency of an engine
+on hosts without GPU, so that Config/Refine/Stats (and whole runConfig.py runs) can be exercised anywhere.
+
+The latency of a batch is batch_size / throughput, where:
+- the throughput of the device at the current GPU frequency is interpolated from the engine_info/<model>/<model>.csv
+  profile (the same table used by App.py)
+- the throughput is reduced by the slowdown of engine_info/slowdowns.json for the number of co-running applications
+- the GPU frequency is read from a (possibly fake) sysfs tree by MockClock, so that frequencies set by SysConfig.py
+  on the same tree are followed; if it can not be read, the frequency of the configuration is used
+No input data is created and the outputs are host arrays preallocated per slot (if engine.readback is True).
+
+The emulated accelerator runs one batch at a time: a batch launched while the previous ones are still running starts
+when they complete (as on a CUDA stream), so the overlap of the pipelined mode of Engine.py can be exercised too.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+PROFILE_DEVICES = {"GPU": "gpu", "DLA0": "dla0", "DLA1": "dla1"}
+
+def read_profile(csvpath, device):
+    '''
+    Returns the sorted list of (GPU frequency, throughput) of a device from an engine_info CSV profile.
+    DLA1 uses the DLA0 profile if not profiled.
+
+    csvpath: Path of the CSV profile.
+    device: Engine device (GPU, DLA0 or DLA1).
+    '''
+    profiles = {}
+    with open(csvpath, 'r') as f:
+        for row in csv.DictReader(f):
+            profiles.setdefault(row["Device"].lower(), []).append((int(row["Frequency"]), float(row["Throughput"])))
+    name = PROFILE_DEVICES[device]
+    if name not in profiles and name.startswith("dla"):
+        name = next((profiled for profiled in sorted(profiles) if profiled.startswith("dla")), name)
+    if name not in profiles:
+        raise ValueError(f"No {device} profile in {csvpath}")
+    return sorted(profiles[name])
+
+def read_slowdown(slowdownpath, name, numapps):
+    '''
+    Returns the slowdown of an application co-running with numapps - 1 others (0 if alone or not profiled).
+    '''
+    if numapps <= 1 or not os.path.exists(slowdownpath):
+        return 0.0
+    with open(slowdownpath, 'r') as f:
+        slowdowns = json.load(f).get(name, {})
+    if str(numapps) not in slowdowns:
+        print(f"[{get_ts()}] [MockBackend.py] [W] No slowdown for {name} with {numapps} applications in {slowdownpath}")
+        return 0.0
+    return slowdowns[str(numapps)]
+
+def profile_throughput(profile, frequency):
+    '''
+    Returns the throughput at a frequency, interpolating linearly between the profiled frequencies (clamped at the ends).
+    '''
+    frequencies = [point[0] for point in profile]
+    throughputs = [point[1] for point in profile]
+    return float(np.interp(frequency, frequencies, throughputs))
+
+
+class MockClock:
+    '''
+    Fake GPU clock source. Reads the GPU devfreq node of a sysfs tree: the current frequency clamped to the
+    min/max frequencies (as set by SysConfig.py), or the default frequency if not readable.
+    The value is cached for "period" seconds.
+    '''
+    def __init__(self, root, default, period=0.1):
+        gpu = Discovery(root).gpu()
+        self.sampler = Sampler(root)
+        self.paths = {name: os.path.join(gpu, name) for name in ("cur_freq", "min_freq", "max_freq")}
+        self.available = {name: os.path.exists(self.sampler.resolve(path)) for name, path in self.paths.items()}
+        self.default = default
+        self.period = period
+        self.last = None
+        self.value = default
+
+    def read(self, name):
+        return self.sampler.read(self.paths[name]) if self.available[name] else None
+
+    def frequency(self):
+        now = time.monotonic()
+        if self.last is not None and now - self.last < self.period:
+            return self.value
+        self.last = now
+        current, low, high = self.read("cur_freq"), self.read("min_freq"), self.read("max_freq")
+        value = current if current is not None else self.default
+        if high is not None:
+            value = min(value, high)
+        if low is not None:
+            value = max(value, low)
+        self.value = value
+        return value
+
+    def close(self):
+        self.sampler.close()
+
+
+class MockBackend(Backend):
+    def setup(self):
+        '''
+        Reads the throughput profile and the slowdown of the engine and initializes the fake clock.
+        '''
+        engine = self.engine
+        infodir = os.path.dirname(engine.engineinfopath)
+        self.profile = read_profile(os.path.join(infodir, f"{engine.name}.csv"), engine.device)
+        self.slowdown = read_slowdown(os.path.join(os.path.dirname(infodir), "slowdowns.json"), engine.name, engine.numapps)
+        default = engine.mockfreq if engine.mockfreq is not None else self.profile[-1][0]
+        self.clock = MockClock(engine.sysfs_root, int(default))
+        self.outputs = [[np.zeros((engine.batch_size, *shape[1:]), dtype=np.float32) for shape in engine.output_shapes] if engine.readback else [] for _ in range(self.slots)]
+        self.host_buffers = sum(len(outputs) for outputs in self.outputs)
+        self.outputbytes = sum(output.nbytes for output in self.outputs[0])
+        self.finish = [0.0] * self.slots    # Completion time (monotonic clock) of the batch of every slot
+        self.available = 0.0                # Time at which the emulated accelerator completes the launched batches
+        frequency = self.clock.frequency()
+        print(f"[{get_ts()}] [MockBackend.py] [D] Mock backend for {engine.name} on {engine.device}: "
+              f"{profile_throughput(self.profile, frequency) * (1 - self.slowdown):.2f} img/s at {frequency} Hz (slowdown {self.slowdown})")
+        footprint = memory_footprint()
+        self.info = {
+            "backend": "mock",
+            "pipeline": self.slots,
+            "readback": engine.readback,
+            "preprocess": "none",
+            "slowdown": self.slowdown,
+            "footprint": {"rss_before_kb": footprint["rss_kb"], "uss_before_kb": footprint["uss_kb"], "rss_after_kb": footprint["rss_kb"], "uss_after_kb": footprint["uss_kb"]},
+        }
+
+    def latency(self):
+        '''
+        Returns the emulated latency (s) of a batch at the current frequency.
+        '''
+        throughput = profile_throughput(self.profile, self.clock.frequency()) * (1 - self.slowdown)
+        return self.engine.batch_size / throughput
+
+    def load(self, i, slot=0):
+        return 0.0
+
+    def launch(self, slot=0):
+        self.available = max(time.monotonic(), self.available) + self.latency()
+        self.finish[slot] = self.available
+
+    def wait(self, slot=0):
+        time.sleep(max(0, self.finish[slot] - time.monotonic()))
+
+    def readback(self, slot=0):
+        self.readback_bytes += self.outputbytes
+        return self.outputs[slot]
+
+    def close(self):
+        self.clock.close()
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import numpy as np
+
+'''
+This module generates the mock input data of Engine.py (and benchmark/benchmark_gpudla.py).
+The whole corpus is created with vectorized calls, as uint8 pixels (the content of a decoded image) from a seeded
+generator, so that runs are reproducible. The batch cache takes images directly at the input shape of the model, while
+the inline preprocessing takes images at the source shape of the legacy generation (SOURCE_SHAPE, HWC as a decoded
+PIL image), so that it still times the layout change, the resize and the conversion of the legacy Resize/ToTensor path.
+The corpus can be generated in any uint8 array (e.g. a shared memory segment, see SharedCorpus.py).
+The legacy generation (one torchvision FakeData dataset and iterator per 3x224x224 PIL image) can be timed on a few
+images (benchmark/benchmark_gpudla.py --legacy_data_time, it imports torchvision). The measurement is stored once per
+host (~/.cache/rtrm, with the hardware map of Discovery.py), and the engines read it back to report the startup time saved.
+
+torch is imported within the functions using it, so that the corpus can be created by processes that do not load it.
+'''
+
+MOCK_CORPUS_BYTES = 256 * 2**20     # Maximum size of a corpus generated for inline preprocessing
+MOCK_CHUNK_BYTES = 64 * 2**20       # Maximum size generated by a single call (bounds the temporary memory)
+LEGACY_IMAGES = 2000                # Number of images created by the legacy generation
+SOURCE_SHAPE = (224, 224, 3)        # Shape (H, W, C) of an image of the legacy generation (FakeData 3x224x224 PIL images)
+LEGACY_TIME_PATH = os.path.join("~", ".cache", "rtrm", "legacy_data_time.json")  # Stored measurement of the legacy generation
+
+def fill_corpus(out, seed=0):
+    '''
+    Fills a uint8 array of shape (N, C, H, W) with random pixels and returns it.
+
+    out: Array to fill.
+    seed: Seed of the generator.
+    '''
+    generator = np.random.default_rng(seed)
+    chunk = max(1, MOCK_CHUNK_BYTES // max(1, out[0].nbytes)) if len(out) else 1
+    for first in range(0, len(out), chunk):
+        images = out[first:first + chunk]
+        images[...] = generator.integers(0, 256, size=images.shape, dtype=np.uint8)
+    return out
+
+def mock_corpus(numimgs, shape, seed=0):
+    '''
+    Returns a uint8 tensor of shape (numimgs, *shape) of random pixels.
+
+    numimgs: Number of images.
+    shape: Shape of an image ((C, H, W) at the input shape of a model, or SOURCE_SHAPE).
+    seed: Seed of the generator.
+    '''
+    import torch
+
+    return torch.from_numpy(fill_corpus(np.empty((numimgs, *shape), dtype=np.uint8), seed))
+
+def inline_preprocess(input_shape, dtype):
+    '''
+    Returns the inline preprocessing of a batch of source images (N, H, W, C) uint8, as the legacy Resize/ToTensor path:
+    change of layout to (N, C, H, W), resize to the input shape of the model and conversion to dtype (scaled to [0, 1]).
+
+    input_shape: Input shape of the model (N, C, H, W).
+    dtype: Input dtype of the model (torch dtype).
+    '''
+    from torchvision import transforms
+
+    resize = transforms.Resize(input_shape[2:], antialias=True)
+    convert = transforms.ConvertImageDtype(dtype)
+
+    def preprocess(images):
+        return convert(resize(images.permute(0, 3, 1, 2).contiguous()))
+    return preprocess
+
+def corpus_length(shape, batch_size, maximum=LEGACY_IMAGES, budget=MOCK_CORPUS_BYTES):
+    '''
+    Returns the number of images of a corpus of the given image shape fitting in the memory budget (at least a batch).
+    '''
+    size = 1
+    for dim in shape:
+        size *= dim
+    return max(batch_size, min(maximum, budget // size))
+
+def legacy_time(numimgs=LEGACY_IMAGES, samples=8):
+    '''
+    Estimates the time (s) taken by the legacy FakeData loop to create numimgs images, timing a few iterations.
+    '''
+    import torchvision
+
+    start = time.perf_counter()
+    for _ in range(samples):
+        next(iter(torchvision.datasets.FakeData(size=1, image_size=(3, 224, 224))))
+    return (time.perf_counter() - start) / samples * numimgs
+
+def save_legacy_time(seconds, numimgs=LEGACY_IMAGES, path=LEGACY_TIME_PATH):
+    '''
+    Stores a measurement of legacy_time, read back by load_legacy_time.
+
+    seconds: Time (s) of the legacy FakeData loop for numimgs images.
+    '''
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({"image_s": seconds / numimgs, "measured": time.time()}, f)
+
+def load_legacy_time(numimgs=LEGACY_IMAGES, path=LEGACY_TIME_PATH):
+    '''
+    Returns the time (s) of the legacy FakeData loop for numimgs images from the stored measurement (see
+    save_legacy_time), None if it was never measured on this host.
+    '''
+    try:
+        with open(os.path.expanduser(path), 'r') as f:
+            return json.load(f)["image_s"] * numimgs
+    except (OSError, ValueError, KeyError):
+        return None
@@ -0,0 +1,131 @@
+import time
+import datetime
+
+'''
+This module implements the rate limiter of Engine.py (autosleep), which releases the batches of an engine at its
+target throughput.
+
+Batch k is released at the absolute time start + k * period on the monotonic clock (period = batch_size / target),
+so that sleep errors do not accumulate. Waiting is hybrid: a coarse time.sleep until "spin" seconds before the release
+time, minus the oversleep observed so far (online correction, exponentially averaged), then a busy wait until the
+release time.
+
+Catch-up after a stall is bounded by a token bucket: at most "burst" batches are released back to back; beyond that
+the schedule is shifted and the missed releases are dropped (counted in "dropped").
+
+The pacing error of every window (lateness of the releases w.r.t. their release times, and released rate w.r.t. the
+target) is reported by window() and total().
+
+The target can be changed while running (retarget, e.g. by a command of the persistent worker pool, see EnginePool.py):
+the next release is moved to one new period after the previous one, and the pacing error is measured from the change.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+class Pacer:
+    def __init__(self, rate, batch_size, burst=8, spin=0.002, gain=0.1):
+        '''
+        rate: Target throughput (images/s).
+        batch_size: Images per batch.
+        burst: Maximum number of batches released back to back when late.
+        spin: Time (s) busy waited before every release.
+        gain: Weight of the last oversleep in the correction of the sleep time.
+        '''
+        if rate <= 0:
+            raise ValueError(f"Invalid pacing rate {rate}")
+        self.rate = rate
+        self.batch_size = batch_size
+        self.period = batch_size / rate
+        self.burst = max(1, burst)
+        self.spin = spin
+        self.gain = gain
+        self.oversleep = 0.0        # Estimated oversleep (s) of time.sleep
+        self.start()
+
+    def start(self):
+        '''
+        Starts the schedule: the first batch is released immediately.
+        '''
+        self.origin = time.monotonic()
+        self.next = self.origin
+        # Every release accounts for the period preceding it, so that the released rate of a window is unbiased
+        self.run = self.counters(self.origin - self.period)
+        self.current = self.counters(self.origin - self.period)
+
+    def retarget(self, rate):
+        '''
+        Changes the target throughput (images/s). The window and run pacing errors restart from the change.
+        '''
+        if rate <= 0:
+            raise ValueError(f"Invalid pacing rate {rate}")
+        previous = self.next - self.period     # Release time of the previous batch
+        self.rate = rate
+        self.period = self.batch_size / rate
+        self.next = previous + self.period
+        self.run = self.counters(previous)
+        self.current = self.counters(previous)
+
+    def counters(self, start):
+        return {"start": start, "releases": 0, "dropped": 0, "lateness": 0.0, "lateness_max": 0.0}
+
+    def delay(self):
+        '''
+        Returns the time (s) until the release time of the next batch (negative if late).
+        '''
+        return self.next - time.monotonic()
+
+    def wait(self):
+        '''
+        Waits until the release time of the next batch. Returns the time (s) spent waiting.
+        '''
+        now = time.monotonic()
+        # Token bucket: never more than "burst" releases behind the schedule
+        earliest = now - (self.burst - 1) * self.period
+        if self.next < earliest:
+            skipped = int((earliest - self.next) / self.period) + 1
+            self.next += skipped * self.period
+            for counters in (self.run, self.current):
+                counters["dropped"] += skipped
+        release = self.next
+        sleep = release - now - self.spin - self.oversleep
+        if sleep > 0:
+            time.sleep(sleep)
+            self.oversleep += self.gain * (time.monotonic() - (now + sleep) - self.oversleep)
+        while time.monotonic() < release:
+            pass
+        released = time.monotonic()
+        for counters in (self.run, self.current):
+            counters["releases"] += 1
+            counters["lateness"] += released - release
+            counters["lateness_max"] = max(counters["lateness_max"], released - release)
+        self.next = release + self.period
+        return released - now
+
+    def window(self):
+        '''
+        Returns the pacing error since the previous call (or the start): released "rate" (images/s), relative
+        "rate_error" w.r.t. the target, "lateness_mean_ms"/"lateness_max_ms" of the releases and "dropped" releases.
+        '''
+        now = time.monotonic()
+        report = self.report(self.current, now)
+        self.current = self.counters(now)
+        return report
+
+    def total(self):
+        '''
+        Returns the pacing error of the whole run (see window()).
+        '''
+        return self.report(self.run, time.monotonic())
+
+    def report(self, counters, now):
+        elapsed = now - counters["start"]
+        rate = counters["releases"] * self.batch_size / elapsed if elapsed > 0 else 0.0
+        return {
+            "target": self.rate,
+            "rate": rate,
+            "rate_error": (rate - self.rate) / self.rate,
+            "lateness_mean_ms": counters["lateness"] / counters["releases"] * 1000 if counters["releases"] else 0.0,
+            "lateness_max_ms": counters["lateness_max"] * 1000,
+            "dropped": counters["dropped"],
+        }
@@ -14,12 +14,12 @@ class Refine:
         '''
         Refines the CPU and GPU frequencies based on the throughput of applications.
 
-        in_heartbeats : list of tuples (name, device, target_throughput, heartbeats, heartbeats_actual) [As taken from Engine.get_heartbeats()]
+        in_heartbeats : list of tuples (name, device, target_throughput, heartbeats, heartbeats_actual, info) [As taken from Engine.get_heartbeats()]
         '''
         # appsList : list of (app_name, target_throughput, last_actual_throughput)
         # It is looking at the last actual throughput (throughput without autosleep) and calculating the delta based on this last value
         appsList = []
-        for name, _, target_tp, _, heartbeats_actual in in_heartbeats:
+        for name, _, target_tp, _, heartbeats_actual, _ in in_heartbeats:
             appsList.append((name, target_tp, heartbeats_actual[-1]))
 
         cpuFreq = int(cpuFreq)
@@ -0,0 +1,135 @@
+import os
+import numpy as np
+
+from SampleBuffer import time_weights
+
+'''
+This module computes the frequency residency (time spent at every frequency) of the GPU and CPU clusters for Stats.py.
+
+When available, the kernel counters are used, since they account for every transition, even between two samples:
+- cpufreq "stats/time_in_state": one "<frequency kHz> <time in 10 ms units>" line per frequency
+- devfreq "trans_stat": transition table whose rows are "<frequency Hz>: <transitions to every frequency> <time in ms>"
+Both are cumulative, so the residency of a window is the difference between two snapshots.
+Otherwise the residency is estimated from the frequency sampled together with every power sample, weighted by
+the time represented by every sample.
+
+Residencies are dictionaries {frequency (kHz): time (s)}.
+'''
+
+USER_HZ = 100   # Unit of cpufreq time_in_state (1/USER_HZ s)
+
+def parse_time_in_state(data):
+    '''
+    Parses the content of a cpufreq time_in_state node. Returns None if the content is not valid.
+
+    data: Content of the node (bytes or str).
+    '''
+    if data is None:
+        return None
+    if isinstance(data, bytes):
+        data = data.decode(errors="ignore")
+    residency = {}
+    for line in data.splitlines():
+        fields = line.split()
+        if len(fields) == 2 and fields[0].isdigit() and fields[1].isdigit():
+            residency[int(fields[0])] = int(fields[1]) / USER_HZ
+    return residency or None
+
+def parse_trans_stat(data):
+    '''
+    Parses the content of a devfreq trans_stat node (frequencies in Hz, times in ms). Returns None if the content is not valid.
+
+    data: Content of the node (bytes or str).
+    '''
+    if data is None:
+        return None
+    if isinstance(data, bytes):
+        data = data.decode(errors="ignore")
+    residency = {}
+    for line in data.splitlines():
+        if ":" not in line:
+            continue
+        head, _, tail = line.partition(":")
+        head = head.replace("*", "").strip()
+        fields = tail.split()
+        if head.isdigit() and fields and fields[-1].isdigit():
+            residency[int(head) // 1000] = int(fields[-1]) / 1000.0
+    return residency or None
+
+def difference(current, previous):
+    '''
+    Returns the residency accumulated between two snapshots of a kernel counter.
+    '''
+    return {freq: time - previous.get(freq, 0.0) for freq, time in current.items() if time - previous.get(freq, 0.0) > 0}
+
+def sampled_residency(t, freqs):
+    '''
+    Returns the residency estimated from sampled frequencies.
+
+    t: Timestamps of the samples.
+    freqs: Frequency (kHz) of every sample (NaN if not read).
+    '''
+    residency = {}
+    for freq, weight in zip(freqs, time_weights(t)):
+        if not np.isnan(freq):
+            residency[int(freq)] = residency.get(int(freq), 0.0) + float(weight)
+    return residency
+
+def mean_frequency(residency):
+    '''
+    Returns the time-weighted mean frequency (kHz) of a residency, NaN if empty.
+    '''
+    total = sum(residency.values())
+    return sum(freq * time for freq, time in residency.items()) / total if total > 0 else float('nan')
+
+
+class ResidencyTracker:
+    '''
+    Tracks the kernel residency counters of a set of clock domains.
+    '''
+    def __init__(self, sampler, counters):
+        '''
+        sampler: Sampler used to read the counters.
+        counters: Dictionary {domain: (path, parser)} with parser parse_time_in_state or parse_trans_stat.
+        '''
+        self.sampler = sampler
+        self.counters = counters        # Configured counters, kept across runs
+        self.active = []                # Domains whose counter was readable at the start of the current run
+        self.first = {}
+        self.last = {}
+
+    def read(self, domain):
+        path, parser = self.counters[domain]
+        return parser(self.sampler.read_bytes(path, 4096))
+
+    def start(self):
+        '''
+        Takes the initial snapshot of every counter. Domains without a readable counter are left out of this run
+        (and tried again at the next start, e.g. by a Stats object reused across runs).
+        '''
+        self.active = []
+        self.first = {}
+        self.last = {}
+        for domain, (path, _) in self.counters.items():
+            snapshot = self.read(domain) if os.path.exists(self.sampler.resolve(path)) else None
+            if snapshot is not None:
+                self.active.append(domain)
+                self.first[domain] = self.last[domain] = snapshot
+
+    def window(self):
+        '''
+        Returns {domain: residency} accumulated since the last call (since start for the first call).
+        '''
+        residencies = {}
+        for domain in self.active:
+            snapshot = self.read(domain)
+            if snapshot is not None:
+                residencies[domain] = difference(snapshot, self.last[domain])
+                self.last[domain] = snapshot
+        return residencies
+
+    def total(self):
+        '''
+        Returns {domain: residency} accumulated since start (up to the last call of window).
+        '''
+        return {domain: difference(self.last[domain], self.first[domain]) for domain in self.active}
@@ -0,0 +1,120 @@
+import numpy as np
+
+'''
+This module implements a fixed capacity ring buffer of timestamped samples backed by NumPy arrays.
+It is used by Stats.py to hold the power line samples, so that memory stays bounded regardless of the run length
+and the statistics of a heartbeat window can be computed with vectorized reductions.
+
+Samples are addressed by their absolute index (number of samples appended before them): a window is identified
+by the index of its first sample. Only the last "capacity" samples are retained.
+
+Samples need not be evenly spaced (Stats.py samples faster around transients): summaries can weight every sample
+by the time it represents, i.e. half the interval to the previous sample plus half the interval to the next one.
+With these weights the mean equals the trapezoidal integral divided by the window length.
+'''
+
+def time_weights(t):
+    '''
+    Returns the weight (s) of every sample of a window: half the interval to its neighbours (one side at the edges).
+
+    t: Timestamps of the samples, in order.
+    '''
+    if len(t) < 2:
+        return np.ones(len(t))
+    gaps = np.diff(t)
+    weights = np.zeros(len(t))
+    weights[:-1] += gaps / 2.0
+    weights[1:] += gaps / 2.0
+    return weights
+
+def weighted_percentile(values, weights, percentiles):
+    '''
+    Returns the weighted percentiles of values (NaN ignored), interpolating between the sorted samples.
+
+    values: 1D array of values.
+    weights: 1D array of the weights of the values.
+    percentiles: Sequence of percentiles in [0, 100].
+    '''
+    valid = ~np.isnan(values) & (weights > 0)
+    if not valid.any():
+        return [np.nan] * len(percentiles)
+    order = np.argsort(values[valid])
+    values, weights = values[valid][order], weights[valid][order]
+    # Position of every sample at the middle of its weight, normalized to [0, 100]
+    cumulative = (np.cumsum(weights) - weights / 2.0) / weights.sum() * 100.0
+    return np.interp(percentiles, cumulative, values)
+
+class SampleBuffer:
+    def __init__(self, columns, capacity=65536):
+        '''
+        columns: Names of the sample columns (e.g. the power lines).
+        capacity: Maximum number of samples retained.
+        '''
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)                              # Sample timestamps (monotonic, s)
+        self.values = np.full((capacity, len(self.columns)), np.nan, dtype=np.float32)
+        self.count = 0                                                              # Samples appended since creation
+
+    def append(self, t, values):
+        '''
+        Appends a sample, overwriting the oldest one if the buffer is full.
+
+        t: Timestamp of the sample.
+        values: Sequence of values, one per column (NaN for missing values).
+        '''
+        idx = self.count % self.capacity
+        self.t[idx] = t
+        self.values[idx] = values
+        self.count += 1
+
+    def window(self, start=0, stop=None):
+        '''
+        Returns the (timestamps, values) arrays of the samples with absolute index in [start, stop), in order.
+        Samples already overwritten are silently dropped from the window.
+
+        start: Absolute index of the first sample of the window.
+        stop: Absolute index past the last sample of the window (defaults to the last appended sample).
+        '''
+        stop = self.count if stop is None else min(stop, self.count)
+        start = max(start, self.count - self.capacity, 0)
+        if start >= stop:
+            return self.t[:0], self.values[:0]
+        first, last = start % self.capacity, stop % self.capacity
+        if first < last or last == 0:
+            end = last if last != 0 else self.capacity
+            return self.t[first:end], self.values[first:end]
+        # The window wraps around the end of the buffer
+        return np.concatenate((self.t[first:], self.t[:last])), np.concatenate((self.values[first:], self.values[:last]))
+
+    def summary(self, start=0, stop=None, weighted=False):
+        '''
+        Returns a dictionary {column: {"min", "mean", "p50", "p95", "max"}} for the samples in [start, stop).
+        Missing (NaN) values are ignored; columns without any valid value report NaN.
+
+        start: Absolute index of the first sample of the window.
+        stop: Absolute index past the last sample of the window.
+        weighted: If True, the mean and the percentiles are weighted by the time represented by every sample (see time_weights).
+        '''
+        t, values = self.window(start, stop)
+        valid = ~np.isnan(values).all(axis=0) if len(values) else np.zeros(len(self.columns), dtype=bool)
+        stats = {column: {"min": np.nan, "mean": np.nan, "p50": np.nan, "p95": np.nan, "max": np.nan} for column in self.columns}
+        if not valid.any():
+            return stats
+
+        values = values[:, valid].astype(np.float64)
+        mins = np.nanmin(values, axis=0)
+        maxs = np.nanmax(values, axis=0)
+        if weighted:
+            weights = time_weights(t)
+            means, p50s, p95s = np.zeros(values.shape[1]), np.zeros(values.shape[1]), np.zeros(values.shape[1])
+            for i in range(values.shape[1]):
+                present = ~np.isnan(values[:, i])
+                means[i] = np.average(values[present, i], weights=weights[present]) if weights[present].sum() > 0 else np.nanmean(values[:, i])
+                p50s[i], p95s[i] = weighted_percentile(values[:, i], weights, [50, 95])
+        else:
+            means = np.nanmean(values, axis=0)
+            p50s, p95s = np.nanpercentile(values, [50, 95], axis=0)
+        for i, column in enumerate(c for c, v in zip(self.columns, valid) if v):
+            stats[column] = {"min": mins[i], "mean": means[i], "p50": p50s[i], "p95": p95s[i], "max": maxs[i]}
+        return stats
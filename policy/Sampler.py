@@ -0,0 +1,122 @@
+import os
+import time
+import datetime
+import subprocess
+
+'''
+This module implements a low overhead reader for sysfs sensor nodes (hwmon, devfreq, cpufreq).
+Every node is opened once and its descriptor is kept open: each read is a pread at offset 0, so sampling
+does not fork a "sudo cat" process per value.
+
+The sysfs root is configurable, so the sampler can be pointed to a fake directory tree for testing.
+Absolute "/sys/..." paths are rebased on the configured root, other absolute paths are used as they are.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+class Sampler:
+    def __init__(self, root="/sys"):
+        self.root = root
+        self.fds = {}                   # Open descriptors indexed by path
+        self.fallback = set()           # Paths that can not be opened by this user (read through "sudo cat")
+        self.readsize = 64              # Sysfs integer nodes are always shorter than this
+
+    def resolve(self, path):
+        '''
+        Returns the path rebased on the sysfs root.
+
+        path: Absolute sysfs path (/sys/...), path already under the sysfs root or path relative to the sysfs root.
+        '''
+        if path.startswith("/sys/"):
+            return os.path.join(self.root, path[len("/sys/"):])
+        return os.path.join(self.root, path)
+
+    def open(self, path):
+        '''
+        Opens the sysfs node and caches its descriptor.
+        If the node is not readable by the current user, it is marked to be read through "sudo cat".
+
+        path: Path of the sysfs node.
+        '''
+        try:
+            fd = os.open(self.resolve(path), os.O_RDONLY)
+        except PermissionError:
+            print(f"[{get_ts()}] [Sampler.py] [W] Permission denied on {path}, falling back to sudo cat")
+            self.fallback.add(path)
+            return None
+        self.fds[path] = fd
+        return fd
+
+    def read_bytes(self, path, size=None):
+        '''
+        Reads the raw content of a sysfs node. Returns None on error.
+
+        path: Path of the sysfs node.
+        size: Maximum number of bytes to read (defaults to self.readsize).
+        '''
+        size = self.readsize if size is None else size
+        try:
+            if path in self.fallback:
+                result = subprocess.run(['sudo', 'cat', self.resolve(path)], capture_output=True)
+                return result.stdout
+            fd = self.fds.get(path)
+            if fd is None:
+                fd = self.open(path)
+                if fd is None:
+                    return self.read_bytes(path, size)
+            return os.pread(fd, size, 0)
+        except Exception as e:
+            print(f"[{get_ts()}] [Sampler.py] [E] An error occured reading {path}: {e}")
+            return None
+
+    def read(self, path):
+        '''
+        Reads an integer value from a sysfs node. Returns None on error.
+
+        path: Path of the sysfs node.
+        '''
+        data = self.read_bytes(path)
+        if data is None:
+            return None
+        try:
+            return int(data)
+        except ValueError:
+            print(f"[{get_ts()}] [Sampler.py] [E] Unexpected content in {path}: {data!r}")
+            return None
+
+    def close(self):
+        '''
+        Closes every cached descriptor.
+        '''
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+        self.fallback = set()
+
+
+class CpuTimer:
+    '''
+    Accumulates the CPU time spent by the calling thread between start() and stop().
+    Used to report the cost of the sampler itself, independently of it running as a process or as a thread.
+    '''
+    def __init__(self):
+        self.total = 0.0
+        self.part = 0.0
+        self._start = None
+
+    def start(self):
+        self._start = time.thread_time()
+
+    def stop(self):
+        elapsed = time.thread_time() - self._start
+        self.total += elapsed
+        self.part += elapsed
+
+    def pop_part(self):
+        '''
+        Returns the CPU time (s) accumulated since the last call and resets it.
+        '''
+        part = self.part
+        self.part = 0.0
+        return part
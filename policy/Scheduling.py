@@ -0,0 +1,62 @@
+import os
+import datetime
+
+'''
+This module applies the CPU affinity and the scheduling priority of the Engine and Stats workers of Config.py.
+The options are the "scheduling" dictionary of a model (or the top-level one, for all the models) and the
+"stats_scheduling" dictionary for the stats sampler:
+- "cpus": list of the CPUs the worker runs on. The engines default to the CPUs of the clusters whose frequency is
+  set by SysConfig.py (see SysConfig.controlled_cpus), so that their host threads run at the configured CPU frequency
+- "nice": nice value (negative values need CAP_SYS_NICE)
+- "policy": "other" (default), "fifo" (SCHED_FIFO) or "rr" (SCHED_RR), at "priority" (1-99, default 1) for the
+  real-time policies (need CAP_SYS_NICE)
+
+The settings apply to the calling thread and to the threads it creates afterwards (e.g. the CUDA threads of the
+backend), so that a stats sampler run as a thread of Config.py does not change the settings of the parent.
+CPUs not available to the process are ignored; settings that cannot be applied (e.g. without privileges) are reported
+and skipped, the worker runs anyway.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+POLICIES = {"other": os.SCHED_OTHER, "fifo": os.SCHED_FIFO, "rr": os.SCHED_RR}
+
+def apply_scheduling(options, default_cpus=None, name="worker"):
+    '''
+    Applies the scheduling options to the calling thread. Returns the resulting "cpus", "nice" and "policy".
+
+    options: Scheduling options (see above).
+    default_cpus: CPUs used if the options set none (None: affinity unchanged).
+    name: Name of the worker (for printing).
+    '''
+    policy = options.get("policy", "other")
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown scheduling policy {policy}")
+
+    cpus = options.get("cpus", default_cpus)
+    if cpus is not None:
+        selected = sorted({int(cpu) for cpu in cpus} & os.sched_getaffinity(0))
+        if selected:
+            os.sched_setaffinity(0, selected)
+        else:
+            print(f"[{get_ts()}] [Scheduling.py] [W] None of the CPUs {list(cpus)} is available to {name}, affinity unchanged")
+    if "nice" in options:
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, options["nice"])
+        except OSError as e:
+            print(f"[{get_ts()}] [Scheduling.py] [W] Could not set nice {options['nice']} for {name}: {e}")
+    if policy != "other":
+        try:
+            os.sched_setscheduler(0, POLICIES[policy], os.sched_param(options.get("priority", 1)))
+        except OSError as e:
+            print(f"[{get_ts()}] [Scheduling.py] [W] Could not set policy {policy} for {name}: {e}")
+
+    current = os.sched_getscheduler(0)
+    report = {
+        "cpus": sorted(os.sched_getaffinity(0)),
+        "nice": os.getpriority(os.PRIO_PROCESS, 0),
+        "policy": next((key for key, value in POLICIES.items() if value == current), str(current)),
+    }
+    print(f"[{get_ts()}] [Scheduling.py] [I] {name}: CPUs {report['cpus']}, nice {report['nice']}, policy {report['policy']}")
+    return report
@@ -0,0 +1,60 @@
+import datetime
+import numpy as np
+from multiprocessing import shared_memory
+
+from MockData import fill_corpus
+
+'''
+This module implements the read-only input corpus shared by the Engine processes of a configuration.
+Config.py creates one corpus per distinct input shape in a multiprocessing.shared_memory segment, before starting
+the workers; every Engine maps it (zero-copy) instead of generating its own images, so memory does not grow with
+the number of co-running applications using the same input shape.
+
+The corpus is a uint8 array of shape (numimgs, C, H, W) filled by MockData.fill_corpus.
+Engines must not write to it.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+class SharedCorpus:
+    def __init__(self, numimgs, shape, seed=0, name=None):
+        '''
+        Creates and fills the shared memory segment (or attaches to an existing one if name is given).
+
+        numimgs: Number of images.
+        shape: Shape of an image (C, H, W).
+        seed: Seed of the mock images.
+        name: Name of an existing segment to attach to.
+        '''
+        self.numimgs = numimgs
+        self.shape = tuple(shape)
+        self.seed = seed
+        size = numimgs * int(np.prod(self.shape))
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.array = np.ndarray((numimgs, *self.shape), dtype=np.uint8, buffer=self.shm.buf)
+        if self.owner:
+            fill_corpus(self.array, seed)
+            print(f"[{get_ts()}] [SharedCorpus.py] [D] Created shared corpus {self.name}: {numimgs} images of shape {self.shape} ({size / 2**20:.1f} MB, seed {seed})")
+
+    def __getstate__(self):
+        # Processes that are not forked (spawn) attach to the segment by name, without owning it
+        return {"numimgs": self.numimgs, "shape": self.shape, "seed": self.seed, "name": self.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["numimgs"], state["shape"], state["seed"], name=state["name"])
+
+    def close(self):
+        '''
+        Detaches from the segment, removing it if this process created it.
+        '''
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
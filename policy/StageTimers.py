@@ -0,0 +1,72 @@
+import time
+
+'''
+This module implements the per-stage timers of the inference loop of Engine.py.
+The loop calls mark() at the start of every iteration and lap(stage) after every stage: the time since the previous
+call (perf_counter_ns) is added to the stage. The time of the loop bookkeeping between iterations (heartbeats) is
+not attributed to any stage.
+
+Stages:
+- sleep: waiting for the release time of the batch (rate limiter, see Pacer.py)
+- preprocess: resizing and converting the images ("inline" preprocessing only)
+- h2d: copying the batch to the input buffer
+- execute: launching the inference
+- sync: waiting for the completion of the batch (includes the accelerator time not overlapped by the other stages,
+  and the output copy when it is issued with the inference)
+- d2h: reading back the outputs
+
+Times are reported per heartbeat window and for the whole run, as the average time per batch (ms) of every stage.
+'''
+
+STAGES = ("sleep", "preprocess", "h2d", "execute", "sync", "d2h")
+
+class StageTimers:
+    def __init__(self):
+        self.window_ns = dict.fromkeys(STAGES, 0)
+        self.run_ns = dict.fromkeys(STAGES, 0)
+        self.window_batches = 0
+        self.run_batches = 0
+        self.last = time.perf_counter_ns()
+
+    def mark(self):
+        self.last = time.perf_counter_ns()
+
+    def lap(self, stage):
+        now = time.perf_counter_ns()
+        self.window_ns[stage] += now - self.last
+        self.last = now
+
+    def split(self, source, stage, seconds):
+        '''
+        Moves a time measured within a stage (e.g. the preprocessing reported by the backend) to another stage.
+        '''
+        ns = int(seconds * 1e9)
+        self.window_ns[source] -= ns
+        self.window_ns[stage] += ns
+
+    def count(self):
+        '''
+        Counts a completed batch.
+        '''
+        self.window_batches += 1
+
+    def report(self, stages_ns, batches):
+        return {f"{stage}_ms": stages_ns[stage] / batches / 1e6 if batches else 0.0 for stage in STAGES}
+
+    def window(self):
+        '''
+        Returns the average time per batch (ms) of every stage ("<stage>_ms") since the previous call, and starts a new window.
+        '''
+        report = self.report(self.window_ns, self.window_batches)
+        for stage in STAGES:
+            self.run_ns[stage] += self.window_ns[stage]
+            self.window_ns[stage] = 0
+        self.run_batches += self.window_batches
+        self.window_batches = 0
+        return report
+
+    def total(self):
+        '''
+        Returns the average time per batch (ms) of every stage over the whole run (including the current window).
+        '''
+        return self.report({stage: self.run_ns[stage] + self.window_ns[stage] for stage in STAGES}, self.run_batches + self.window_batches)
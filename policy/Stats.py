@@ -1,53 +1,109 @@
 import time
-import subprocess
 import datetime
+import os
 import random
+import numpy as np
+
+from Sampler import Sampler, CpuTimer
+from SampleBuffer import SampleBuffer
+from TraceWriter import TraceWriter, WallClock
+from Discovery import Discovery
+from Residency import ResidencyTracker, parse_time_in_state, parse_trans_stat, sampled_residency, mean_frequency
 
 '''
 This module is responsible for collecting power and frequency stats from the system.
 It reads the final GPU and CPU frequencies, as well as the power consumption of various voltage domains.
 
 Ideal use requires the definition of the Stats object and calling "execute" with appropriate parameters
+
+Sensor nodes are read through Sampler.py, which keeps every sysfs file open and re-reads it with pread.
+Samples are held in a bounded NumPy ring buffer (SampleBuffer.py), from which the per-heartbeat distribution
+of every power line is computed.
+Sensor paths (power lines, GPU devfreq, CPU policies) are resolved through Discovery.py.
+
+Sampling can be adaptive ("burst_interval" in execute): the lines are sampled at the base interval and switch to the
+burst interval for "burst_window" seconds at the start of the run (co-execution begins right after the barrier) and
+whenever a transient is signalled through "signal" (frequency change, heartbeat anomaly). Since samples are then not
+evenly spaced, averages and percentiles are weighted by the time represented by every sample.
+
+The GPU and CPU cluster frequencies are sampled together with the power lines, and the time spent at every frequency
+(residency) is reported for every heartbeat window, from the kernel counters when available (see Residency.py).
 '''
 
 def get_ts():
     return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
 
+def memory_footprint():
+    '''
+    Returns the resident set size, the unique set size (private pages) and the size of the page tables of the current
+    process, in kB. For a forked sampler the RSS includes the pages shared with the parent, while the USS only counts its
+    own pages. A fork copies the page tables of the parent.
+    '''
+    footprint = {"rss_kb": 0, "uss_kb": 0, "pte_kb": 0}
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    footprint["rss_kb"] = int(line.split()[1])
+                elif line.startswith("VmPTE:"):
+                    footprint["pte_kb"] = int(line.split()[1])
+        with open("/proc/self/smaps_rollup", 'r') as f:
+            for line in f:
+                if line.startswith("Private_Clean:") or line.startswith("Private_Dirty:"):
+                    footprint["uss_kb"] += int(line.split()[1])
+    except OSError:
+        pass
+    return footprint
+
 class Stats:
-    def __init__(self):
-
-        self.gpupath = "/sys/devices/gpu.0/devfreq/17000000.ga10b/target_freq"
-        self.cpu0path = "/sys/devices/system/cpu/cpu3/cpufreq/scaling_cur_freq"
-        self.cpu4path = "/sys/devices/system/cpu/cpu7/cpufreq/scaling_cur_freq"
-
-        self.vddpaths = {
-            "VDD_IN": {
-                "curr_path": "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/curr1_input",
-                "volt_path": "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/in1_input"
-            },
-            "VDD_CPU_GPU_CV": {
-                "curr_path": "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/curr2_input",
-                "volt_path": "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/in2_input"
-            },
-            "VDD_SOC": {
-                "curr_path": "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/curr3_input",
-                "volt_path": "/sys/bus/i2c/drivers/ina3221/1-0040/hwmon/hwmon4/in3_input"
-            }
+    def __init__(self, sysfs_root="/sys", capacity=65536):
+
+        discovery = Discovery(sysfs_root)
+        self.gpupath = os.path.join(discovery.gpu(), "target_freq")
+        self.cpu0path = os.path.join(discovery.cpufreq(3), "scaling_cur_freq")
+        self.cpu4path = os.path.join(discovery.cpufreq(7), "scaling_cur_freq")
+
+        self.vddpaths = discovery.rails()   # {line label: {"curr_path", "volt_path"}}
+        self.inputrail = discovery.input_rail()     # Label of the line measuring the total input power (energy reports)
+        # Frequency sampled with every power sample {domain: (path, divisor to kHz)} and kernel residency counters
+        self.freqpaths = {
+            "gpu": (os.path.join(discovery.gpu(), "cur_freq"), 1000),
+            "cpu0": (self.cpu0path, 1),
+            "cpu4": (self.cpu4path, 1),
         }
+        counters = {
+            "gpu": (os.path.join(discovery.gpu(), "trans_stat"), parse_trans_stat),
+            "cpu0": (os.path.join(discovery.cpufreq(3), "stats", "time_in_state"), parse_time_in_state),
+            "cpu4": (os.path.join(discovery.cpufreq(7), "stats", "time_in_state"), parse_time_in_state),
+        }
+
+        self.sampler = Sampler(sysfs_root)
+        self.cputimer = CpuTimer()      # CPU time spent by the sampler itself
+        self.residency = ResidencyTracker(self.sampler, counters)
+        self.runresidency = {domain: {} for domain in self.freqpaths}   # Residency of the whole run estimated from the samples
 
         self.gpufreq = 0
+        self.cpu0freq = 0
+        self.cpu4freq = 0
         self.measurments = 0
-        self.partmeasurments = 0
-        self.vddpart = {                # The partial VDD sum between two different heartbeats
-            "VDD_IN": 0,
-            "VDD_CPU_GPU_CV": 0,
-            "VDD_SOC": 0
-        }
-        self.vddsum = {                 # The total VDD sum since the start of the stats collection 
-            "VDD_IN": 0,
-            "VDD_CPU_GPU_CV": 0,
-            "VDD_SOC": 0
-        }
+        self.vddsum = {label: 0 for label in self.vddpaths}         # The total VDD sum since the start of the stats collection
+        self.energy = {label: 0.0 for label in self.vddpaths}       # Energy (mJ) integrated since the start of the stats collection
+        self.energypart = {label: 0.0 for label in self.vddpaths}   # Energy (mJ) integrated in the current heartbeat window
+        self.span = {label: 0.0 for label in self.vddpaths}         # Time (s) covered by the integrated energy since the start
+        self.spanpart = {label: 0.0 for label in self.vddpaths}     # Time (s) covered by the integrated energy in the current heartbeat window
+        self.lastpower = {label: None for label in self.vddpaths}   # Last valid (timestamp, power) of every line
+        self.last_time = None                                       # Timestamp of the last sample
+        self.info = {}
+        self.telemetry = None           # Optional telemetry channel (see Telemetry.py) on which heartbeats are published live
+        # Last "capacity" samples of every line and frequency, plus the lateness (s) of the sample w.r.t. its deadline
+        self.freqcolumns = [f"{domain}_freq_khz" for domain in self.freqpaths]
+        self.samples = SampleBuffer(list(self.vddpaths.keys()) + self.freqcolumns + ["lateness"], capacity=capacity)
+        self.window_index = 0           # Index in self.samples of the first sample of the current heartbeat window
+        self.missed = 0                 # Deadlines skipped in the current heartbeat window because of overruns
+        self.window_start = None        # Monotonic start time of the current heartbeat window
+        self.burst = None               # Optional Event set by other processes/threads to signal a transient (see signal)
+        self.bursts = 0                 # Bursts started in the current heartbeat window
+        self.burst_samples = 0          # Samples taken at the burst interval in the current heartbeat window
         self.heartbeats = []
         self.MOCK = False
 
@@ -60,85 +116,232 @@ class Stats:
         '''
         if self.MOCK:
             return random.randint(0, 1000)
-        try:
-            result = subprocess.run(['sudo', 'cat', path], capture_output=True, text=True)
-            return int(result.stdout.strip())
-        except Exception as e:
-            print(f"[{get_ts()}] [Stats.py] [E] An error occured: {e}")
+        return self.sampler.read(path)
+
+    def reset(self):
+        '''
+        Resets the per-run accumulators, so that a Stats object reused for several runs (e.g. in thread mode by the
+        closed-loop controller, see Controller.py) reports the energy, samples and heartbeats of every run separately.
+        '''
+        self.measurments = 0
+        self.vddsum = {label: 0 for label in self.vddpaths}
+        self.energy = {label: 0.0 for label in self.vddpaths}
+        self.energypart = {label: 0.0 for label in self.vddpaths}
+        self.span = {label: 0.0 for label in self.vddpaths}
+        self.spanpart = {label: 0.0 for label in self.vddpaths}
+        self.lastpower = {label: None for label in self.vddpaths}
+        self.last_time = None
+        self.runresidency = {domain: {} for domain in self.freqpaths}
+        self.samples = SampleBuffer(self.samples.columns, capacity=self.samples.capacity)
+        self.window_index = 0
+        self.missed = 0
+        self.bursts = 0
+        self.burst_samples = 0
+        self.heartbeats = []
+        self.info = {}
+
+    def signal(self):
+        '''
+        Signals a transient (e.g. a frequency change): if adaptive sampling is enabled, the sampler switches to the burst interval.
+        Can be called from any process or thread holding this object, as long as self.burst was set before starting the sampler.
+        '''
+        if self.burst is not None:
+            self.burst.set()
 
     def get_heartbeats(self):
         '''
         Returns the heartbeats collected so far, including the average VDD values and frequencies.
         
         heartbeats: A list of dictionaries containing the average VDD values at every heartbeat for every line
+                    and the CPU time spent by the sampler in the heartbeat window ("sampler_cpu_ms").
+                    The distribution of every line in the heartbeat window is reported as "<line>_min", "<line>_mean",
+                    "<line>_p50", "<line>_p95" and "<line>_max". Averages and percentiles are time-weighted.
+                    Sampling quality of the window is reported as achieved rate ("rate_hz"), lateness percentiles
+                    of the samples w.r.t. their deadline ("jitter_p50_ms", "jitter_p95_ms", "jitter_p99_ms", "jitter_max_ms")
+                    and number of skipped deadlines ("missed"). Adaptive sampling is reported as the number of bursts
+                    started in the window ("bursts") and of samples taken at the burst interval ("burst_samples").
+                    Frequency residency of every domain (gpu, cpu0, cpu4) is reported as "<domain>_residency"
+                    ({frequency kHz: time s}), "<domain>_residency_source" ("kernel" counters or "samples") and
+                    "<domain>_freq_mean_khz" (time-weighted mean frequency).
+                    Energy is reported as the energy of the window ("<line>_energy_mJ") and the energy since the start
+                    ("<line>_energy_total_mJ") at the time of the last sample of the window ("t", monotonic clock)
         gpufreq: The final GPU frequency
         cpu0freq: The final CPU0 frequency
         cpu4freq: The final CPU4 frequency
+        info: Dictionary with the run "start" and "end" times (monotonic clock), the total energy of every line ("energy_mJ")
+              the "footprint" of the sampler: CPU time of the sampling ("cpu_s") and of the sampling thread before it ("start_cpu_s", e.g. the start of a
+              spawned process), RSS and USS of its process ("rss_kb", "uss_kb")
+              and the frequency residency of the run ("residency" {domain: {frequency kHz: time s}}, "residency_source" {domain: source})
         '''
-        return ("stats", self.heartbeats, self.gpufreq, self.cpu0freq, self.cpu4freq)
+        return ("stats", self.heartbeats, self.gpufreq, self.cpu0freq, self.cpu4freq, self.info)
 
-    def execute(self, heartbeat, interval, duration=None, csvpath=None):
+    def integrate(self, label, timestamp, power):
+        '''
+        Integrates the power of a line with the trapezoidal rule between its last valid sample and the current one.
+        Power is in mW and timestamps in s, so energy is in mJ.
+        '''
+        last = self.lastpower[label]
+        if last is not None:
+            energy = (last[1] + power) / 2.0 * (timestamp - last[0])
+            self.energy[label] += energy
+            self.energypart[label] += energy
+            self.span[label] += timestamp - last[0]
+            self.spanpart[label] += timestamp - last[0]
+        self.lastpower[label] = (timestamp, power)
+
+    def execute(self, heartbeat, interval, duration=None, csvpath=None, traceformat="csv", burst_interval=None, burst_window=2.0):
         '''
         Executes the stats collection process.
+        Samples are scheduled against absolute monotonic deadlines (start + k * interval), so that the time spent
+        reading the sensors and writing the CSV does not stretch the sampling period.
+        If a sample overruns one or more deadlines, they are skipped (and counted) instead of being caught up in a burst.
 
         heartbeat: The interval in seconds at which to print the stats.
         interval: The interval in milliseconds at which to read the sensor data.
         duration: The total duration in seconds for which to run the stats collection. If None, runs indefinitely.
-        csvpath: If provided, the path to a CSV file where the VDD stats will be logged continuously in time
+        csvpath: If provided, the path to a file where the VDD stats will be logged continuously in time
+        traceformat: Format of the file at csvpath, "csv" or "bin" (fixed-width records, see TraceWriter.py)
+        burst_interval: If provided, the interval in milliseconds at which to read the sensor data during a burst
+                        (at the start of the run and after every signal), enabling adaptive sampling.
+        burst_window: The duration in seconds of a burst.
         '''
+        self.reset()
+        trace = None
         if csvpath is not None:
-            # create a csv with timestamp, vdd_in, vdd_cpu_gpu_cv, vdd_soc
-            with open(csvpath, 'w') as f:
-                f.write("timestamp,VDD_IN,VDD_CPU_GPU_CV,VDD_SOC\n")
+            # create a trace with timestamp, vdd_in, vdd_cpu_gpu_cv, vdd_soc and the sampled frequencies (kHz)
+            trace = TraceWriter(csvpath, list(self.vddpaths.keys()) + self.freqcolumns, fmt=traceformat)
+            wallclock = WallClock()
         
-        start_time = time.time()
+        start_cpu = time.thread_time()  # CPU time of this thread before sampling (start of a spawned process)
+        period = interval / 1000.0
+        burst_period = burst_interval / 1000.0 if burst_interval else period
+        start_time = time.monotonic()
         hb_time = start_time
+        deadline = start_time
+        self.window_start = start_time
+        # The run starts with a burst (co-execution of the engines begins after the barrier)
+        burst_until = start_time + burst_window if burst_interval else start_time
+        if burst_interval:
+            self.bursts += 1
+        self.residency.start()
         if duration is None:
             duration = float('inf')
 
-        while time.time() - start_time < duration:
-            current_time = time.time()  
+        while time.monotonic() - start_time < duration:
+            current_time = time.monotonic()
 
             # Heartbeat handling
             if (current_time - hb_time) >= heartbeat:
                 print(f"[{get_ts()}] [Stats.py] [I] \tHeartbeat from Stats.py")
                 self.print_stats()
-                hb_time = current_time
+                hb_time += heartbeat
 
             # Read the sensor data for each VDD path (curr and volt) and calculate power (/1000 = power in mW)            
-            vdds = {"VDD_IN": 0, "VDD_CPU_GPU_CV": 0, "VDD_SOC": 0}
-            for label, paths in self.vddpaths.items():
+            self.cputimer.start()
+            vdds = {label: 0 for label in self.vddpaths}
+            sample = [np.nan] * (len(self.vddpaths) + len(self.freqpaths)) + [current_time - deadline]
+            for i, (label, paths) in enumerate(self.vddpaths.items()):
                 curr_value = self.read_sensor_data(paths["curr_path"])
                 volt_value = self.read_sensor_data(paths["volt_path"])
                 if isinstance(curr_value, int) and isinstance(volt_value, int):
                     power = curr_value * (volt_value / 1000.0)
                     vdds[label] = power
+                    sample[i] = power
                     self.vddsum[label] += power
-                    self.vddpart[label] += power
+                    self.integrate(label, current_time, power)
                 else:
                     print(f"[{get_ts()}] [Stats.py] [E] Error reading sensor data for paths ({paths['curr_path']}, {paths['volt_path']})")
 
-            # If a CSV path is provided, append the current timestamp and VDD values
-            if csvpath is not None:
-                with open(csvpath, 'a') as f:
-                    f.write(f"{get_ts()},{vdds['VDD_IN']},{vdds['VDD_CPU_GPU_CV']},{vdds['VDD_SOC']}\n")
+            # Frequency of every clock domain (kHz)
+            freqs = []
+            for path, divisor in self.freqpaths.values():
+                value = self.read_sensor_data(path)
+                freqs.append(value / divisor if isinstance(value, int) else np.nan)
+            sample[len(self.vddpaths):-1] = freqs
+
+            # If a trace is being logged, append the current timestamp, VDD values and frequencies (written in batches)
+            if trace is not None:
+                trace.write(wallclock.to_ns(current_time), list(vdds.values()) + freqs)
             
+            self.samples.append(current_time, sample)
+            self.last_time = current_time
             self.measurments += 1
-            self.partmeasurments += 1
-            time.sleep(interval / 1000.0)
+            bursting = current_time < burst_until
+            self.burst_samples += bursting
+            self.cputimer.stop()
+
+            # Next deadline, skipping the ones already missed
+            current_period = burst_period if bursting else period
+            deadline += current_period
+            current_time = time.monotonic()
+            if current_time > deadline:
+                skipped = int((current_time - deadline) / current_period) + 1
+                self.missed += skipped
+                deadline += skipped * current_period
+            if burst_interval and self.burst is not None:
+                # Wait for the deadline, or for a transient to be signalled (then sample immediately)
+                if self.burst.wait(max(0, deadline - time.monotonic())):
+                    self.burst.clear()
+                    current_time = time.monotonic()
+                    if current_time >= burst_until:
+                        self.bursts += 1
+                    burst_until = current_time + burst_window
+                    deadline = current_time
+            else:
+                time.sleep(max(0, deadline - time.monotonic()))
+        # Residency of the last (partial) window, to complete the one of the run
+        self.window_residency(self.window_index)
+        kernel = self.residency.total()
+        residency = {domain: kernel.get(domain) or self.runresidency[domain] for domain in self.freqpaths}
+        source = {domain: ("kernel" if kernel.get(domain) else "samples") for domain in self.freqpaths}
+        self.sampler.close()
+        if trace is not None:
+            trace.close()
+        footprint = memory_footprint()
+        footprint["cpu_s"] = time.thread_time() - start_cpu
+        footprint["start_cpu_s"] = start_cpu
+        self.info = {"start": start_time, "end": self.last_time, "energy_mJ": dict(self.energy), "footprint": footprint,
+                     "residency": residency, "residency_source": source}
+        if self.telemetry is not None:
+            self.telemetry.publish({"kind": "end", "info": self.info, "freqs": (self.gpufreq, self.cpu0freq, self.cpu4freq)})
         print(f"[{get_ts()}] [Stats.py] [D] Finished running Stats (Duration expired)")
 
+    def window_residency(self, start):
+        '''
+        Returns {domain: (residency, source)} for the heartbeat window starting at sample index start.
+        Domains with kernel counters use their difference since the previous window, the others (and the counters
+        that did not advance) the sampled frequencies, which are also accumulated in the residency of the run.
+        '''
+        kernel = self.residency.window()
+        t, values = self.samples.window(start)
+        residencies = {}
+        for i, domain in enumerate(self.freqpaths):
+            residency = sampled_residency(t, values[:, len(self.vddpaths) + i])
+            for freq, time_s in residency.items():
+                self.runresidency[domain][freq] = self.runresidency[domain].get(freq, 0.0) + time_s
+            residencies[domain] = (kernel[domain], "kernel") if kernel.get(domain) else (residency, "samples")
+        return residencies
+
+    def average_power(self, label):
+        '''
+        Returns the time-weighted average power (mW) of a line since the start (integrated energy over the time it covers).
+        '''
+        if self.span[label] > 0:
+            return self.energy[label] / self.span[label]
+        return self.vddsum[label] / self.measurments if self.measurments else 0.0
+
     def print_stats(self):
         '''
         Pretty prints the average power and frequency stats collected so far.
-        Resets the partial power measurements after printing.
+        The partial power statistics are computed on the samples of the current heartbeat window, which is then closed.
         '''
-        print(f"[{get_ts()}] [Stats.py] [I] \t\t{'Line':<20}{'Average Power':<20}{'Average Partial Power':<20}")
+        window = self.samples.summary(self.window_index, weighted=True)
+        vddavg = {label: self.average_power(label) for label in self.vddsum.keys()}   # Average overall VDD
+        print(f"[{get_ts()}] [Stats.py] [I] \t\t{'Line':<20}{'Average Power':<20}{'Average Partial Power':<24}{'Min':<12}{'P50':<12}{'P95':<12}{'Max':<12}")
         for label in self.vddsum.keys():
-            avg_power = self.vddsum[label] / self.measurments
-            avg_partial_power = self.vddpart[label] / self.partmeasurments
-            print(f"[{get_ts()}] [Stats.py] [I] \t\t{label:<20}{avg_power:<20.2f}{avg_partial_power:<20.2f}")
-            self.vddpart[label] = 0
+            avg_power = vddavg[label]
+            part = window[label]
+            print(f"[{get_ts()}] [Stats.py] [I] \t\t{label:<20}{avg_power:<20.2f}{part['mean']:<24.2f}{part['min']:<12.2f}{part['p50']:<12.2f}{part['p95']:<12.2f}{part['max']:<12.2f}")
 
         # Only considers the GPU and CPU frequencies captured at every heartbeat
         self.gpufreq = self.read_sensor_data(self.gpupath)
@@ -147,6 +350,47 @@ class Stats:
         print(f"[{get_ts()}] [Stats.py] [I] \t\tGPU Frequency: \t{self.gpufreq} MHz")
         print(f"[{get_ts()}] [Stats.py] [I] \t\tCPU0 Frequency: \t{self.cpu0freq} MHz")
         print(f"[{get_ts()}] [Stats.py] [I] \t\tCPU4 Frequency: \t{self.cpu4freq} MHz")
-        self.partmeasurments = 0
-        vddavg = {label: (self.vddsum[label] / self.measurments) for label in self.vddsum.keys()}   # Only appends average overall VDD to returnable heartbeats
-        self.heartbeats.append(vddavg)
\ No newline at end of file
+        sampler_cpu_ms = self.cputimer.pop_part() * 1000.0
+        print(f"[{get_ts()}] [Stats.py] [I] \t\tSampler CPU time: \t{sampler_cpu_ms:.2f} ms")
+
+        # Sampling rate and lateness of the samples w.r.t. their deadline in the current window
+        now = time.monotonic()
+        _, values = self.samples.window(self.window_index)
+        lateness = values[:, -1].astype(np.float64) * 1000.0
+        rate = (self.samples.count - self.window_index) / (now - self.window_start) if now > self.window_start else 0
+        jitter = dict(zip(("jitter_p50_ms", "jitter_p95_ms", "jitter_p99_ms"), np.percentile(lateness, [50, 95, 99]) if len(lateness) else (0, 0, 0)))
+        jitter["jitter_max_ms"] = lateness.max() if len(lateness) else 0
+        print(f"[{get_ts()}] [Stats.py] [I] \t\tSampling rate: \t{rate:.2f} Hz (missed {self.missed} deadlines, {self.bursts} bursts, {self.burst_samples} burst samples)")
+        print(f"[{get_ts()}] [Stats.py] [I] \t\tSampling jitter: \tp50 {jitter['jitter_p50_ms']:.3f} ms, p95 {jitter['jitter_p95_ms']:.3f} ms, p99 {jitter['jitter_p99_ms']:.3f} ms, max {jitter['jitter_max_ms']:.3f} ms")
+
+        for label in self.vddsum.keys():
+            vddavg.update({f"{label}_{stat}": float(value) for stat, value in window[label].items()})    # Window distribution
+        for label in self.vddsum.keys():
+            print(f"[{get_ts()}] [Stats.py] [I] \t\t{label} energy: \t{self.energypart[label] / 1000.0:.3f} J (total {self.energy[label] / 1000.0:.3f} J)")
+        for domain, (residency, source) in self.window_residency(self.window_index).items():
+            total = sum(residency.values())
+            states = ", ".join(f"{freq / 1000:.0f} MHz {time_s / total * 100:.1f}%" for freq, time_s in sorted(residency.items()) if total > 0)
+            print(f"[{get_ts()}] [Stats.py] [I] \t\t{domain} residency ({source}): \t{states}")
+            vddavg[f"{domain}_residency"] = residency
+            vddavg[f"{domain}_residency_source"] = source
+            vddavg[f"{domain}_freq_mean_khz"] = mean_frequency(residency)
+        vddavg["t"] = self.last_time
+        for label in self.vddsum.keys():
+            vddavg[f"{label}_energy_mJ"] = self.energypart[label]
+            vddavg[f"{label}_energy_total_mJ"] = self.energy[label]
+            self.energypart[label] = 0.0
+            self.spanpart[label] = 0.0
+        vddavg["sampler_cpu_ms"] = sampler_cpu_ms
+        vddavg["rate_hz"] = rate
+        vddavg["missed"] = self.missed
+        vddavg["bursts"] = self.bursts
+        vddavg["burst_samples"] = self.burst_samples
+        vddavg.update({key: float(value) for key, value in jitter.items()})
+        self.heartbeats.append(vddavg)
+        if self.telemetry is not None:
+            self.telemetry.publish({"kind": "heartbeat", "heartbeat": vddavg, "freqs": (self.gpufreq, self.cpu0freq, self.cpu4freq)})
+        self.window_index = self.samples.count
+        self.missed = 0
+        self.bursts = 0
+        self.burst_samples = 0
+        self.window_start = now
\ No newline at end of file
@@ -0,0 +1,41 @@
+import datetime
+import traceback
+
+from Scheduling import apply_scheduling
+
+'''
+This module holds the entry point of the Stats worker used by Config.py.
+It only depends on Stats.py (and Scheduling.py), so that the worker can be started as a spawned process (or as a thread of Config.py)
+without importing torch and TensorRT.
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+def stats_worker(stats, duration, barrier, channel, csvpath, traceformat, interval=500, burst_interval=None, burst_window=2.0, heartbeat=10, scheduling=None):
+    '''
+    Waits at the start barrier and executes the stats collection, publishing the heartbeats on the telemetry channel.
+
+    stats: Stats object.
+    duration: The total duration in seconds of the stats collection.
+    barrier: Barrier shared with the engines.
+    channel: Telemetry channel (see Telemetry.py) on which the heartbeats are published.
+    csvpath: If provided, the path to the file where the VDD stats will be logged continuously in time.
+    traceformat: Format of the file at csvpath, "csv" or "bin".
+    interval: The interval in milliseconds at which to read the sensor data.
+    burst_interval: If provided, the interval in milliseconds at which to read the sensor data during bursts (adaptive sampling).
+    burst_window: The duration in seconds of a burst.
+    heartbeat: The interval in seconds of the heartbeats.
+    scheduling: If provided, the CPU affinity and priority of the sampler (see Scheduling.py).
+    '''
+    try:
+        if scheduling:
+            apply_scheduling(scheduling, name="Stats sampler")
+        stats.telemetry = channel
+        print(f"[{get_ts()}] [StatsWorker.py] [D] Stats worker waiting at the barrier...")
+        barrier.wait()  # Wait for all processes to be ready
+        stats.execute(heartbeat=heartbeat, interval=interval, duration=duration, csvpath=csvpath, traceformat=traceformat,
+                      burst_interval=burst_interval, burst_window=burst_window)
+    except Exception as e:
+        print(f"[{get_ts()}] [StatsWorker.py] [E] Stats execution error: {e}")
+        traceback.print_exc()
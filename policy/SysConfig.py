@@ -1,12 +1,17 @@
 # this code is very ugly
+import os
 import datetime
 import json
 
+from Discovery import Discovery
+
 def get_ts():
     return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
 
 class SysConfig:
-    def __init__(self):
+    def __init__(self, sysfs_root="/sys"):
+        # CPU policies and GPU devfreq paths are resolved through Discovery.py
+        self.discovery = Discovery(sysfs_root)
         self.CpuFreqArray = ["115200", "192000", "268800", "345600", "422400", "499200", "576000", "652800", "729600", "806400", "883200", "960000", "1036800", "1113600", "1190400", "1267200", "1344000", "1420800", "1497600", "1574400", "1651200", "1728000", "1804800", "1881600", "1958400", "1984000"]
         self.GpuFreqArray = ["306000000", "408000000", "510000000", "612000000", "714000000", "816000000", "918000000"]
 
@@ -14,15 +19,18 @@ class SysConfig:
         self.CpuFreqMax = "1984000"
         
         self.CpuNum = 0
-        self.CpuGovernorPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_governor"
-        self.CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_setspeed"
-        self.CpuMinFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_min_freq"
-        self.CpuMaxFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_max_freq"
+        self.CpuGovernorPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_governor")
+        self.CpuFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_setspeed")
+        self.CpuMinFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_min_freq")
+        self.CpuMaxFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_max_freq")
+
+        self.GpuGovernorPath = os.path.join(self.discovery.gpu(), "governor")
+        self.GpuFrequencyPath = os.path.join(self.discovery.gpu(), "target_freq")
+        self.GpuMinFrequencyPath = os.path.join(self.discovery.gpu(), "min_freq")
+        self.GpuMaxFrequencyPath = os.path.join(self.discovery.gpu(), "max_freq")
 
-        self.GpuGovernorPath = f"/sys/devices/gpu.0/devfreq/17000000.ga10b/governor"
-        self.GpuFrequencyPath = f"/sys/devices/gpu.0/devfreq/17000000.ga10b/target_freq"
-        self.GpuMinFrequencyPath = f"/sys/devices/gpu.0/devfreq/17000000.ga10b/min_freq"
-        self.GpuMaxFrequencyPath = f"/sys/devices/gpu.0/devfreq/17000000.ga10b/max_freq"
+        # Optional callback invoked after the frequencies are changed (e.g. Config.signal_transient, to sample the transient)
+        self.on_change = None
 
     def read_sysconfig(self, configpath:str):
         print(f"[{get_ts()}] [SysConfig.py] [D] Reading config from {configpath}")
@@ -38,14 +46,14 @@ class SysConfig:
     def init_sysconfig(self, MAXN=False):
         self.CpuNum = 0
         print(f"[{get_ts()}] [SysConfig.py] [D] Setting min max CPU frequencies: {self.CpuFreqMin} -> {self.CpuFreqMax}")
-        self.CpuMinFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_min_freq"
-        self.CpuMaxFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_max_freq"
+        self.CpuMinFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_min_freq")
+        self.CpuMaxFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_max_freq")
         self.__SetCPUFreqMin(self.CpuNum, self.CpuFreqMin, self.CpuMinFrequencyPath)
         self.__SetCPUFreqMax(self.CpuNum, self.CpuFreqMax, self.CpuMaxFrequencyPath)
         if MAXN:
             self.CpuNum = 4
-            self.CpuMinFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_min_freq"
-            self.CpuMaxFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_max_freq"
+            self.CpuMinFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_min_freq")
+            self.CpuMaxFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_max_freq")
             self.__SetCPUFreqMin(self.CpuNum, self.CpuFreqMin, self.CpuMinFrequencyPath)
             self.__SetCPUFreqMax(self.CpuNum, self.CpuFreqMax, self.CpuMaxFrequencyPath)
             self.CpuNum = 0
@@ -53,18 +61,28 @@ class SysConfig:
     def restore_sysconfig(self, MAXN=False):
         self.CpuNum = 0
         print(f"[{get_ts()}] [SysConfig.py] [D] Restoring CPU/GPU frequencies")
-        self.CpuGovernorPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_governor"
-        self.CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_setspeed"
+        self.CpuGovernorPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_governor")
+        self.CpuFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_setspeed")
         self.__SetCPUFreq(self.CpuNum, "729600", self.CpuGovernorPath, self.CpuFrequencyPath)
         if MAXN:
             self.CpuNum = 4
-            self.CpuGovernorPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_governor"
-            self.CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_setspeed"
+            self.CpuGovernorPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_governor")
+            self.CpuFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_setspeed")
             self.__SetCPUFreq(self.CpuNum, "729600", self.CpuGovernorPath, self.CpuFrequencyPath)
             self.CpuNum = 0
         self.__SetGPUFreqMin("408000000", self.GpuMinFrequencyPath)
         self.__SetGPUFreqMax("408000000", self.GpuMaxFrequencyPath)
 
+    def controlled_cpus(self, MAXN=False):
+        '''
+        Returns the CPUs of the clusters whose frequency is set by set_frequencies (the cluster of CPU 0, and the one of CPU 4 with MAXN).
+        Used by Config.py as the default affinity of the engines.
+        '''
+        cpus = self.discovery.cluster(0)
+        if MAXN:
+            cpus += self.discovery.cluster(4)
+        return sorted(set(cpus))
+
     def set_frequencies(self, CpuFreq, GpuFreq, MAXN=False):
         if CpuFreq is None and GpuFreq is None:
             print(f"[{get_ts()}] [SysConfig.py] [E] Bad use of set_frequency. No frequencies to set")
@@ -80,13 +98,13 @@ class SysConfig:
 
         if CpuFreq is not None:
             print(f"[{get_ts()}] [SysConfig.py] [D] Setting CPU frequency: {CpuFreq}")
-            self.CpuGovernorPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_governor"
-            self.CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_setspeed"
+            self.CpuGovernorPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_governor")
+            self.CpuFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_setspeed")
             self.__SetCPUFreq(self.CpuNum, CpuFreq, self.CpuGovernorPath, self.CpuFrequencyPath)
             if MAXN:
                 self.CpuNum = 4
-                self.CpuGovernorPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_governor"
-                self.CpuFrequencyPath = f"/sys/devices/system/cpu/cpu{self.CpuNum}/cpufreq/scaling_setspeed"
+                self.CpuGovernorPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_governor")
+                self.CpuFrequencyPath = os.path.join(self.discovery.cpufreq(self.CpuNum), "scaling_setspeed")
                 self.__SetCPUFreq(self.CpuNum, CpuFreq, self.CpuGovernorPath, self.CpuFrequencyPath)
                 self.CpuNum = 0
 
@@ -94,7 +112,9 @@ class SysConfig:
             print(f"[{get_ts()}] [SysConfig.py] [D] Setting GPU frequency: {GpuFreq}")
             self.__SetGPUFreqMin(GpuFreq, self.GpuMinFrequencyPath)
             self.__SetGPUFreqMax(GpuFreq, self.GpuMaxFrequencyPath)
-        
+
+        if self.on_change is not None:
+            self.on_change()
 
 
     def __SetCPUFreqMin(self, CpuNum:str, freq:int, MinFrequencyPath:str):
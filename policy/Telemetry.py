@@ -0,0 +1,151 @@
+import zlib
+import struct
+import pickle
+import datetime
+from multiprocessing import shared_memory
+
+'''
+This module implements the live telemetry channel between the Engine/Stats workers and the Config parent process.
+It replaces the multiprocessing.Manager list: there is no server process and no proxy round-trip, and the parent can
+read the heartbeats while the run is in progress.
+
+The telemetry is a single multiprocessing.shared_memory segment holding one ring of fixed size slots per channel.
+Every channel has exactly one writer (a worker process), so publishing is lock-free:
+- the writer marks the slot as being written (odd sequence number), copies the pickled record and its CRC, marks the
+  slot as complete (even sequence number) and finally increments the channel write counter
+- the reader copies the slot and accepts it only if the sequence number is the expected one before and after the copy
+  and the CRC matches the copied record
+A reader that falls behind by more than the ring length loses the overwritten records (they are counted).
+
+Python issues plain stores to the shared memory, without memory barriers: on a weakly ordered CPU (aarch64, i.e. the
+Jetson) another process may see the write counter or the sequence number before the record itself. The reader does
+not rely on the order of the stores: a slot whose sequence number is still the previous one, or whose record does not
+match its CRC, is not complete yet and is read again at the next poll (it is not counted as lost). Once the writer
+has exited (joined), all its stores are visible, so the last poll after the workers end receives every record,
+including the "end" records.
+
+Records larger than slot_size can not be published: publish raises ValueError, so that the worker fails with the
+actual cause instead of its run being reported as incomplete.
+
+Layout of every channel:
+    8 bytes                         write counter (uint64)
+    slots * (24 + slot_size) bytes  slots: sequence number (uint64), record length (uint64), CRC32 of the record
+                                    (uint64), pickled record
+'''
+
+def get_ts():
+    return datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+
+class Telemetry:
+    def __init__(self, channels, slots=64, slot_size=8192, name=None):
+        '''
+        Creates the shared memory segment (or attaches to an existing one if name is given).
+
+        channels: Number of channels (one per writer).
+        slots: Number of records held by each channel ring.
+        slot_size: Maximum size in bytes of a pickled record.
+        name: Name of an existing segment to attach to.
+        '''
+        self.channels = channels
+        self.slots = slots
+        self.slot_size = slot_size
+        self.slot_stride = 24 + slot_size
+        self.channel_stride = 8 + slots * self.slot_stride
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=channels * self.channel_stride)
+            self.shm.buf[:channels * self.channel_stride] = bytes(channels * self.channel_stride)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.read_index = [0] * channels    # Next record to be read on every channel (reader side)
+        self.lost = [0] * channels          # Records overwritten before being read (reader side)
+
+    def __getstate__(self):
+        # Processes that are not forked (spawn) attach to the segment by name, without owning it
+        return {"channels": self.channels, "slots": self.slots, "slot_size": self.slot_size, "name": self.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["channels"], state["slots"], state["slot_size"], name=state["name"])
+
+    def channel(self, index):
+        '''
+        Returns the writer handle of a channel, to be passed to a worker.
+        '''
+        return TelemetryChannel(self, index)
+
+    def publish(self, channel, record):
+        '''
+        Publishes a record on a channel. Must be called by the single writer of the channel.
+        Raises ValueError if the pickled record exceeds the slot size.
+
+        channel: Channel index.
+        record: Picklable object.
+        '''
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.slot_size:
+            kind = record.get("kind") if isinstance(record, dict) else type(record).__name__
+            raise ValueError(f"Telemetry record \"{kind}\" of {len(payload)} bytes exceeds the slot size ({self.slot_size} bytes)")
+        buf = self.shm.buf
+        base = channel * self.channel_stride
+        count = struct.unpack_from("<Q", buf, base)[0]
+        slot = base + 8 + (count % self.slots) * self.slot_stride
+        struct.pack_into("<Q", buf, slot, 2 * count + 1)
+        struct.pack_into("<QQ", buf, slot + 8, len(payload), zlib.crc32(payload))
+        buf[slot + 24:slot + 24 + len(payload)] = payload
+        struct.pack_into("<Q", buf, slot, 2 * count + 2)
+        struct.pack_into("<Q", buf, base, count + 1)
+
+    def poll(self, channel):
+        '''
+        Returns the list of records published on a channel since the last poll (in order, up to the first record
+        not complete yet, see above).
+
+        channel: Channel index.
+        '''
+        buf = self.shm.buf
+        base = channel * self.channel_stride
+        count = struct.unpack_from("<Q", buf, base)[0]
+        index = self.read_index[channel]
+        if count - index > self.slots:
+            self.lost[channel] += count - index - self.slots
+            index = count - self.slots
+        records = []
+        while index < count:
+            slot = base + 8 + (index % self.slots) * self.slot_stride
+            seq = struct.unpack_from("<Q", buf, slot)[0]
+            if seq < 2 * index + 2:
+                break   # The record is not visible yet: read again at the next poll
+            length, crc = struct.unpack_from("<QQ", buf, slot + 8)
+            payload = bytes(buf[slot + 24:slot + 24 + min(length, self.slot_size)])
+            if seq != 2 * index + 2 or struct.unpack_from("<Q", buf, slot)[0] != seq:
+                # The slot has been overwritten (or is being overwritten) by a newer record
+                self.lost[channel] += 1
+            elif zlib.crc32(payload) != crc:
+                break   # The sequence number is visible before the record: read again at the next poll
+            else:
+                records.append(pickle.loads(payload))
+            index += 1
+        self.read_index[channel] = index
+        return records
+
+    def close(self):
+        '''
+        Detaches from the segment, removing it if this process created it.
+        '''
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class TelemetryChannel:
+    '''
+    Writer handle of a single telemetry channel, as used by Engine and Stats ("publish").
+    '''
+    def __init__(self, telemetry, index):
+        self.telemetry = telemetry
+        self.index = index
+
+    def publish(self, record):
+        self.telemetry.publish(self.index, record)
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import datetime
+import numpy as np
+
+'''
+This module implements the writer of the power traces logged by Stats.py.
+The output file is opened once and rows are written in batches, instead of reopening the file for every sample.
+
+Two formats are supported:
+- "csv": text file with a "timestamp" column (dd/mm/YYYY-HH:MM:SS) followed by one column per power line
+- "bin": columnar binary file made of a small header followed by fixed-width records
+         (int64 wall clock timestamp in ns + one float32 per power line), loadable zero-copy with read_trace()
+
+Binary layout:
+    8 bytes     magic (TRACE_MAGIC)
+    4 bytes     little endian uint32, length of the JSON header
+    N bytes     JSON header {"columns": [...]} padded with spaces so that records start at an 8 bytes boundary
+    records     little endian, TRACE_TIMESTAMP + columns as float32
+'''
+
+TRACE_MAGIC = b"RTRMTRC1"
+TRACE_TIMESTAMP = "timestamp_ns"
+
+def trace_dtype(columns):
+    '''
+    Returns the NumPy record dtype of a binary trace with the given columns.
+    '''
+    return np.dtype([(TRACE_TIMESTAMP, "<i8")] + [(column, "<f4") for column in columns])
+
+class TraceWriter:
+    def __init__(self, path, columns, fmt="csv", batch=256):
+        '''
+        path: Path of the output file (overwritten).
+        columns: Names of the logged columns (e.g. the power lines).
+        fmt: Output format, "csv" or "bin".
+        batch: Number of rows buffered before being written to the file.
+        '''
+        if fmt not in ("csv", "bin"):
+            raise ValueError(f"Unknown trace format {fmt}")
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt
+        self.batch = batch
+        self.rows = 0
+        self._ts_second = None          # Last formatted second (CSV timestamps only change once per second)
+        self._ts_string = None
+
+        if fmt == "csv":
+            self.file = open(path, 'w')
+            self.file.write(",".join(["timestamp"] + self.columns) + "\n")
+            self.pending = []
+        else:
+            self.file = open(path, 'wb')
+            header = json.dumps({"columns": self.columns}).encode()
+            header += b" " * (-(len(TRACE_MAGIC) + 4 + len(header)) % 8)
+            self.file.write(TRACE_MAGIC + np.uint32(len(header)).astype("<u4").tobytes() + header)
+            self.pending = np.zeros(batch, dtype=trace_dtype(self.columns))
+            self.npending = 0
+
+    def write(self, timestamp_ns, values):
+        '''
+        Buffers a row, writing the batch to the file when full.
+
+        timestamp_ns: Wall clock timestamp of the row, in ns since the epoch.
+        values: Sequence of values, one per column.
+        '''
+        if self.fmt == "csv":
+            second = timestamp_ns // 1000000000
+            if second != self._ts_second:
+                self._ts_second = second
+                self._ts_string = datetime.datetime.fromtimestamp(second).strftime('%d/%m/%Y-%H:%M:%S')
+            self.pending.append(f"{self._ts_string},{','.join(str(value) for value in values)}\n")
+            full = len(self.pending) >= self.batch
+        else:
+            self.pending[self.npending] = (timestamp_ns, *values)
+            self.npending += 1
+            full = self.npending >= self.batch
+        self.rows += 1
+        if full:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the buffered rows to the file.
+        '''
+        if self.fmt == "csv":
+            self.file.writelines(self.pending)
+            self.pending = []
+        else:
+            self.file.write(self.pending[:self.npending].tobytes())
+            self.npending = 0
+        self.file.flush()
+
+    def close(self):
+        '''
+        Writes the buffered rows and closes the file.
+        '''
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+class WallClock:
+    '''
+    Converts monotonic timestamps (s) to wall clock timestamps (ns since the epoch), using an offset taken once.
+    '''
+    def __init__(self):
+        self.offset_ns = time.time_ns() - time.monotonic_ns()
+
+    def to_ns(self, monotonic):
+        return int(monotonic * 1e9) + self.offset_ns
+
+
+def read_trace(path):
+    '''
+    Loads a binary trace written by TraceWriter as a read-only NumPy record array mapped on the file (no copy).
+    Columns are accessed by name, e.g. trace["timestamp_ns"], trace["VDD_IN"].
+
+    path: Path of the binary trace.
+    '''
+    with open(path, 'rb') as f:
+        magic = f.read(len(TRACE_MAGIC))
+        if magic != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a binary power trace")
+        length = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+        header = json.loads(f.read(length))
+    dtype = trace_dtype(header["columns"])
+    offset = len(TRACE_MAGIC) + 4 + length
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
@@ -0,0 +1,67 @@
+import time
+from collections import deque
+import numpy as np
+
+'''
+This module implements the adaptive warmup of Engine.py (and benchmark/benchmark_gpudla.py).
+Instead of running a fixed number of batches (or a fixed time), the warmup runs until the latency of the batches has
+stabilised: the coefficient of variation (standard deviation / mean) of the last "window" latencies is below "cv".
+The warmup runs at least "min_batches" batches and stops after "max_batches" batches or "max_s" seconds even if the
+latency is not stable (reported as not "stable").
+'''
+
+class Warmup:
+    def __init__(self, window=20, cv=0.05, min_batches=20, max_batches=2000, max_s=30.0):
+        '''
+        window: Number of latencies over which the stability is evaluated.
+        cv: Coefficient of variation below which the latency is stable.
+        min_batches: Minimum number of batches.
+        max_batches: Maximum number of batches.
+        max_s: Maximum duration (s).
+        '''
+        self.latencies = deque(maxlen=window)
+        self.cv = cv
+        self.min_batches = max(min_batches, window)
+        self.max_batches = max_batches
+        self.max_s = max_s
+        self.batches = 0
+        self.start = time.perf_counter()
+
+    def variation(self):
+        '''
+        Returns the coefficient of variation of the latencies of the window (inf if the window is not full).
+        '''
+        if len(self.latencies) < self.latencies.maxlen:
+            return float('inf')
+        latencies = np.fromiter(self.latencies, dtype=np.float64)
+        mean = latencies.mean()
+        return float(latencies.std() / mean) if mean > 0 else 0.0
+
+    def record(self, latency):
+        '''
+        Records the latency (s) of a warmup batch. Returns True when the warmup is done.
+        '''
+        self.latencies.append(latency)
+        self.batches += 1
+        return self.done()
+
+    def stable(self):
+        return self.variation() < self.cv
+
+    def done(self):
+        if self.batches >= self.max_batches or time.perf_counter() - self.start >= self.max_s:
+            return True
+        return self.batches >= self.min_batches and self.stable()
+
+    def report(self):
+        '''
+        Returns the number of warmup "batches", their duration ("seconds"), the final coefficient of variation ("cv"),
+        whether the latency was "stable" and its mean over the window ("latency_ms").
+        '''
+        return {
+            "batches": self.batches,
+            "seconds": time.perf_counter() - self.start,
+            "cv": self.variation(),
+            "stable": self.stable(),
+            "latency_ms": float(np.mean(self.latencies)) * 1000 if self.latencies else 0.0,
+        }
@@ -1,6 +1,8 @@
 from Config import Config
 from SysConfig import SysConfig
 import argparse
+import json
+import os
 
 def main():
     parser = argparse.ArgumentParser(description="Run configuration script.")
@@ -11,16 +13,27 @@ def main():
     config_path = args.config_path
     output_path = args.output_path
 
-    sysConfig = SysConfig()
+    # Frequencies are set on the same sysfs tree read by Stats (a fake tree can be used on hosts without a board)
+    with open(config_path, 'r') as f:
+        sysfs_root = json.load(f).get("sysfs_root", "/sys")
+    sysConfig = SysConfig(sysfs_root=sysfs_root)
     config = Config()
+    sysConfig.on_change = config.signal_transient   # Frequency changes trigger a sampling burst (if enabled)
 
     cpufreq, gpufreq, maxn = sysConfig.read_sysconfig(config_path)
     sysConfig.init_sysconfig(MAXN=maxn)
     sysConfig.set_frequencies(cpufreq, gpufreq, MAXN=maxn)
     config.read_config(config_path)
+    # Frequencies refined during the run (online refine, if enabled) are applied through SysConfig
+    config.set_frequencies = lambda cpu, gpu: sysConfig.set_frequencies(cpu, gpu, MAXN=maxn)
+    # Engines run on the CPU clusters whose frequency is set (unless their scheduling sets other CPUs)
+    config.enginecpus = sysConfig.controlled_cpus(MAXN=maxn)
     config.run()
     config.export_heartbeats(output_path=output_path)
+    config.export_energy(output_path=os.path.splitext(output_path)[0] + "_energy.csv")
+    config.export_residency(output_path=os.path.splitext(output_path)[0] + "_residency.csv")
     sysConfig.restore_sysconfig(MAXN=maxn)
+    config.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,19 @@
+from Controller import Controller
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the closed-loop Decide -> Run -> Refine controller.")
+    parser.add_argument("--config_path", type=str, default="config.json", help="Path to the configuration file.")
+    parser.add_argument("--apps_path", type=str, default=None, help="Path to the applications file. If provided, the configuration is first built by Decide.")
+    parser.add_argument("--output_dir", type=str, default="out/controller", help="Directory of the step CSV files and of the summary.")
+    parser.add_argument("--max_steps", type=int, default=8, help="Maximum number of steps.")
+    parser.add_argument("--duration", type=int, default=35, help="Duration of the run of every step (in seconds).")
+    args = parser.parse_args()
+
+    controller = Controller(args.config_path, args.output_dir, maxsteps=args.max_steps, duration=args.duration)
+    if args.apps_path is not None:
+        controller.decide(args.apps_path)
+    controller.run()
+
+if __name__ == "__main__":
+    main()
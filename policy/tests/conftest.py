@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+'''
+Fixtures of the CPU-only tests: a fake sysfs tree of a Jetson Orin Nano (INA3221 power lines, GPU devfreq, CPU
+policies and a thermal zone) and a HOME redirected to a temporary directory, so that the hardware map cached by
+Discovery.py never touches the one of the user.
+'''
+
+INA3221 = os.path.join("devices", "platform", "bus@0", "c240000.i2c", "i2c-1", "1-0040", "hwmon", "hwmon2")
+GPU = os.path.join("devices", "platform", "gpu.0", "devfreq", "17000000.ga10b")
+
+def write(root, path, content):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(f"{content}\n")
+
+def link(root, path, target):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.symlink(os.path.relpath(os.path.join(root, target), os.path.dirname(path)), path)
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    return home
+
+@pytest.fixture
+def sysfs(tmp_path):
+    '''
+    Returns the root of a fake sysfs tree: VDD_IN, VDD_CPU_GPU_CV and VDD_SOC at 5 V and 1, 2 and 3 A, the GPU at
+    612 MHz and two CPU clusters (0-3 and 4-7).
+    '''
+    root = str(tmp_path / "sys")
+    write(root, os.path.join("firmware", "devicetree", "base", "model"), "NVIDIA Jetson Orin Nano")
+    write(root, os.path.join(INA3221, "name"), "ina3221")
+    for channel, label in ((1, "VDD_IN"), (2, "VDD_CPU_GPU_CV"), (3, "VDD_SOC")):
+        write(root, os.path.join(INA3221, f"in{channel}_label"), label)
+        write(root, os.path.join(INA3221, f"in{channel}_input"), 5000)
+        write(root, os.path.join(INA3221, f"curr{channel}_input"), 1000 * channel)
+    link(root, os.path.join("class", "hwmon", "hwmon2"), INA3221)
+    for name in ("cur_freq", "target_freq"):
+        write(root, os.path.join(GPU, name), 612000000)
+    write(root, os.path.join(GPU, "available_frequencies"), "306000000 612000000")
+    link(root, os.path.join("class", "devfreq", "17000000.ga10b"), GPU)
+    for policy, cpus, frequency in ((0, "0 1 2 3", 1498000), (4, "4 5 6 7", 729600)):
+        write(root, os.path.join("devices", "system", "cpu", "cpufreq", f"policy{policy}", "related_cpus"), cpus)
+        write(root, os.path.join("devices", "system", "cpu", "cpufreq", f"policy{policy}", "scaling_cur_freq"), frequency)
+        write(root, os.path.join("devices", "system", "cpu", "cpufreq", f"policy{policy}", "scaling_available_frequencies"), f"729600 {frequency}")
+    write(root, os.path.join("class", "thermal", "thermal_zone0", "type"), "cpu-thermal")
+    write(root, os.path.join("class", "thermal", "thermal_zone0", "temp"), 45000)
+    return root
@@ -0,0 +1,103 @@
+import os
+import csv
+import json
+
+from Config import Config
+
+ENGINE_INFO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "engine_info", "resnet50_Opset17", "resnet50_Opset17.json")
+
+def write_config(tmp_path, sysfs, **options):
+    config = {
+        "frequencies": {"cpu": "729600", "gpu": "306000000", "maxn": "False"},
+        "sysfs_root": sysfs,
+        "backend": "mock",
+        "stats_mode": "thread",
+        "heartbeat": 1,
+        "warmup": {"max_s": 0.5},
+        "models": [
+            {"name": "resnet50_Opset17", "engineinfo": ENGINE_INFO, "enginepath": "/nonexistent/resnet50_", "device": "GPU", "throughput": 60, "pipeline": 2},
+            {"name": "resnet50_Opset17", "engineinfo": ENGINE_INFO, "enginepath": "/nonexistent/resnet50_", "device": "DLA0", "throughput": 30},
+        ],
+        **options,
+    }
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+def read_csv(path):
+    with open(path, 'r') as f:
+        return list(csv.DictReader(f))
+
+def test_run(tmp_path, sysfs):
+    config = Config()
+    config.read_config(write_config(tmp_path, sysfs, online_refine={"every": 1}))
+    changes = []
+    config.set_frequencies = lambda cpu, gpu: changes.append((cpu, gpu))
+    try:
+        config.run(execution_duration=3.5)
+    finally:
+        config.close()
+
+    assert [heartbeat[0] for heartbeat in config.heartbeats] == ["resnet50_Opset17"] * 2
+    assert config.statsheartbeats is not None
+    # Online refine: the frequencies applied during the run are the clock settings after the first one
+    assert changes == [(cpu, gpu) for _, cpu, gpu in config.clocks[1:]]
+
+    output = str(tmp_path / "out.csv")
+    config.export_heartbeats(output_path=output)
+    rows = read_csv(output)
+    assert [row["device"] for row in rows] == ["GPU", "DLA0"]
+    assert [row["target"] for row in rows] == ["60.00", "30.00"]
+    assert {"vdd_in", "vdd_cpu_gpu_cv", "vdd_soc", "run_energy_j", "run_avg_power_w", "run_mj_per_inference", "inferences",
+            "run_latency_p99_ms", "run_d2h_ms", "pacing_rate_error", "warmup_batches"} <= set(rows[0])
+    for row in rows:
+        assert int(row["inferences"]) > 0
+        assert float(row["vdd_in"]) == 5000.0
+        # VDD_IN: 5 V at 1 A
+        assert abs(float(row["run_avg_power_w"]) - 5.0) < 0.05
+        assert row["pacing_rate_error"] != ""
+
+    config.export_energy(output_path=str(tmp_path / "out_energy.csv"))
+    energy = read_csv(str(tmp_path / "out_energy.csv"))
+    assert energy[-1]["window"] == "run"
+
+def test_missing_stats(tmp_path, sysfs):
+    config = Config()
+    config.read_config(write_config(tmp_path, sysfs))
+    assert config.get_energy_report() is None
+    output = str(tmp_path / "out.csv")
+    config.export_heartbeats(output_path=output)
+    assert not os.path.exists(output)
+
+def test_online_refine_guarded(tmp_path, sysfs):
+    # Without configured frequencies, online refine is disabled instead of failing in the telemetry loop
+    path = write_config(tmp_path, sysfs, online_refine={"every": 1})
+    with open(path, 'r') as f:
+        options = json.load(f)
+    del options["frequencies"]
+    with open(path, 'w') as f:
+        json.dump(options, f)
+    config = Config()
+    config.read_config(path)
+    config.set_frequencies = lambda cpu, gpu: None
+    try:
+        config.run(execution_duration=2.5)
+    finally:
+        config.close()
+    assert len(config.clocks) == 1
+    assert len(config.heartbeats) == 2
+
+def test_online_refine_failure(tmp_path, sysfs):
+    # A failing decision is skipped: the run completes at the initial setting
+    config = Config()
+    config.read_config(write_config(tmp_path, sysfs, online_refine={"every": 1}))
+    def set_frequencies(cpu, gpu):
+        raise OSError("frequency not applied")
+    config.set_frequencies = set_frequencies
+    try:
+        config.run(execution_duration=2.5)
+    finally:
+        config.close()
+    assert len(config.clocks) == 1
+    assert config.statsheartbeats is not None
+    assert len(config.heartbeats) == 2
@@ -0,0 +1,27 @@
+import os
+
+from Discovery import Discovery
+
+def test_scan(sysfs):
+    discovery = Discovery(sysfs)
+    rails = discovery.rails()
+    assert list(rails) == ["VDD_IN", "VDD_CPU_GPU_CV", "VDD_SOC"]
+    assert all(path.startswith(sysfs) for paths in rails.values() for path in paths.values())
+    assert discovery.input_rail() == "VDD_IN"
+    assert os.path.realpath(discovery.gpu()) == os.path.realpath(os.path.join(sysfs, "devices", "platform", "gpu.0", "devfreq", "17000000.ga10b"))
+
+def test_fallbacks_follow_root(tmp_path):
+    root = str(tmp_path / "empty")
+    discovery = Discovery(root)
+    assert discovery.rails()["VDD_IN"]["curr_path"] == os.path.join(root, "bus", "i2c", "drivers", "ina3221", "1-0040", "hwmon", "hwmon4", "curr1_input")
+    assert discovery.gpu() == os.path.join(root, "devices", "gpu.0", "devfreq", "17000000.ga10b")
+    assert discovery.cpufreq(3) == os.path.join(root, "devices", "system", "cpu", "cpu3", "cpufreq")
+
+def test_cache_keyed_by_root(sysfs, home):
+    discovery = Discovery(sysfs)
+    discovery.load()
+    cached = os.listdir(home / ".cache" / "rtrm")
+    assert cached == [f"hwmap-{discovery.board_id()}.json"]
+    assert discovery.board_id() != Discovery("/sys").board_id()
+    # A second Discovery of the same tree reads the cached map
+    assert Discovery(sysfs).load() == discovery.load()
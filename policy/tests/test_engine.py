@@ -0,0 +1,81 @@
+import os
+import time
+import itertools
+
+import pytest
+
+from Engine import Engine
+from MockData import SOURCE_SHAPE
+
+ENGINE_INFO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "engine_info", "resnet50_Opset17", "resnet50_Opset17.json")
+
+def mock_engine(sysfs, pipeline):
+    engine = Engine()
+    engine.backend = "mock"
+    engine.sysfs_root = sysfs
+    engine.pipeline = pipeline
+    engine.throughput = -1
+    engine.warmup = {"max_s": 0.5}
+    engine.build_engine("/nonexistent/resnet50_gpu.engine", ENGINE_INFO)
+    return engine
+
+@pytest.mark.parametrize("pipeline", [1, 3])
+def test_pipelined_loop(sysfs, pipeline):
+    engine = mock_engine(sysfs, pipeline)
+    engine.execute(heartbeat=0.5, duration=1.6)
+    info = engine.info
+    assert info["pipeline"] == pipeline
+    assert len(info["windows"]) >= 2
+    assert info["inferences"] > 0
+    # Every batch, including the ones still in flight at the end of the run, is read back once
+    batches = info["inferences"] // engine.batch_size
+    assert info["readback_bytes"] == batches * 1000 * 4
+    assert info["host_buffers"] == pipeline
+    assert sum(window["inferences"] for window in info["windows"]) <= info["inferences"]
+    assert set(info["stages"]) >= {"h2d_ms", "execute_ms", "sync_ms", "d2h_ms"}
+
+def test_pipelined_overlap(sysfs):
+    # The mock accelerator runs one batch at a time: the pipeline keeps it busy, it can not run faster
+    serial = mock_engine(sysfs, 1)
+    serial.execute(heartbeat=0.5, duration=1.1, warmup=0)
+    pipelined = mock_engine(sysfs, 3)
+    pipelined.execute(heartbeat=0.5, duration=1.1, warmup=0)
+    assert pipelined.info["inferences"] >= serial.info["inferences"] * 0.9
+
+def test_no_readback(sysfs):
+    engine = mock_engine(sysfs, 2)
+    engine.readback = False
+    engine.execute(heartbeat=0.5, duration=0.6, warmup=0)
+    assert engine.info["readback_bytes"] == 0
+
+def test_wall_clock_steps(sysfs, monkeypatch):
+    # Steps of the wall clock (e.g. NTP) change neither the run length nor the heartbeats
+    steps = itertools.count(0, 1000)
+    monkeypatch.setattr(time, "time", lambda: float(next(steps)))
+    engine = mock_engine(sysfs, 1)
+    engine.execute(heartbeat=0.5, duration=1.1, warmup=0)
+    assert len(engine.heartbeats) == 2
+    assert all(heartbeat > 0 for heartbeat in engine.heartbeats)
+
+def test_data_shape(sysfs):
+    engine = mock_engine(sysfs, 1)
+    engine.preprocess = "cache"
+    assert engine.data_shape() == tuple(engine.input_shape[1:])
+    engine.preprocess = "inline"
+    assert engine.data_shape() == SOURCE_SHAPE
+
+def test_idle_serving_heartbeats(sysfs, tmp_path):
+    # A single request at the start: the engine is then idle for the rest of the run
+    trace = tmp_path / "trace.csv"
+    trace.write_text("0.0\n")
+    engine = mock_engine(sysfs, 1)
+    engine.arrivals = {"process": "trace", "path": str(trace), "loop": False}
+    published = []
+    engine.telemetry = type("Channel", (), {"publish": lambda self, record: published.append(record)})()
+    engine.execute(heartbeat=0.4, duration=1.8)
+    windows = engine.info["windows"]
+    assert len(windows) >= 3
+    assert len([record for record in published if record["kind"] == "heartbeat"]) == len(windows)
+    assert sum(window["inferences"] for window in windows) == engine.info["inferences"] == 1
+    assert windows[-1]["inferences"] == 0
+    assert engine.heartbeats_actual[-1] == 0.0
@@ -0,0 +1,19 @@
+import numpy as np
+
+from MockData import fill_corpus, corpus_length, save_legacy_time, load_legacy_time
+
+def test_fill_corpus_seeded():
+    first = fill_corpus(np.empty((4, 3, 8, 8), dtype=np.uint8), seed=1)
+    second = fill_corpus(np.empty((4, 3, 8, 8), dtype=np.uint8), seed=1)
+    assert np.array_equal(first, second)
+    assert not np.array_equal(first, fill_corpus(np.empty((4, 3, 8, 8), dtype=np.uint8), seed=2))
+
+def test_corpus_length():
+    assert corpus_length((3, 224, 224), 1, maximum=100) == 100
+    assert corpus_length((3, 224, 224), 8, budget=1) == 8
+
+def test_legacy_time_stored(home):
+    assert load_legacy_time() is None
+    save_legacy_time(2.0, numimgs=100)
+    assert load_legacy_time(numimgs=1000) == 20.0
+    assert (home / ".cache" / "rtrm" / "legacy_data_time.json").exists()
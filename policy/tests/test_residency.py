@@ -0,0 +1,39 @@
+import os
+
+from Sampler import Sampler
+from Residency import ResidencyTracker, parse_time_in_state, parse_trans_stat
+
+TIME_IN_STATE = os.path.join("devices", "system", "cpu", "cpufreq", "policy0", "stats", "time_in_state")
+
+def write_time_in_state(sysfs, lines):
+    path = os.path.join(sysfs, TIME_IN_STATE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write("".join(f"{freq} {ticks}\n" for freq, ticks in lines))
+
+def test_parsers():
+    assert parse_time_in_state(b"729600 100\n1497600 250\n") == {729600: 1.0, 1497600: 2.5}
+    assert parse_trans_stat("     From  :   To\n           : 306000000 612000000   time(ms)\n 306000000:  0 1 2000\n*612000000: 1 0 18000\n") == {306000: 2.0, 612000: 18.0}
+    assert parse_time_in_state("") is None
+
+def test_window_and_total(sysfs):
+    write_time_in_state(sysfs, [(729600, 100), (1497600, 0)])
+    tracker = ResidencyTracker(Sampler(sysfs), {"cpu0": (TIME_IN_STATE, parse_time_in_state)})
+    tracker.start()
+    write_time_in_state(sysfs, [(729600, 150), (1497600, 100)])
+    assert tracker.window() == {"cpu0": {729600: 0.5, 1497600: 1.0}}
+    write_time_in_state(sysfs, [(729600, 150), (1497600, 300)])
+    assert tracker.window() == {"cpu0": {1497600: 2.0}}
+    assert tracker.total() == {"cpu0": {729600: 0.5, 1497600: 3.0}}
+
+def test_counter_retried_at_next_run(sysfs):
+    # The counter is not readable at the first run, but a tracker reused across runs picks it up later
+    tracker = ResidencyTracker(Sampler(sysfs), {"cpu0": (TIME_IN_STATE, parse_time_in_state)})
+    tracker.start()
+    assert tracker.window() == {}
+    assert tracker.total() == {}
+    write_time_in_state(sysfs, [(729600, 100)])
+    tracker.sampler.close()
+    tracker.start()
+    write_time_in_state(sysfs, [(729600, 200)])
+    assert tracker.window() == {"cpu0": {729600: 1.0}}
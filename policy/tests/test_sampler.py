@@ -0,0 +1,30 @@
+import os
+
+from Sampler import Sampler
+
+def test_resolve(sysfs):
+    sampler = Sampler(sysfs)
+    assert sampler.resolve("/sys/class/thermal/thermal_zone0/temp") == os.path.join(sysfs, "class", "thermal", "thermal_zone0", "temp")
+    assert sampler.resolve("class/thermal/thermal_zone0/temp") == os.path.join(sysfs, "class", "thermal", "thermal_zone0", "temp")
+    # Paths already under the root (e.g. resolved by Discovery.py) are kept as they are
+    path = os.path.join(sysfs, "class", "thermal", "thermal_zone0", "temp")
+    assert sampler.resolve(path) == path
+    assert Sampler().resolve("/sys/class/thermal") == "/sys/class/thermal"
+
+def test_read(sysfs):
+    sampler = Sampler(sysfs)
+    path = "/sys/class/thermal/thermal_zone0/temp"
+    assert sampler.read(path) == 45000
+    # The descriptor is kept open: every read sees the current content
+    with open(sampler.resolve(path), 'w') as f:
+        f.write("46000\n")
+    assert sampler.read(path) == 46000
+    assert list(sampler.fds) == [path]
+    sampler.close()
+    assert sampler.fds == {}
+
+def test_read_errors(sysfs):
+    sampler = Sampler(sysfs)
+    assert sampler.read("/sys/class/thermal/thermal_zone0/type") is None
+    assert sampler.read("/sys/class/missing") is None
+    sampler.close()
@@ -0,0 +1,50 @@
+import struct
+
+import pytest
+
+from Telemetry import Telemetry
+
+@pytest.fixture
+def telemetry():
+    telemetry = Telemetry(2, slots=4, slot_size=256)
+    yield telemetry
+    telemetry.close()
+
+def slot_offset(telemetry, channel, index):
+    return channel * telemetry.channel_stride + 8 + (index % telemetry.slots) * telemetry.slot_stride
+
+def test_publish_poll(telemetry):
+    telemetry.channel(1).publish({"kind": "heartbeat", "throughput": 1.0})
+    telemetry.channel(1).publish({"kind": "end", "info": {}})
+    assert telemetry.poll(0) == []
+    assert [record["kind"] for record in telemetry.poll(1)] == ["heartbeat", "end"]
+    assert telemetry.poll(1) == []
+    assert telemetry.lost == [0, 0]
+
+def test_oversized_record(telemetry):
+    with pytest.raises(ValueError, match="end"):
+        telemetry.publish(0, {"kind": "end", "info": "x" * 1024})
+
+def test_overwritten_records_are_lost(telemetry):
+    for i in range(6):
+        telemetry.publish(0, {"kind": "heartbeat", "i": i})
+    assert [record["i"] for record in telemetry.poll(0)] == [2, 3, 4, 5]
+    assert telemetry.lost[0] == 2
+
+def test_incomplete_record_read_again(telemetry):
+    telemetry.publish(0, {"kind": "heartbeat", "i": 0})
+    telemetry.publish(0, {"kind": "end", "info": {}})
+    slot = slot_offset(telemetry, 0, 1)
+    buf = telemetry.shm.buf
+    # Sequence number not visible yet (weakly ordered stores)
+    struct.pack_into("<Q", buf, slot, 2)
+    assert [record["i"] for record in telemetry.poll(0)] == [0]
+    struct.pack_into("<Q", buf, slot, 4)
+    # Record not visible yet: the CRC does not match
+    payload = slot + 24
+    original = buf[payload]
+    buf[payload] = original ^ 0xFF
+    assert telemetry.poll(0) == []
+    buf[payload] = original
+    assert [record["kind"] for record in telemetry.poll(0)] == ["end"]
+    assert telemetry.lost[0] == 0